@@ -6,6 +6,10 @@ import random
 from playwright.sync_api import sync_playwright
 from bs4 import BeautifulSoup
 
+from data.price_history import record_observations
+from general_scraper import MOMO_CARD_FIELDS, MOMO_CARD_ROOTS, momo_link, pick_momo_image
+from scrapers.dom_extract import extract_first_sync, print_extract_stats
+
 # ==========================================
 # 工具函式
 # ==========================================
@@ -200,26 +204,20 @@ def scrape_momo_lutein(limit=100):
                 except:
                     print("⏳ MOMO 載入較慢，繼續嘗試...")
 
-                # 抓取資料 - 調整選擇器確保抓到所有商品
-                items = page.locator(".listGoodsData").all()
-                if not items: items = page.locator(".goodsUrl").all()
-                if not items: items = page.locator("li.goodsItemLi").all()
-                if not items: items = page.locator(".EachGood").all()
-                if not items: items = page.locator("#CategoryContent li").all()
+                # 抓取資料 - 依序嘗試多個卡片選擇器，一次 evaluate 取回整頁卡片 (規格與 general_scraper 共用)
+                items = extract_first_sync(page, MOMO_CARD_ROOTS, MOMO_CARD_FIELDS, label="momo_listing")
 
                 print(f"📦 MOMO 第 {page_num} 頁找到 {len(items)} 個商品...")
 
                 for item in items:
                     if count >= limit: break
                     try:
-                        title = item.locator(".prdName").first.inner_text()
+                        title = item["title"]
                         print(f"   [進度] 正在解析第 {count+1}/{limit} 筆：{title[:10]}...", end="\r")
 
-                        price_text = item.locator(".price, .money").first.inner_text()
-                        price = int(re.sub(r'[^\d]', '', price_text))
+                        price = int(re.sub(r'[^\d]', '', item["price_text"]))
 
-                        link = item.get_attribute("href") or item.locator("a").first.get_attribute("href")
-                        if link and not link.startswith("http"): link = "https://www.momoshop.com.tw" + link
+                        link = momo_link(item["link"])
 
                         # 進入內頁抓取詳細資訊 - 使用新分頁避免影響列表頁
                         inner_text = ""
@@ -244,29 +242,15 @@ def scrape_momo_lutein(limit=100):
                                         pass
 
                         # 圖片抓取
-                        image_url = None
-                        imgs = item.locator("img").all()
-                        for img in imgs:
-                            src = img.get_attribute("data-original") or img.get_attribute("src")
-                            # 過濾無效圖片
-                            if src and "ecm" not in src and "icon" not in src:
-                                if "goodsimg" in src or "i1.momoshop" in src:
-                                    image_url = src
-                                    break
-                                if not image_url and "dummy" not in src and "data:image" not in src:
-                                    image_url = src
+                        image_url = pick_momo_image(item["images"])
 
                         if not image_url: image_url = "https://dummyimage.com/200x200/cccccc/ffffff.png&text=MOMO+No+Img"
 
                         # 抓取銷量 - 如果抓不到預設為 0
                         sales_volume = 0
-                        try:
-                            slogan_text = item.locator(".money .slogan").first.inner_text()
-                            match = re.search(r'總銷量\D*(\d+(?:,\d+)*)', slogan_text)  # 放寬 Regex
-                            if match:
-                                sales_volume = int(match.group(1).replace(',', ''))
-                        except:
-                            pass
+                        match = re.search(r'總銷量\D*(\d+(?:,\d+)*)', item["slogan"])  # 放寬 Regex
+                        if match:
+                            sales_volume = int(match.group(1).replace(',', ''))
 
                         # 合併 title 和內頁文字用於 extract_tags
                         combined_text = title + " " + inner_text
@@ -292,11 +276,9 @@ def scrape_momo_lutein(limit=100):
                         print(f"❌ 商品抓取失敗: {e}")
                         # 即使失敗，也嘗試記錄基本資料 (標題、價格)
                         try:
-                            basic_title = item.locator(".prdName").first.inner_text()
-                            basic_price_text = item.locator(".price, .money").first.inner_text()
-                            basic_price = int(re.sub(r'[^\d]', '', basic_price_text))
-                            basic_link = item.get_attribute("href") or item.locator("a").first.get_attribute("href")
-                            if basic_link and not basic_link.startswith("http"): basic_link = "https://www.momoshop.com.tw" + basic_link
+                            basic_title = item["title"]
+                            basic_price = int(re.sub(r'[^\d]', '', item["price_text"]))
+                            basic_link = momo_link(item["link"])
 
                             total_count, unit_price = calculate_unit_price(basic_title, basic_price)
 
@@ -323,6 +305,7 @@ def scrape_momo_lutein(limit=100):
             print(f"❌ [MOMO] 錯誤: {e}")
         finally:
             browser.close()
+            print_extract_stats()
 
     return data_list
 
@@ -341,6 +324,7 @@ if __name__ == "__main__":
     
     if not all_df.empty:
         all_df.to_csv("lutein_market_data.csv", index=False, encoding="utf-8-sig")
+        record_observations(all_df)
         print("\n✅ 資料合併完成！")
         print(f"   PChome: {len(df_p)} 筆")
         print(f"   MOMO:   {len(df_m)} 筆")
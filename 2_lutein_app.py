@@ -4,6 +4,18 @@ import os
 import glob
 import re
 
+import numpy as np
+
+from data.dashboard_cache import data_version, build_dashboard_artifacts
+from data.entity_resolution import DERIVED_DIR, attach_entities
+from data.fda_matcher import attach_licenses
+from data.product_record import normalize_frame
+from data.search_index import ProductSearchIndex, split_highlights
+from data.image_cache import ThumbnailCache
+
+# VITAGUIDE_DATA_DIR 可指向合成目錄 (benchmarks/catalog_gen.py) 做規模測試
+DATA_DIR = os.environ.get("VITAGUIDE_DATA_DIR", "data")
+
 st.set_page_config(page_title="VITAGUIDE 維他評選指南 | 最懂你的保健品顧問", page_icon="🧭", layout="wide")
 
 # ==========================================
@@ -38,7 +50,7 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # 讀取資料（優化：兼容多個關鍵字的 CSV 檔案合併讀取，減少重複代碼並支援擴展）
-@st.cache_data
+# 注意：此函式不再單獨快取，整個 load_data 已依資料版本快取，逐列 hash 反而是額外開銷
 def calculate_specs_from_title(title, price):
     """從標題計算規格 (顆數/單位價格)，用於補全 Momo/PChome 資料"""
     if not isinstance(title, str) or not price or price == 0: return 0, 0.0
@@ -69,8 +81,11 @@ def get_category_from_title(title):
     if '益生菌' in title or '乳酸菌' in title: return '益生菌'
     return '其他'
 
-def load_data(keywords=["葉黃素", "益生菌", "魚油"]):
-    all_files = glob.glob("data/*.csv")
+# 以資料版本 (檔案 mtime/大小 manifest) 作為快取鍵：rerun 直接命中，爬蟲寫入新檔後自動失效
+# 使用 cache_resource 而非 cache_data，避免每次 rerun 都 pickle 複製整個 DataFrame（前台只讀不改）
+@st.cache_resource(max_entries=2, show_spinner="載入資料中...")
+def load_data(version, keywords=("葉黃素", "益生菌", "魚油")):
+    all_files = glob.glob(os.path.join(DATA_DIR, "*.csv"))
     df_list = []
 
     for filename in all_files:
@@ -109,9 +124,9 @@ def load_data(keywords=["葉黃素", "益生菌", "魚油"]):
     combined_df = pd.concat(df_list, ignore_index=True)
 
     # --- 資料清洗與補全 ---
-    for col in ['price', 'total_count', 'unit_price']:
-        if col not in combined_df.columns: combined_df[col] = 0
-        combined_df[col] = pd.to_numeric(combined_df[col], errors='coerce').fillna(0)
+    # 價格 / 單價 / 總顆數與存檔路徑同樣以 normalize_frame 轉型 (保留 category 等額外欄位)；前台以 0 表示總顆數未知
+    combined_df = normalize_frame(combined_df, keep_extra=True)
+    combined_df['total_count'] = combined_df['total_count'].fillna(0)
 
     # 補全規格
     # 優化：若 total_count 為 0 或 unit_price 為 0，嘗試重新計算 (針對 D2C 資料補強)
@@ -121,18 +136,11 @@ def load_data(keywords=["葉黃素", "益生菌", "魚油"]):
         combined_df.loc[mask, 'total_count'] = specs.apply(lambda x: x[0])
         combined_df.loc[mask, 'unit_price'] = specs.apply(lambda x: x[1])
 
-    if 'brand' not in combined_df.columns:
-        combined_df['brand'] = "未標示"
-    else:
-        combined_df['brand'] = combined_df['brand'].fillna("未標示").astype(str)
-
-    # Schema 對齊：新欄位為 product_highlights，兼容舊 CSV 的 tags
-    if 'product_highlights' not in combined_df.columns:
-        combined_df['product_highlights'] = combined_df.get('tags', "")
-    combined_df['product_highlights'] = combined_df['product_highlights'].fillna("").astype(str)
+    # normalize_frame 已補齊 brand (缺值為空字串)，並把舊 CSV 的 tags 併入 product_highlights
+    combined_df['brand'] = combined_df['brand'].replace("", "未標示")
 
-    # 圖片 URL 容錯處理：確保每個產品都有圖片，並修復 D2C 格式問題
-    placeholder_img = "https://via.placeholder.com/300x200/f8f9fa/6c757d?text=VitaGuide"
+    # 圖片 URL 容錯處理：修復 D2C 格式問題；無效連結留空，由前台改用本地佔位圖
+    placeholder_img = ""
     
     def clean_image_url(url):
         if pd.isna(url): return placeholder_img
@@ -155,21 +163,44 @@ def load_data(keywords=["葉黃素", "益生菌", "魚油"]):
 
     combined_df['image_url'] = combined_df['image_url'].apply(clean_image_url)
 
+    # 跨通路歸戶 (python -m data.entity_resolution 產生)：同一商品的通路數與最低單價
+    combined_df = attach_entities(combined_df)
+    # 健康食品許可證比對 (python -m data.fda_matcher 產生，比對表同樣放在 data/derived)
+    combined_df = attach_licenses(combined_df)
+
     return combined_df
 
+@st.cache_resource(max_entries=2)
+def load_artifacts(version):
+    """每個資料版本只計算一次：品牌/來源/類別清單與側邊欄指標"""
+    return build_dashboard_artifacts(load_data(version))
+
+@st.cache_resource(max_entries=2, show_spinner="建立搜尋索引中...")
+def load_search_index(version):
+    """每個資料版本只建一次：關鍵字 n-gram 倒排表與亮點 bitmap 索引"""
+    return ProductSearchIndex(load_data(version))
+
+@st.cache_resource
+def get_image_cache():
+    """本地縮圖快取：圖片只下載一次並轉為小尺寸 WebP，前台不再直連品牌 CDN 原圖"""
+    return ThumbnailCache()
+
 # ==========================================
 # 側邊欄篩選（優化：基於合併資料的動態選擇器，提供更全面的產品類別檢視）
 # ==========================================
 st.sidebar.header("🔍 篩選條件")
 
-# 載入所有資料
-df = load_data(keywords=["葉黃素", "益生菌", "魚油"])
+# 載入所有資料 (歸戶表等衍生資料放在 data/derived，不會被當成商品檔讀入，但更新時同樣要讓快取失效)
+version = data_version(DATA_DIR) + data_version(DERIVED_DIR)
+df = load_data(version)
 if df is None:
     st.error("目前尚無任何資料，請稍後再試。")
     st.stop()
+artifacts = load_artifacts(version)
+metrics = artifacts["metrics"]
 
 # 產品類別選擇器（基於合併資料）
-selected_category = st.sidebar.selectbox("產品類別", ["全部"] + sorted(df['category'].unique().tolist()))
+selected_category = st.sidebar.selectbox("產品類別", ["全部"] + artifacts["categories"])
 
 # ==========================================
 # Header & 數據概況
@@ -179,28 +210,27 @@ st.markdown("帶你穿越保健品迷霧，只買對的，不買貴的。")
 
 col1, col2, col3, col4 = st.columns(4)
 with col1:
-    st.metric("總收錄產品", f"{len(df)} 項")
+    st.metric("總收錄產品", f"{metrics['total']} 項")
 with col2:
-    avg_price = df[df['price'] > 0]['price'].mean()
-    st.metric("市場平均價格", f"${int(avg_price)}")
+    st.metric("市場平均價格", f"${metrics['avg_price']}")
 with col3:
     # 統計最多產品的品牌 Top 1
-    top_brand = df['brand'].value_counts().idxmax()
-    st.metric("產品最多品牌", top_brand)
+    st.metric("產品最多品牌", metrics['top_brand'])
 with col4:
-    free_form_count = df['product_highlights'].str.contains("游離型", na=False).sum()
-    st.metric("標榜「游離型」", f"{free_form_count} 項")
+    st.metric("標榜「游離型」", f"{metrics['free_form_count']} 項")
 
 st.divider()
 
 keyword = st.sidebar.text_input("搜尋產品名稱或品牌")
-sources = st.sidebar.multiselect("來源平台", df['source'].unique(), default=df['source'].unique())
+sources = st.sidebar.multiselect("來源平台", artifacts["sources"], default=artifacts["sources"])
 
 # 新增：品牌篩選
-all_brands = ["全部"] + sorted(df['brand'].unique().tolist())
+all_brands = ["全部"] + artifacts["brands"]
 selected_brand = st.sidebar.selectbox("品牌篩選", all_brands)
 
-tag_filter = st.sidebar.radio("規格亮點：", ["全部", "💎FloraGLO 原料", "✅游離型", "➕含有蝦紅素"])
+# 規格亮點 → product_highlights 比對字串（可複選，條件取交集）
+TAG_NEEDLES = {"💎FloraGLO 原料": "FloraGLO", "✅游離型": "游離型", "➕含有蝦紅素": "蝦紅素"}
+tag_filters = st.sidebar.multiselect("規格亮點：", list(TAG_NEEDLES.keys()))
 
 # 新增：排序選項
 sort_option = st.sidebar.selectbox("排序方式", ["預設", "價格由低到高", "價格由高到低", "單價由低到高"])
@@ -210,52 +240,74 @@ st.sidebar.warning("**⚠️ 免責聲明**：\n\n本平台資訊僅供參考，
 # ==========================================
 # 資料過濾邏輯
 # ==========================================
-result = df[df['source'].isin(sources)]
-
-# 根據選擇的類別過濾
-if selected_category != "全部":
-    result = result[result['category'] == selected_category]
-
-if keyword:
-    result = result[result['title'].str.contains(keyword, case=False) | result['brand'].str.contains(keyword, case=False)]
-
-if selected_brand != "全部":
-    result = result[result['brand'] == selected_brand]
-
-if tag_filter == "💎FloraGLO 原料":
-    result = result[result['product_highlights'].str.contains("FloraGLO", na=False)]
-elif tag_filter == "✅游離型":
-    result = result[result['product_highlights'].str.contains("游離型", na=False)]
-elif tag_filter == "➕含有蝦紅素":
-    result = result[result['product_highlights'].str.contains("蝦紅素", na=False)]
-
-# 排序邏輯
-if sort_option == "價格由低到高":
-    result = result.sort_values('price')
-elif sort_option == "價格由高到低":
-    result = result.sort_values('price', ascending=False)
-elif sort_option == "單價由低到高":
-    df_valid = result[result['unit_price'] > 0].sort_values('unit_price', ascending=True)
-    df_invalid = result[result['unit_price'] == 0]
-    result = pd.concat([df_valid, df_invalid])
+# 所有條件皆由索引做 row id / bitmap 交集，避免每次 rerun 對整張表做 str.contains 掃描
+search_index = load_search_index(version)
+row_ids = search_index.filter(
+    keyword=keyword,
+    highlights=[TAG_NEEDLES[t] for t in tag_filters],
+    facets={
+        "source": sources,
+        "category": [selected_category] if selected_category != "全部" else None,
+        "brand": [selected_brand] if selected_brand != "全部" else None,
+    },
+)
+
+# 排序邏輯（在 row id 上排序，切頁前完成；卡片模式只需取出當頁的列）
+def order_row_ids(df, row_ids, sort_option):
+    if sort_option == "價格由低到高":
+        return row_ids[np.argsort(df['price'].to_numpy()[row_ids], kind="stable")]
+    if sort_option == "價格由高到低":
+        return row_ids[np.argsort(-df['price'].to_numpy()[row_ids], kind="stable")]
+    if sort_option == "單價由低到高":
+        unit_prices = df['unit_price'].to_numpy()[row_ids]
+        valid = row_ids[unit_prices > 0]
+        valid = valid[np.argsort(unit_prices[unit_prices > 0], kind="stable")]
+        return np.concatenate([valid, row_ids[unit_prices == 0]])
+    return row_ids
+
+ordered_ids = order_row_ids(df, row_ids, sort_option)
 
 # ==========================================
 # 顯示結果 (圖文並茂版)
 # ==========================================
-st.subheader(f"搜尋結果：共 {len(result)} 筆")
+st.subheader(f"搜尋結果：共 {len(ordered_ids)} 筆")
 
 # 模式切換
 view_mode = st.radio("檢視模式", ["📊 表格模式 (快速比價)", "🖼️ 卡片模式 (瀏覽詳情)"], horizontal=True)
 
+image_cache = get_image_cache()
+# 表格模式預先背景轉檔的筆數上限（其餘沿用原始圖片網址，下次 rerun 命中後即改用縮圖）
+TABLE_THUMB_PREFETCH = 200
+
+def card_image_url(url):
+    """卡片圖片：無效連結或 dummyimage 視為無圖，改用本地佔位圖"""
+    s_url = str(url or "")
+    if s_url.startswith('http') and 'dummyimage' not in s_url:
+        return s_url
+    return None
+
 if "表格" in view_mode:
     # 使用 st.column_config.ImageColumn 來顯示圖片
+    result = df.iloc[ordered_ids][['image_url', 'brand', 'title', 'price', 'offer_count', 'best_unit_price', 'license_id', 'product_highlights', 'url']]
+    # 已快取的縮圖改走本地靜態路徑；未快取者先用原圖並在背景轉檔
+    source_urls = [card_image_url(u) for u in result['image_url'].tolist()]
+    placeholder_url = image_cache.public_url(image_cache.placeholder_path)
+    thumb_paths = image_cache.lookup_many(source_urls)
+    result = result.assign(image_url=[
+        image_cache.public_url(p) if p else (u or placeholder_url)
+        for u, p in zip(source_urls, thumb_paths)
+    ])
+    image_cache.prefetch([u for u, p in zip(source_urls[:TABLE_THUMB_PREFETCH], thumb_paths) if u and not p])
     st.dataframe(
-        result[['image_url', 'brand', 'title', 'price', 'product_highlights', 'url']],
+        result,
         column_config={
             "image_url": st.column_config.ImageColumn("商品圖", help="產品預覽圖"),
             "brand": "品牌",
             "title": "產品名稱",
             "price": st.column_config.NumberColumn("價格", format="$%d"),
+            "offer_count": st.column_config.NumberColumn("通路數", help="同一商品在幾個平台販售"),
+            "best_unit_price": st.column_config.NumberColumn("跨平台最低單價", format="$%.2f"),
+            "license_id": st.column_config.TextColumn("健康食品字號", help="衛福部健康食品許可證 (自動比對)"),
             "product_highlights": "規格亮點",
             "url": st.column_config.LinkColumn("前往購買", display_text="前往購買")
         },
@@ -264,17 +316,50 @@ if "表格" in view_mode:
     )
 
 else:
-    # 卡片模式 (Grid Layout)
+    # 卡片模式 (分頁 Grid Layout)：只實體化當頁的產品，render 成本固定為 O(page_size)
+    CARD_COLUMNS = ['image_url', 'brand', 'title', 'url', 'price', 'unit_price', 'product_highlights', 'license_id', 'approved_effect']
+    page_size = st.sidebar.selectbox("卡片每頁筆數", [12, 24, 48, 96], index=1)
+    total_pages = max(1, -(-len(ordered_ids) // page_size))
+
+    # 篩選/排序條件變動時回到第 1 頁
+    filter_signature = (version, keyword, tuple(sources), selected_category, selected_brand,
+                        tuple(tag_filters), sort_option, page_size)
+    if st.session_state.get("card_filter_signature") != filter_signature:
+        st.session_state["card_filter_signature"] = filter_signature
+        st.session_state["card_page"] = 1
+    st.session_state["card_page"] = min(st.session_state.get("card_page", 1), total_pages)
+
+    def shift_card_page(delta):
+        st.session_state["card_page"] += delta
+
+    page = st.session_state["card_page"]
+    nav_prev, nav_info, nav_next = st.columns([1, 2, 1])
+    with nav_prev:
+        st.button("⬅️ 上一頁", disabled=page <= 1, on_click=shift_card_page, args=(-1,), use_container_width=True)
+    with nav_next:
+        st.button("下一頁 ➡️", disabled=page >= total_pages, on_click=shift_card_page, args=(1,), use_container_width=True)
+    with nav_info:
+        st.markdown(f"<div style='text-align:center;'>第 {page} / {total_pages} 頁</div>", unsafe_allow_html=True)
+
+    start = (page - 1) * page_size
+    page_rows = df.iloc[ordered_ids[start:start + page_size]][CARD_COLUMNS].to_dict("records")
+    # 已快取的縮圖直接命中；未快取者先用原圖 (無圖時用本地佔位圖) 並在背景轉檔，不阻塞卡片渲染
+    page_urls = [card_image_url(r['image_url']) for r in page_rows]
+    page_thumb_paths = image_cache.lookup_many(page_urls)
+    page_thumbs = [p or u or image_cache.placeholder_path for u, p in zip(page_urls, page_thumb_paths)]
+    image_cache.prefetch([u for u, p in zip(page_urls, page_thumb_paths) if u and not p])
+
     cols = st.columns(3) # 每行顯示 3 個
-    for index, (idx, row) in enumerate(result.iterrows()):
+    for index, row in enumerate(page_rows):
         with cols[index % 3]:
             with st.container():
                 # 顯示圖片 (優化：若 image_url 為空，顯示質感的預設佔位圖，提升使用者體驗)
-                if row['image_url'] and str(row['image_url']).startswith('http') and 'dummyimage' not in str(row['image_url']):
-                    st.image(row['image_url'], use_container_width=True)
+                thumb_path = page_thumbs[index]
+                if thumb_path != image_cache.placeholder_path:
+                    st.image(thumb_path, use_container_width=True)
                 else:
-                    # 質感預設佔位圖
-                    st.image("https://via.placeholder.com/300x200/f8f9fa/6c757d?text=VitaGuide", use_container_width=True, caption="商品圖片")
+                    # 質感預設佔位圖 (本地產生)
+                    st.image(thumb_path, use_container_width=True, caption="商品圖片")
 
                 st.markdown(f"**{row['brand']}**")
                 st.markdown(f"[{row['title']}]({row['url']})")
@@ -284,14 +369,24 @@ else:
                 if row['unit_price'] > 0:
                     st.markdown(f"<span style='color:orange;'>💸 (每顆 ${row['unit_price']:.2f})</span>", unsafe_allow_html=True)
 
+                # 顯示健康食品許可證 (比對表命中時)
+                if row['license_id']:
+                    st.markdown(f"🏅 **健康食品 {row['license_id']}**")
+                    if row['approved_effect']:
+                        st.caption(row['approved_effect'])
+
                 # 顯示標籤膠囊
-                highlights = [t.strip() for t in str(row['product_highlights']).split(";") if t.strip()]
+                highlights = split_highlights(row['product_highlights'])
                 if highlights:
                     st.markdown(" ".join([f"`{t}`" for t in highlights]))
 
                 # 顯示 AI 分析亮點
-                if row['product_highlights']:
-                    top_highlights = [t.strip() for t in str(row['product_highlights']).split(";") if t.strip()]
-                    st.caption(" • ".join(top_highlights[:3]))
+                if highlights:
+                    st.caption(" • ".join(highlights[:3]))
 
                 st.markdown("---")
+
+    # 預先在背景轉檔下一頁圖片，翻頁時直接命中本地縮圖
+    if page < total_pages:
+        next_urls = df['image_url'].to_numpy()[ordered_ids[start + page_size:start + 2 * page_size]]
+        image_cache.prefetch([u for u in map(card_image_url, next_urls) if u])
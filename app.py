@@ -4,11 +4,17 @@ import os
 import glob
 import re
 
+from data.dashboard_cache import data_version
+from data.image_cache import ThumbnailCache
+from data.product_record import normalize_frame
+
+# VITAGUIDE_DATA_DIR 可指向合成目錄 (benchmarks/catalog_gen.py) 做規模測試
+DATA_DIR = os.environ.get("VITAGUIDE_DATA_DIR", "data")
+
 # --- 頁面設定 ---
 st.set_page_config(page_title="大研生醫產品儀表板", layout="wide")
 
 # --- 資料載入與快取 ---
-@st.cache_data
 def calculate_specs_from_title(title, price):
     """從標題計算規格 (顆數/單位價格)，用於補全 Momo/PChome 資料"""
     if not isinstance(title, str) or not price: return 0, 0.0
@@ -32,8 +38,9 @@ def calculate_specs_from_title(title, price):
         return total_count, unit_price
     return 0, 0.0
 
-def load_data(folder_path):
-    """從資料夾載入所有 CSV 並合併 (包含大研官網、Momo、PChome)"""
+@st.cache_resource(max_entries=2, show_spinner="載入資料中...")
+def load_data(folder_path, version):
+    """從資料夾載入所有 CSV 並合併 (包含大研官網、Momo、PChome)；version 為資料檔 manifest 雜湊，檔案更新即失效"""
     all_files = glob.glob(os.path.join(folder_path, "*.csv"))
     df_list = []
     
@@ -61,16 +68,11 @@ def load_data(folder_path):
                 else:
                     df['source'] = 'Other'
 
-            # 數值轉換 (確保 price, total_count, unit_price 為數字)
-            for col in ['price', 'total_count', 'unit_price']:
-                if col in df.columns:
-                    df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-            
-            # 補全規格資料 (針對 Momo/PChome 等可能缺漏的來源)
-            if 'total_count' not in df.columns:
-                df['total_count'] = 0
-                df['unit_price'] = 0.0
-            
+            # 數值轉換：與存檔路徑同樣以 normalize_frame 轉型 (保留 tags 等額外欄位)
+            # 缺漏的規格 (Momo/PChome 等來源) 以 0 表示，下方再從標題計算
+            df = normalize_frame(df, keep_extra=True)
+            df['total_count'] = df['total_count'].fillna(0)
+
             # 對於 total_count 為 0 的資料，嘗試從標題計算
             mask = df['total_count'] == 0
             if mask.any():
@@ -88,6 +90,14 @@ def load_data(folder_path):
     # 合併所有來源的資料
     return pd.concat(df_list, ignore_index=True)
 
+# 每次 rerun 背景轉檔的筆數上限 (其餘沿用原始圖片網址，之後的 rerun 命中後即改用縮圖)
+CARD_THUMB_PREFETCH = 60
+
+@st.cache_resource
+def get_image_cache():
+    """本地縮圖快取 (與 2_lutein_app.py 共用同一個快取目錄)"""
+    return ThumbnailCache()
+
 # --- 產品卡片顯示函式 ---
 def display_products(df):
     """以卡片形式顯示產品資訊"""
@@ -95,6 +105,14 @@ def display_products(df):
         st.warning("此分類下沒有找到對應的產品。")
         return
 
+    # 圖片改用本地縮圖：已快取者直接命中，未快取者先用原圖並在背景轉檔 (不阻塞頁面)
+    image_cache = get_image_cache()
+    image_urls = df['image_url'].tolist() if 'image_url' in df.columns else [None] * len(df)
+    source_urls = [u if isinstance(u, str) and u.startswith('http') else None for u in image_urls]
+    thumb_paths = image_cache.lookup_many(source_urls)
+    thumbs = [p or u or image_cache.placeholder_path for u, p in zip(source_urls, thumb_paths)]
+    image_cache.prefetch([u for u, p in zip(source_urls, thumb_paths) if u and not p][:CARD_THUMB_PREFETCH])
+
     # 每行顯示 3 個產品
     cols = st.columns(3)
     for i, row in enumerate(df.itertuples()):
@@ -104,8 +122,7 @@ def display_products(df):
             st.subheader(row.title)
             st.caption(f"來源: {getattr(row, 'source', '未知')}")
             
-            if hasattr(row, 'image_url') and pd.notna(row.image_url) and row.image_url:
-                st.image(row.image_url, use_column_width=True, caption=f"價格: ${row.price:,.0f}")
+            st.image(thumbs[i], use_column_width=True, caption=f"價格: ${row.price:,.0f}")
 
             # 顯示規格與標籤
             if hasattr(row, 'total_count') and row.total_count > 0 and hasattr(row, 'unit_price') and row.unit_price > 0:
@@ -115,14 +132,14 @@ def display_products(df):
                 st.markdown(f"**特色:** `{row.tags}`")
 
             # 提供購買連結
-            if hasattr(row, 'url') and pd.notna(row.url):
+            if hasattr(row, 'url') and pd.notna(row.url) and row.url:
                 st.link_button("前往購買 ➔", row.url)
             st.markdown("---")
 
 # --- 主應用程式 ---
 st.title("大研生醫產品儀表板")
 
-df = load_data('data')
+df = load_data(DATA_DIR, data_version(DATA_DIR))
 
 if not df.empty:
     # 側邊欄篩選：讓使用者可以選擇要看哪個平台的資料
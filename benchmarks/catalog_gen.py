@@ -0,0 +1,311 @@
+import argparse
+import json
+import os
+import sys
+import time
+from xml.sax.saxutils import escape
+
+import numpy as np
+import pandas as pd
+
+# 確保可從專案根目錄匯入模組
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from data.product_record import UNIFIED_SCHEMA
+
+# ==========================================
+# 大型合成商品目錄 (規模測試用，Unified Schema)
+# ==========================================
+# 輸出：<out>/d2c_full_database.csv、<out>/<類別>_data.csv (電商平台)、
+#       <out>/sitemaps/<host>/sitemap_index.xml + sitemap_N.xml、<out>/html/*.html + manifest.json
+# 儀表板 / 微基準測試以 VITAGUIDE_DATA_DIR=<out> 讀取
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+DEFAULT_OUT = os.path.join(ROOT, "benchmarks", "synthetic")
+# D2C 品牌官網佔總筆數的比例 (其餘為電商平台商品，依類別寫入 <類別>_data.csv)
+D2C_SHARE = 0.4
+# 每個 sitemap 檔的網址上限 (sitemaps.org 規範)
+SITEMAP_CHUNK = 50_000
+# sitemap 中混入的非產品頁比例 (部落格 / 關於我們)，供 is_likely_product 過濾
+SITEMAP_NOISE = 0.15
+DEFAULT_HTML_PAGES = 200
+
+# 品牌官網：host 與商品頁網址樣式 ({slug} / {code} / {id})
+D2C_BRANDS = [
+    {"brand": "大研生醫", "host": "www.daikenshop.com", "url": "/product.php?code=4710255{code}", "weight": 3},
+    {"brand": "營養師輕食", "host": "www.dietician.com.tw", "url": "/products/item/{id}-{slug}.html", "weight": 2},
+    {"brand": "VITABOX", "host": "shop.vitabox.com.tw", "url": "/products/{slug}", "weight": 2},
+    {"brand": "配方時代", "host": "healthformula.com.tw", "url": "/{slug}/", "weight": 1},
+    {"brand": "悠活原力", "host": "www.yohopower.tw", "url": "/products/{slug}", "weight": 3},
+    {"brand": "九五之丹", "host": "www.95dan.com.tw", "url": "/{slug}", "weight": 1},
+    {"brand": "達摩本草", "host": "www.damokampo.com", "url": "/products/{slug}", "weight": 2},
+    {"brand": "寶齡富錦", "host": "www.pbfbio.com.tw", "url": "/products/{slug}", "weight": 1},
+    {"brand": "火星生技", "host": "www.taizaku.shop", "url": "/products/{slug}", "weight": 1},
+    {"brand": "大醫生技", "host": "www.greencome.com.tw", "url": "/products/{slug}", "weight": 1},
+]
+# 電商平台：商品頁網址樣式與平台上的品牌
+MARKETPLACES = [
+    {"source": "PChome", "url": "https://24h.pchome.com.tw/prod/DB{pc1}-A9{pc2}", "weight": 2},
+    {"source": "MOMO", "url": "https://www.momoshop.com.tw/goods/GoodsDetail.jsp?i_code={id}", "weight": 1},
+]
+MARKET_BRANDS = ["明亮系列", "德國頂級", "善存", "白蘭氏", "桂格", "娘家", "台塑生醫", "葡萄王", "健康力", "赫而司", "挺立", "我的健康日記"]
+
+# 類別：商品名稱片段、劑型、單瓶數量選項、60 粒的價格中位數 (NT$)、亮點詞彙、網址 slug 字根
+CATEGORIES = {
+    "葉黃素": {
+        "names": ["游離型葉黃素", "金盞花萃取葉黃素", "視易適葉黃素", "高濃度葉黃素", "蝦紅素複方葉黃素", "晶亮葉黃素"],
+        "forms": ["膠囊", "軟膠囊", "錠", "凍"], "counts": [30, 60, 90, 120], "median": 980,
+        "highlights": ["FloraGLO專利", "游離型", "添加蝦紅素", "玉米黃素", "SGS檢驗", "國家認證", "美國專利", "高吸收率"],
+        "slug": "lutein",
+    },
+    "益生菌": {
+        "names": ["專利益生菌", "順暢益生菌", "兒童益生菌", "女性私密益生菌", "300億益生菌", "雙歧桿菌益生菌"],
+        "forms": ["膠囊", "粉包", "錠"], "counts": [30, 60, 90], "median": 1280,
+        "highlights": ["LP28專利菌", "耐胃酸", "300億活菌", "添加益生元", "無添加", "國家健康食品認證", "日本專利", "兒童適用"],
+        "slug": "probiotic",
+    },
+    "魚油": {
+        "names": ["rTG高濃度魚油", "Omega-3魚油", "深海魚油", "藻油DHA", "84%高濃度魚油", "磷蝦油"],
+        "forms": ["軟膠囊", "膠囊"], "counts": [60, 90, 120, 180], "median": 1180,
+        "highlights": ["rTG型式", "Omega-3 84%", "IFOS五星認證", "小分子", "無腥味", "DHA+EPA", "MSC永續漁業", "重金屬檢驗"],
+        "slug": "fish-oil",
+    },
+    "其他": {
+        "names": ["膠原蛋白", "維他命C", "B群", "鈣鎂鋅", "薑黃", "瑪卡", "葡萄糖胺", "紅麴"],
+        "forms": ["錠", "膠囊", "粉包", "飲"], "counts": [30, 60, 90, 120], "median": 890,
+        "highlights": ["日本專利", "素食可", "SGS檢驗", "緩釋錠", "國家認證", "無添加", "高含量", "台灣製造"],
+        "slug": "supplement",
+    },
+}
+# 一般消費者會買的組數分布
+BUNDLES = [1, 1, 1, 1, 2, 3, 3, 6]
+UNITS = {"膠囊": "粒", "軟膠囊": "粒", "錠": "錠", "凍": "條", "粉包": "條", "飲": "瓶"}
+# 與 calculate_unit_price 一致：只有粒 / 顆 / 錠計入總顆數，其餘劑型總顆數留空、單價為 0
+COUNTED_UNITS = ("粒", "顆", "錠")
+
+
+def _weighted(rng, items, n):
+    weights = np.array([item["weight"] for item in items], dtype=float)
+    return rng.choice(len(items), size=n, p=weights / weights.sum())
+
+
+def _price(rng, median, count, bundle):
+    """對數常態價格：以 60 粒中位數依數量 / 組數縮放 (組合價略打折)，尾數取 0 或 9。"""
+    base = median * (count / 60) ** 0.8 * bundle * np.where(bundle > 1, 0.92, 1.0)
+    raw = rng.lognormal(np.log(base), 0.35)
+    price = np.maximum(np.round(raw / 10) * 10, 99)
+    return np.where(rng.random(len(price)) < 0.3, price - 1, price).astype(int)
+
+
+def _pick_per_category(rng, category, cat_names, key):
+    """每筆商品在所屬類別的 CATEGORIES[...][key] 中均勻抽一個索引 (各類別選項數不同，不可共用同一個上限再取餘數)。"""
+    picks = np.zeros(len(category), dtype=int)
+    for c, name in enumerate(cat_names):
+        mask = category == c
+        picks[mask] = rng.integers(0, len(CATEGORIES[name][key]), size=int(mask.sum()))
+    return picks
+
+
+def generate_catalog(n, seed=42):
+    """產生 n 筆 Unified Schema 商品 (DataFrame，另含 category / host 欄位供輸出分檔)。"""
+    rng = np.random.default_rng(seed)
+    cat_names = list(CATEGORIES)
+    category = rng.choice(len(cat_names), size=n, p=[0.3, 0.25, 0.25, 0.2])
+    is_d2c = rng.random(n) < D2C_SHARE
+    d2c_idx = _weighted(rng, D2C_BRANDS, n)
+    mp_idx = _weighted(rng, MARKETPLACES, n)
+    mp_brand = rng.integers(0, len(MARKET_BRANDS), size=n)
+    name_pick = _pick_per_category(rng, category, cat_names, "names")
+    form_pick = _pick_per_category(rng, category, cat_names, "forms")
+    count_pick = _pick_per_category(rng, category, cat_names, "counts")
+    bundle = np.array(BUNDLES)[rng.integers(0, len(BUNDLES), size=n)]
+    n_highlights = rng.integers(2, 6, size=n)
+    spec_style = rng.integers(0, 3, size=n)
+
+    rows = {col: [None] * n for col in UNIFIED_SCHEMA}
+    rows["category"] = [None] * n
+    rows["host"] = [None] * n
+    counts = np.zeros(n, dtype=int)
+    counted = np.zeros(n, dtype=bool)
+    for i in range(n):
+        cat = CATEGORIES[cat_names[category[i]]]
+        name = cat["names"][name_pick[i]]
+        form = cat["forms"][form_pick[i]]
+        count = cat["counts"][count_pick[i]]
+        unit = UNITS[form]
+        counts[i] = count
+        counted[i] = unit in COUNTED_UNITS
+        b = int(bundle[i])
+        if is_d2c[i]:
+            site = D2C_BRANDS[d2c_idx[i]]
+            brand, source, host = site["brand"], "D2C_Hunter", site["host"]
+            url = "https://" + host + site["url"].format(
+                slug=f"{cat['slug']}-{i:x}", code=f"{i % 1_000_000:06d}", id=i,
+            )
+        else:
+            market = MARKETPLACES[mp_idx[i]]
+            brand, source, host = MARKET_BRANDS[mp_brand[i]], market["source"], ""
+            url = market["url"].format(pc1=f"{i % 1296:03X}"[:3], pc2=f"{i:07X}", id=8_000_000 + i)
+        # 規格字串三種寫法：(60粒/盒)、60粒x3、(60粒/盒) 三盒組
+        if b == 1:
+            spec = f"({count}{unit}/盒)"
+        elif spec_style[i] == 0:
+            spec = f"{count}{unit}x{b}"
+        elif spec_style[i] == 1:
+            spec = f"({count}{unit}/盒) x{b}盒"
+        else:
+            spec = f"({count}{unit}/盒) {b}入組"
+        picks = rng.choice(len(cat["highlights"]), size=int(n_highlights[i]), replace=False)
+
+        rows["source"][i] = source
+        rows["brand"][i] = brand
+        rows["title"][i] = f"【{brand}】{name}{form} {spec}"
+        rows["url"][i] = url
+        rows["image_url"][i] = f"https://cdn.synthetic.invalid/{host or source.lower()}/{i}.jpg"
+        rows["product_highlights"][i] = ";".join(cat["highlights"][p] for p in picks)
+        rows["category"][i] = cat_names[category[i]]
+        rows["host"][i] = host
+
+    medians = np.array([CATEGORIES[c]["median"] for c in cat_names])[category]
+    price = _price(rng, medians, counts, bundle)
+    total = counts * bundle
+    rows["price"] = price
+    rows["total_count"] = pd.array(np.where(counted, total, 0), dtype="Int64")
+    rows["total_count"][~counted] = pd.NA
+    rows["unit_price"] = np.where(counted, np.round(price / total, 2), 0.0)
+    return pd.DataFrame(rows)
+
+
+def write_csvs(df, out_dir):
+    """D2C 商品 → d2c_full_database.csv；電商平台商品依類別 → <類別>_data.csv (檔名供儀表板推斷類別)。"""
+    paths = []
+    d2c = df[df["source"] == "D2C_Hunter"]
+    path = os.path.join(out_dir, "d2c_full_database.csv")
+    d2c[list(UNIFIED_SCHEMA)].to_csv(path, index=False, encoding="utf-8-sig")
+    paths.append(path)
+    market = df[df["source"] != "D2C_Hunter"]
+    for category, part in market.groupby("category"):
+        path = os.path.join(out_dir, f"{category}_data.csv")
+        part[list(UNIFIED_SCHEMA)].to_csv(path, index=False, encoding="utf-8-sig")
+        paths.append(path)
+    return paths
+
+
+def write_sitemaps(df, out_dir, seed=42, base_url=None):
+    """
+    每個品牌官網一組 sitemap：sitemap_index.xml → sitemap_N.xml (每檔最多 SITEMAP_CHUNK 個網址，含非產品頁雜訊)。
+    sitemap_index.xml 指向產生出來的本地檔案：預設為相對輸出目錄的路徑 (sitemaps/<host>/sitemap_N.xml)；
+    base_url 不為 None 時加上此前綴 (例如以 python -m http.server -d <out> 提供時的 http://127.0.0.1:8000)。
+    """
+    rng = np.random.default_rng(seed + 1)
+    written = 0
+    for host, part in df[df["host"] != ""].groupby("host"):
+        urls = part["url"].tolist()
+        noise = [f"https://{host}/{kind}/{i}" for i, kind in enumerate(rng.choice(["blog", "news", "about", "faq"], size=int(len(urls) * SITEMAP_NOISE)))]
+        urls = urls + noise
+        rng.shuffle(urls)
+        site_dir = os.path.join(out_dir, "sitemaps", host)
+        os.makedirs(site_dir, exist_ok=True)
+        names = []
+        for k in range(0, len(urls), SITEMAP_CHUNK):
+            name = f"sitemap_{k // SITEMAP_CHUNK + 1}.xml"
+            names.append(name)
+            with open(os.path.join(site_dir, name), "w", encoding="utf-8") as f:
+                f.write('<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+                f.writelines(f"<url><loc>{escape(u)}</loc></url>\n" for u in urls[k:k + SITEMAP_CHUNK])
+                f.write("</urlset>\n")
+        with open(os.path.join(site_dir, "sitemap_index.xml"), "w", encoding="utf-8") as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+            f.writelines(f"<sitemap><loc>{escape(_sitemap_loc(host, name, base_url))}</loc></sitemap>\n" for name in names)
+            f.write("</sitemapindex>\n")
+        written += len(urls)
+    return written
+
+
+def _sitemap_loc(host, name, base_url=None):
+    path = f"sitemaps/{host}/{name}"
+    return f"{base_url.rstrip('/')}/{path}" if base_url else path
+
+
+_PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="zh-Hant"><head>
+<meta charset="utf-8"><title>{title} | {brand}</title>
+<meta property="og:type" content="product"><meta property="og:title" content="{title}">
+<meta property="og:image" content="{image}">
+<script type="application/ld+json">{ld}</script>
+<script>window.dataLayer = window.dataLayer || []; window.__ts = {ts};</script>
+<style>.price {{ color: #c00; }}</style>
+</head><body>
+<header><nav><a href="/">首頁</a> <a href="/blog">保健知識</a> <a href="/about">關於我們</a></nav></header>
+<main><h1>{title}</h1>
+<div class="product-price"><span class="price">NT${price_text}</span></div>
+<ul class="highlights">{items}</ul>
+<p>{desc}</p></main>
+<footer>© {brand} 客服信箱 service@example.invalid</footer>
+</body></html>
+"""
+
+
+def write_html(df, out_dir, pages=DEFAULT_HTML_PAGES, seed=42):
+    """抽樣 D2C 商品產生商品頁 HTML (JSON-LD + DOM 價格)，manifest.json 記錄每頁的正確標題 / 價格供 extractor 驗證。"""
+    d2c = df[df["source"] == "D2C_Hunter"]
+    if d2c.empty or pages <= 0:
+        return 0
+    sample = d2c.sample(n=min(pages, len(d2c)), random_state=seed)
+    html_dir = os.path.join(out_dir, "html")
+    os.makedirs(html_dir, exist_ok=True)
+    manifest = []
+    for k, row in enumerate(sample.itertuples(index=False)):
+        ld = json.dumps({
+            "@context": "https://schema.org", "@type": "Product", "name": row.title, "brand": row.brand,
+            "offers": {"@type": "Offer", "price": str(row.price), "priceCurrency": "TWD"},
+        }, ensure_ascii=False)
+        items = "".join(f"<li>{escape(h)}</li>" for h in row.product_highlights.split(";"))
+        page = _PAGE_TEMPLATE.format(
+            title=escape(row.title), brand=escape(row.brand), image=row.image_url, ld=ld, ts=1_700_000_000 + k,
+            price_text=f"{row.price:,}", items=items, desc=escape("；".join(row.product_highlights.split(";")) * 20),
+        )
+        name = f"page_{k:05d}.html"
+        with open(os.path.join(html_dir, name), "w", encoding="utf-8") as f:
+            f.write(page)
+        manifest.append({"file": name, "url": row.url, "title": row.title, "price": int(row.price)})
+    with open(os.path.join(html_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    return len(manifest)
+
+
+def _parse_size(value):
+    value = str(value).lower()
+    return SIZES[value] if value in SIZES else int(value.replace("_", ""))
+
+
+if __name__ == "__main__":
+    # 用法：
+    #   python benchmarks/catalog_gen.py --size 100k                       # → benchmarks/synthetic/100k
+    #   VITAGUIDE_DATA_DIR=benchmarks/synthetic/100k streamlit run 2_lutein_app.py
+    #   VITAGUIDE_DATA_DIR=benchmarks/synthetic/100k python benchmarks/micro_bench.py
+    #   python benchmarks/catalog_gen.py --size 10k --base-url http://127.0.0.1:8000  # 搭配下行離線提供 sitemap
+    #   python -m http.server 8000 -d benchmarks/synthetic/10k
+    cli = argparse.ArgumentParser(description="產生大型合成商品目錄 (規模測試用)")
+    cli.add_argument("--size", default="10k", help="筆數：10k / 100k / 1m 或任意整數")
+    cli.add_argument("--out", default=None, help=f"輸出目錄 (預設 {DEFAULT_OUT}/<size>)")
+    cli.add_argument("--seed", type=int, default=42)
+    cli.add_argument("--html", type=int, default=DEFAULT_HTML_PAGES, help="產生的商品頁 HTML 數")
+    cli.add_argument("--no-sitemaps", action="store_true", help="不產生 sitemap XML")
+    cli.add_argument("--base-url", default=None, help="sitemap_index.xml 中子 sitemap 網址的前綴 (預設為相對輸出目錄的路徑)")
+    args = cli.parse_args()
+
+    n = _parse_size(args.size)
+    out_dir = args.out or os.path.join(DEFAULT_OUT, str(args.size).lower())
+    os.makedirs(out_dir, exist_ok=True)
+    start = time.perf_counter()
+    catalog = generate_catalog(n, seed=args.seed)
+    print(f"🧪 [CatalogGen] 產生 {n:,} 筆商品 ({time.perf_counter() - start:.1f}s)")
+    for path in write_csvs(catalog, out_dir):
+        print(f"  - {path}")
+    if not args.no_sitemaps:
+        print(f"  - sitemap：{write_sitemaps(catalog, out_dir, seed=args.seed, base_url=args.base_url):,} 個網址 → {os.path.join(out_dir, 'sitemaps')}")
+    pages = write_html(catalog, out_dir, args.html, seed=args.seed)
+    if pages:
+        print(f"  - HTML：{pages} 頁 → {os.path.join(out_dir, 'html')}")
+    print(f"✅ [CatalogGen] 完成 ({time.perf_counter() - start:.1f}s)：VITAGUIDE_DATA_DIR={out_dir}")
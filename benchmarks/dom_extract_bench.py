@@ -0,0 +1,98 @@
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from playwright.sync_api import sync_playwright
+
+# 確保可從專案根目錄匯入模組
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from general_scraper import MOMO_CARD_FIELDS, MOMO_CARD_ROOTS
+from scrapers.dom_extract import EXTRACT_STATS, extract_first_sync, print_extract_stats, record_extract
+
+# ==========================================
+# 列表頁抽取：逐卡片 locator (舊路徑) vs 單次 page.evaluate
+# ==========================================
+# 合成的 MOMO 列表頁卡片數 (實際搜尋頁約 60 張) 與量測輪數 (取中位數)
+CARDS = 60
+REPEAT = 5
+
+
+def momo_listing_html(cards=CARDS):
+    """與 MOMO 搜尋結果相同結構的合成列表頁 (.listGoodsData 卡片，含圖示 / 商品圖 / 銷量標語)。"""
+    items = []
+    for i in range(cards):
+        items.append(f"""
+        <li class="listGoodsData">
+          <a class="goodsUrl" href="/goods/GoodsDetail.jsp?i_code={1000000 + i}">
+            <img src="https://img.momoshop.com.tw/ecm/icon_{i}.png">
+            <img data-original="https://i1.momoshop.com.tw/goodsimg/{i}.jpg" src="data:image/gif;base64,R0lGOD">
+            <h3 class="prdName">【品牌{i % 7}】葉黃素 膠囊 60粒x{i % 3 + 1}盒</h3>
+            <p class="money"><span class="price">${990 + i * 10:,}</span><span class="slogan">總銷量&gt;{i * 37:,}</span></p>
+          </a>
+        </li>""")
+    return f"<html><body><ul id='CategoryContent'>{''.join(items)}</ul></body></html>"
+
+
+def locator_listing(page):
+    """重構前 general_scraper / 1_lutein_scraper 的逐卡片 locator 讀法 (每個欄位一次 IPC 往返)。"""
+    start = time.perf_counter()
+    items = []
+    for root in MOMO_CARD_ROOTS:
+        items = page.locator(root).all()
+        if items:
+            break
+    rows = []
+    for item in items:
+        row = {
+            "title": item.locator(".prdName").first.inner_text(),
+            "price_text": item.locator(".price, .money").first.inner_text(),
+            "link": item.get_attribute("href") or item.locator("a").first.get_attribute("href"),
+            "images": [img.get_attribute("data-original") or img.get_attribute("src") for img in item.locator("img").all()],
+        }
+        try:
+            row["slogan"] = item.locator(".money .slogan").first.inner_text(timeout=1000)
+        except Exception:
+            row["slogan"] = ""
+        rows.append(row)
+    record_extract("locator_loop", len(rows), (time.perf_counter() - start) * 1000)
+    return rows
+
+
+def run(cards=CARDS, repeat=REPEAT):
+    """回傳 {"locator_ms", "evaluate_ms"} (每頁中位數)。"""
+    EXTRACT_STATS.clear()
+    timings = {"locator_ms": [], "evaluate_ms": []}
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        page = browser.new_page()
+        page.set_content(momo_listing_html(cards))
+        for _ in range(repeat):
+            start = time.perf_counter()
+            old = locator_listing(page)
+            timings["locator_ms"].append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            new = extract_first_sync(page, MOMO_CARD_ROOTS, MOMO_CARD_FIELDS, label="momo_listing")
+            timings["evaluate_ms"].append((time.perf_counter() - start) * 1000)
+        browser.close()
+    if len(old) != len(new):
+        print(f"⚠️ [Bench] 兩種抽取的卡片數不同: locator {len(old)} / evaluate {len(new)}")
+    print_extract_stats()
+    return {name: statistics.median(values) for name, values in timings.items()}
+
+
+if __name__ == "__main__":
+    # 用法：python benchmarks/dom_extract_bench.py [--cards 60] [--repeat 5]
+    cli = argparse.ArgumentParser(description="列表頁 DOM 抽取：逐卡片 locator vs 單次 evaluate")
+    cli.add_argument("--cards", type=int, default=CARDS, help="合成列表頁的卡片數")
+    cli.add_argument("--repeat", type=int, default=REPEAT, help="輪數 (取中位數)")
+    args = cli.parse_args()
+
+    result = run(args.cards, args.repeat)
+    reduction = 1 - result["evaluate_ms"] / result["locator_ms"] if result["locator_ms"] else 0.0
+    print(f"📊 [Bench] {args.cards} 張卡片 / 頁：locator {result['locator_ms']:.0f} ms → "
+          f"evaluate {result['evaluate_ms']:.0f} ms (減少 {reduction:.0%})")
@@ -0,0 +1,221 @@
+import argparse
+import gc
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import pandas as pd
+
+# 確保可從專案根目錄匯入模組
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from general_scraper import calculate_unit_price, clean_image_url, extract_brand, extract_highlights
+from data.agent_d2c_scanner import AgentD2CScanner
+from data.sitemap_parser import SitemapParser
+from data.url_canon import canonicalize
+
+# ==========================================
+# 抽取熱路徑的微基準測試 (ops/s 與每次呼叫的記憶體配置)
+# ==========================================
+# 語料來源 (相對專案根目錄)；VITAGUIDE_DATA_DIR 可指向合成資料目錄 (benchmarks/catalog_gen.py)
+DATA_DIR = os.environ.get("VITAGUIDE_DATA_DIR", "data")
+HTML_FIXTURES = ["視易適葉黃素 - 大研生醫.html", "debug_page.html", "debug_vitabox_page.html"]
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baselines", "micro.json")
+# 每輪至少執行的秒數、取最快一輪的輪數
+MIN_TIME = 0.2
+REPEAT = 5
+# 記憶體量測抽樣的呼叫數 (tracemalloc 會讓程式變慢，不與計時同時進行)
+ALLOC_SAMPLE = 200
+# 比較時 ops/s 下降或記憶體增加超過此比例視為退步
+DEFAULT_THRESHOLD = 0.25
+# 記憶體差異小於此 bytes 數時不判定退步 (避免小配置的雜訊)
+ALLOC_NOISE_BYTES = 1024
+
+
+def load_corpus(data_dir=DATA_DIR):
+    """真實語料：各 CSV 的標題 / 價格 / 圖片網址，target_product_urls.json 與 CSV 的商品網址，以及存下的 HTML。"""
+    frames = []
+    for path in sorted(glob.glob(os.path.join(ROOT, data_dir, "*_data.csv"))) + [os.path.join(ROOT, data_dir, "d2c_full_database.csv")]:
+        if os.path.exists(path):
+            frames.append(pd.read_csv(path, usecols=lambda c: c in ("title", "price", "url", "image_url")))
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["title", "price", "url", "image_url"])
+
+    titles = [t for t in df["title"].dropna().astype(str) if t]
+    priced = [
+        (str(t), int(p)) for t, p in zip(df["title"], pd.to_numeric(df["price"], errors="coerce").fillna(0))
+        if isinstance(t, str) and t
+    ]
+    images = [u for u in df["image_url"].dropna().astype(str) if u]
+    urls = [u for u in df["url"].dropna().astype(str) if u]
+    target_path = os.path.join(ROOT, data_dir, "target_product_urls.json")
+    if os.path.exists(target_path):
+        with open(target_path, "r", encoding="utf-8") as f:
+            urls += [item["url"] for item in json.load(f) if item.get("url")]
+
+    html = []
+    # 合成目錄另有 html/*.html 商品頁 (catalog_gen.py --html)
+    for path in [os.path.join(ROOT, name) for name in HTML_FIXTURES] + sorted(glob.glob(os.path.join(ROOT, data_dir, "html", "*.html"))):
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                html.append(f.read())
+    return {"titles": titles, "priced": priced, "images": images, "urls": urls, "html": html}
+
+
+def build_cases(corpus):
+    """基準名稱 → (函式, 參數 tuple 清單)。"""
+    parser = SitemapParser()
+    # scan_url 收到的網址有一部分是 Markdown 連結格式
+    raw_urls = corpus["urls"] + [f"[{u}]({u})" for u in corpus["urls"][::4]]
+    return {
+        "extract_highlights": (extract_highlights, [(t,) for t in corpus["titles"]]),
+        "extract_brand": (extract_brand, [(t,) for t in corpus["titles"]]),
+        "calculate_unit_price": (calculate_unit_price, corpus["priced"]),
+        "clean_image_url": (clean_image_url, [(u,) for u in corpus["images"]]),
+        "is_likely_product": (parser.is_likely_product, [(u,) for u in corpus["urls"]]),
+        "extract_price_from_html": (AgentD2CScanner._extract_price_from_html_content, [(h,) for h in corpus["html"]]),
+        "normalize_url": (AgentD2CScanner._normalize_url, [(u,) for u in raw_urls]),
+        "canonicalize_url": (canonicalize, [(u,) for u in corpus["urls"]]),
+    }
+
+
+def _time_case(fn, inputs, min_time=MIN_TIME, repeat=REPEAT):
+    """整份語料跑一遍為一次 pass，累積超過 min_time 為一輪；取 repeat 輪中每次呼叫最快的平均秒數。"""
+    best = float("inf")
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            passes = 0
+            start = time.perf_counter()
+            while True:
+                for args in inputs:
+                    fn(*args)
+                passes += 1
+                elapsed = time.perf_counter() - start
+                if elapsed >= min_time:
+                    break
+            best = min(best, elapsed / (passes * len(inputs)))
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return best
+
+
+def _alloc_case(fn, inputs, sample=ALLOC_SAMPLE):
+    """每次呼叫的記憶體配置峰值 (bytes，tracemalloc)，抽樣前 sample 次呼叫取平均。"""
+    inputs = inputs[:sample]
+    tracemalloc.start()
+    try:
+        total = 0
+        for args in inputs:
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            fn(*args)
+            total += tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+    return total / len(inputs)
+
+
+def run(only=None, min_time=MIN_TIME, repeat=REPEAT, data_dir=DATA_DIR):
+    corpus = load_corpus(data_dir)
+    results = {}
+    for name, (fn, inputs) in build_cases(corpus).items():
+        if only and name not in only:
+            continue
+        if not inputs:
+            print(f"⚠️ [Bench] {name}: 語料為空，略過")
+            continue
+        # 先跑一遍暖身 (regex 編譯快取、lazy import)
+        for args in inputs:
+            fn(*args)
+        per_call = _time_case(fn, inputs, min_time, repeat)
+        results[name] = {
+            "ops_per_sec": round(1 / per_call, 1),
+            "us_per_op": round(per_call * 1e6, 3),
+            "alloc_bytes_per_op": round(_alloc_case(fn, inputs)),
+            "corpus_size": len(inputs),
+        }
+        r = results[name]
+        print(f"  - {name:<24} {r['ops_per_sec']:>12,.0f} ops/s  {r['us_per_op']:>10.2f} µs  {r['alloc_bytes_per_op']:>9,} B/op  (n={r['corpus_size']})")
+    return results
+
+
+def _meta():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()} / {os.cpu_count()} cpu",
+    }
+
+
+def save_baseline(results, path=DEFAULT_BASELINE):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"meta": _meta(), "results": results}, f, ensure_ascii=False, indent=2)
+    print(f"💾 [Bench] 基準已寫入: {path}")
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """與基準比較，回傳退步清單 [(名稱, 說明)]：ops/s 下降或每次呼叫配置增加超過 threshold。"""
+    regressions = []
+    for name, cur in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        speed = cur["ops_per_sec"] / base["ops_per_sec"] - 1
+        alloc_diff = cur["alloc_bytes_per_op"] - base["alloc_bytes_per_op"]
+        alloc = alloc_diff / base["alloc_bytes_per_op"] if base["alloc_bytes_per_op"] else 0.0
+        flag = ""
+        if speed < -threshold:
+            flag = "❌"
+            regressions.append((name, f"ops/s {speed:+.0%}"))
+        if alloc > threshold and alloc_diff > ALLOC_NOISE_BYTES:
+            flag = "❌"
+            regressions.append((name, f"alloc {alloc:+.0%}"))
+        print(f"  {flag or '✅'} {name:<24} ops/s {speed:+7.1%}   alloc {alloc:+7.1%}")
+    return regressions
+
+
+if __name__ == "__main__":
+    # 用法：
+    #   python benchmarks/micro_bench.py                     # 執行並列出結果
+    #   python benchmarks/micro_bench.py --save              # 寫入基準 (預設 benchmarks/baselines/micro.json)
+    #   python benchmarks/micro_bench.py --compare           # 與基準比較，退步超過門檻時 exit 1
+    cli = argparse.ArgumentParser(description="抽取熱路徑微基準測試")
+    cli.add_argument("--save", nargs="?", const=DEFAULT_BASELINE, default=None, help="寫入基準 JSON")
+    cli.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, default=None, help="與基準 JSON 比較")
+    cli.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="退步門檻 (0.25 = 25%%)")
+    cli.add_argument("--only", action="append", default=None, help="只執行指定基準 (可重複)")
+    cli.add_argument("--min-time", type=float, default=MIN_TIME, help="每輪最少秒數")
+    cli.add_argument("--repeat", type=int, default=REPEAT, help="輪數 (取最快)")
+    args = cli.parse_args()
+
+    print(f"⏱️ [Bench] 微基準測試 (每輪 ≥ {args.min_time}s，取 {args.repeat} 輪最快)")
+    results = run(only=args.only, min_time=args.min_time, repeat=args.repeat)
+    if args.save:
+        save_baseline(results, args.save)
+    if args.compare:
+        if not os.path.exists(args.compare):
+            print(f"❌ [Bench] 找不到基準: {args.compare} (先以 --save 建立)")
+            sys.exit(2)
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\n📊 [Bench] 與基準比較 ({baseline.get('meta', {}).get('commit', '?')}，門檻 {args.threshold:.0%})")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"❌ [Bench] {len(regressions)} 項退步：" + "、".join(f"{n} ({d})" for n, d in regressions))
+            sys.exit(1)
+        print("✅ [Bench] 無退步")
@@ -1,15 +1,13 @@
 import asyncio
 import random
-import pandas as pd
 import os
 import re
 import json
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin
-from playwright.async_api import async_playwright
-from playwright_stealth import stealth_async
+from scrapers.catalog_engine import CatalogScraper
 import google.generativeai as genai
 from dotenv import load_dotenv
+from data.llm_backend import LLM_BACKEND, get_llm_backend
 
 # 載入 .env 檔案中的環境變數 (安全做法)
 # 使用絕對路徑確保能找到 .env，無論從哪裡執行程式
@@ -24,10 +22,13 @@ print(f"🔍 Debug: 檔案是否存在: {os.path.exists(env_path)}")
 
 load_dotenv(env_path, override=True)
 
-# 檢查 API Key 是否存在
-if "GOOGLE_API_KEY" not in os.environ:
+# 檢查 API Key 是否存在 (D2C_LLM_BACKEND=local 時改用本機替身伺服器，不需要 API Key)
+if "GOOGLE_API_KEY" not in os.environ and LLM_BACKEND == "gemini":
     print("⚠️ 警告：未偵測到 GOOGLE_API_KEY。請在專案根目錄建立 .env 檔案並設定 GOOGLE_API_KEY=...，否則 AI 分析功能將失效。")
 
+# 各次呼叫共用同一個 LLM 後端 (首次呼叫時建立)
+_llm = None
+
 async def extract_highlights_with_llm(html_content):
     """
     使用 LLM 分析網頁內容，提取產品核心亮點。
@@ -61,14 +62,14 @@ async def extract_highlights_with_llm(html_content):
     }}
     """
 
-    # 檢查 API Key
-    if "GOOGLE_API_KEY" not in os.environ:
-        print("⚠️ 未設定 GOOGLE_API_KEY，跳過 AI 分析")
+    # 設定 LLM 後端 (預設 Gemini gemini-2.0-flash，速度快且支援 JSON mode；D2C_LLM_BACKEND=local 為本機替身)
+    global _llm
+    if _llm is None:
+        _llm = get_llm_backend(generation_config={"response_mime_type": "application/json", "temperature": 0.2})
+    llm = _llm
+    if not llm.enabled:
+        print(f"⚠️ {llm.unavailable_reason}，跳過 AI 分析")
         return {"product_name": "Unknown", "product_highlights": ""}
-
-    # 設定 Gemini (使用 gemini-2.0-flash 模型，速度快且支援 JSON mode)
-    genai.configure(api_key=os.environ["GOOGLE_API_KEY"])
-    model = genai.GenerativeModel('gemini-2.0-flash', generation_config={"response_mime_type": "application/json", "temperature": 0.2})
     
     full_prompt = f"You are a helpful assistant that extracts structured product data from HTML text.\n\n{prompt}"
 
@@ -77,7 +78,7 @@ async def extract_highlights_with_llm(html_content):
     for attempt in range(max_retries + 1):
         try:
             # 呼叫 API
-            response = await model.generate_content_async(full_prompt)
+            response = await llm.generate(full_prompt)
 
             # 監控 Token 使用量
             if response.usage_metadata:
@@ -99,7 +100,7 @@ async def extract_highlights_with_llm(html_content):
             else:
                 print(f"LLM 分析失敗: {e}")
                 # 若發生 404 錯誤，嘗試列出可用模型以供除錯
-                if "404" in error_msg:
+                if "404" in error_msg and llm.name == "gemini":
                     print("ℹ️ 提示：您的 API Key 可能無法存取目前的模型名稱。可用模型列表如下：")
                     try:
                         for m in genai.list_models():
@@ -111,12 +112,6 @@ async def extract_highlights_with_llm(html_content):
     # 回傳預設空值以免程式崩潰
     return {"product_name": "Unknown", "product_highlights": ""}
 
-async def random_sleep(min_sec=3, max_sec=7):
-    """異步等待一個隨機的秒數，模擬真人停頓。"""
-    sleep_time = random.uniform(min_sec, max_sec)
-    # print(f"Simulating human behavior: waiting for {sleep_time:.2f} seconds...")
-    await asyncio.sleep(sleep_time)
-
 def calculate_unit_price(title, price, description=""):
     """從標題計算總顆粒數與單位價格 (針對營養師輕食優化)"""
     if not isinstance(title, str): return None, 0
@@ -196,244 +191,53 @@ def extract_tags(text):
     
     return " ".join(tags) if tags else ""
 
-async def scrape_dietician_all_products():
+async def enrich_with_llm(html_content, item):
+    """AI 亮點分析 (在頁面配額之外執行)；AI 無結果時保留規則標籤。"""
+    print("   🤖 正在呼叫 AI 進行語義分析...")
+    ai_result = await extract_highlights_with_llm(html_content)
+    highlights = ai_result.get("product_highlights", "")
+    if highlights:
+        item["product_highlights"] = highlights
+    return item
+
+# ==========================================
+# 營養師輕食品牌設定檔 (執行核心見 scrapers/catalog_engine.py)
+# ==========================================
+DIETICIAN_CATALOG = {
+    "source": "Dietician",
+    "brand": "營養師輕食",
+    "output_file": "data/d2c_dietician_products.csv",
+    "base_url": "https://www.dietician.com.tw",
+    # 首頁選單即包含所有產品連結
+    "list_urls": ["https://www.dietician.com.tw/"],
+    "link_pattern": r"/products/item/",
+    # 等待標題與價格文字出現，確保動態內容已載入
+    "ready_selectors": ["h1", 'body:has-text("NT$")'],
+    "title_selector": "h1",
+    # JSON-LD 最準確，其次 Meta Tags，最後內文正則
+    "price_strategies": ["jsonld", "meta", "text"],
+    # 200 元以下通常是加購價或運費，視為無效價格
+    "price_floor": 200,
+    # 優先抓取 .description (營養師輕食的規格通常在這裡)
+    "description_selectors": [".description", ".product-detail", ".content", "main"],
+    "block_markers": ["403", "Forbidden"],
+    "calculate_unit_price": calculate_unit_price,
+    "extract_tags": extract_tags,
+    "enrich": enrich_with_llm,
+    "workers": int(os.environ.get("DIETICIAN_WORKERS", "2")),
+    "max_rps": float(os.environ.get("DIETICIAN_MAX_RPS", "0.3")),
+}
+
+
+async def scrape_dietician_all_products(pool=None, workers=None, max_rps=None):
     """
     批量抓取營養師輕食所有產品資料。
+    pool: d2c_main 傳入的共用瀏覽器 (SharedBrowser)；單獨執行時為 None，自行啟動瀏覽器。
     """
-    list_url = "https://www.dietician.com.tw/"
-    base_url = "https://www.dietician.com.tw"
-    all_data = []
-    
-    headless_mode = True 
-
-    async with async_playwright() as p:
-        print(f"啟動瀏覽器 (Headless: {headless_mode})...")
-        browser = await p.chromium.launch(headless=headless_mode)
-        
-        # --- 步驟 1: 取得所有產品連結 ---
-        context = await browser.new_context(
-            viewport={'width': 1920, 'height': 1080},
-            user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36'
-        )
-        page = await context.new_page()
-        await stealth_async(page)
-
-        print(f"正在前往首頁抓取選單連結: {list_url}")
-        await page.goto(list_url, wait_until='networkidle', timeout=60000)
-        await random_sleep(2, 3)
-
-        # 滾動頁面確保載入
-        print("正在滾動頁面以載入列表...")
-        for _ in range(3):
-            await page.evaluate('window.scrollBy(0, window.innerHeight)')
-            await asyncio.sleep(1)
-
-        # 解析連結
-        content = await page.content()
-        soup = BeautifulSoup(content, 'html.parser')
-        
-        product_links = set()
-        current_url = page.url
-
-        for a in soup.find_all('a', href=True):
-            href = a['href']
-            full_link = urljoin(current_url, href)
-            
-            # 篩選條件：包含 /products/item/ (根據使用者提供的範例連結結構)
-            if '/products/item/' in full_link and base_url in full_link:
-                product_links.add(full_link)
-        
-        links = list(product_links)
-        print(f"共發現 {len(links)} 個不重複的產品連結。")
-        
-        await context.close()
-        context = None
-        page = None
-
-        # --- 步驟 2: 批量抓取詳情 ---
-        for i, link in enumerate(links):
-            retries = 0
-            max_retries = 2
-            success = False
-
-            while retries <= max_retries and not success:
-                # 每 30 筆請求預防性重置 Context
-                if context is None or (i > 0 and i % 30 == 0 and retries == 0):
-                    if context:
-                        print(f"\n--- 已處理 {i} 筆資料，啟動預防性冷卻與環境重置 ---")
-                        print("冷卻 20 秒...")
-                        await asyncio.sleep(20)
-                        await context.close()
-                    
-                    print("正在建立新的瀏覽器環境（更換身份）...")
-                    context = await browser.new_context(
-                        viewport={'width': 1920, 'height': 1080},
-                        user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36'
-                    )
-                    page = await context.new_page()
-                    await stealth_async(page)
-
-                if retries > 0:
-                    print(f"\n[{i+1}/{len(links)}] 正在重試: {link} (第 {retries} 次重試)")
-                else:
-                    print(f"\n[{i+1}/{len(links)}] 正在處理: {link}")
-            
-                try:
-                    await page.goto(link, wait_until='networkidle', timeout=60000)
-                    await random_sleep(3, 7) # 隨機等待 3-7 秒
-
-                    # 等待價格相關文字出現，確保動態內容已載入
-                    try:
-                        await page.locator('body').filter(has_text="NT$").first.wait_for(timeout=5000)
-                    except:
-                        pass
-
-                    # 等待關鍵元素 (價格或標題)
-                    try:
-                        await page.locator('h1').first.wait_for(state='visible', timeout=10000)
-                    except:
-                        print("等待標題超時，嘗試直接解析...")
-
-                    content = await page.content()
-                    soup = BeautifulSoup(content, 'html.parser')
-
-                    # 1. 產品名稱
-                    h1 = soup.find('h1')
-                    name = h1.get_text(strip=True) if h1 else ""
-
-                    # 檢查是否被封鎖
-                    if "403" in name or "Forbidden" in name:
-                        raise Exception(f"偵測到封鎖頁面 (Title: {name})")
-
-                    # 2. 價格解析 (多重策略)
-                    price_text_all = soup.get_text()
-                    prices = []
-                    original_price_val = 0
-                    special_price_val = 0
-                    
-                    # 策略 A: JSON-LD (最準確，營養師輕食有使用)
-                    json_ld = soup.find('script', type='application/ld+json')
-                    if json_ld:
-                        try:
-                            data = json.loads(json_ld.string)
-                            # 處理可能的列表或單一物件
-                            if isinstance(data, list): data = data[0]
-                            
-                            if data.get('@type') == 'Product':
-                                if not name: name = data.get('name', "Unknown")
-                                offers = data.get('offers', {})
-                                if isinstance(offers, dict):
-                                    p = offers.get('price')
-                                    if p:
-                                        special_price_val = int(float(p))
-                                        original_price_val = special_price_val # 暫時設為相同
-                        except:
-                            pass
-
-                    # 策略 B: Meta Tags (備用)
-                    meta_price = soup.find("meta", property="product:price:amount") or \
-                                 soup.find("meta", property="og:price:amount")
-                    if not special_price_val and meta_price and meta_price.get("content"):
-                        try:
-                            special_price_val = int(float(meta_price["content"]))
-                            original_price_val = special_price_val
-                        except:
-                            pass
-
-                    # 策略 C: 內文正則搜索 (最後手段)
-                    if not special_price_val:
-                        matches = re.findall(r'(?:NT\$?|\$)\s*(\d{1,3}(?:,\d{3})*|\d+)', price_text_all, re.IGNORECASE)
-                        for m in matches:
-                            try:
-                                val = int(m.replace(',', ''))
-                                # 過濾掉過低的價格 (例如 100 元通常是加購價或運費)
-                                if val > 200: 
-                                    prices.append(val)
-                            except:
-                                pass
-                        if prices:
-                            prices = sorted(list(set(prices)))
-                            if len(prices) > 1:
-                                original_price_val = prices[-1]
-                                special_price_val = prices[0]
-                            else:
-                                original_price_val = prices[0]
-                                special_price_val = prices[0]
-                    
-                    # 二次檢查：如果抓到的價格 <= 200，強制歸零或設為 Unknown，避免誤導
-                    if special_price_val <= 200:
-                        special_price_val = 0
-                        original_price_val = 0
-                    
-                    if not name: name = "Unknown"
-
-                    # 3. 圖片
-                    image_url = ""
-                    og_img = soup.find("meta", property="og:image")
-                    if og_img and og_img.get("content"):
-                        image_url = urljoin(base_url, og_img["content"])
-                    
-                    # 4. 規格與標籤
-                    # 抓取主要內容區塊
-                    desc_text = ""
-                    # 優先抓取 .description (營養師輕食的規格通常在這裡)
-                    for selector in [".description", ".product-detail", ".content", "main"]:
-                        elements = soup.select(selector)
-                        for el in elements:
-                            desc_text += el.get_text(" ", strip=True) + " "
-                    
-                    full_text_for_analysis = name + " " + desc_text
-                    tags = extract_tags(full_text_for_analysis)
-                    total_count, unit_price = calculate_unit_price(name, special_price_val, desc_text)
-                    
-                    # 5. AI 亮點分析
-                    print("   🤖 正在呼叫 AI 進行語義分析...")
-                    ai_result = await extract_highlights_with_llm(content)
-                    highlights = ai_result.get("product_highlights", "")
-
-                    print(f"成功抓取: {name} | 特價: {special_price_val} | 規格: {total_count} | 標籤: '{tags}' | 亮點: {highlights[:20]}...")
-
-                    all_data.append({
-                        "source": "Dietician",
-                        "brand": "營養師輕食",
-                        "title": name,
-                        "price": special_price_val,
-                        "unit_price": unit_price,
-                        "total_count": total_count,
-                        "url": link,
-                        "image_url": image_url,
-                        "product_highlights": highlights if highlights else tags
-                    })
-                    
-                    success = True
-
-                except Exception as e:
-                    if "403" in str(e) or "Forbidden" in str(e):
-                        print(f"被封鎖或 403 錯誤: {e}")
-                        retries += 1
-                        if retries <= max_retries:
-                            print("啟動冷卻機制：等待 30 秒後重試...")
-                            await asyncio.sleep(30)
-                            if context: await context.close()
-                            context = None
-                        else:
-                            print(f"放棄此連結 {link}")
-                    else:
-                        print(f"抓取失敗 {link}: {e}")
-                        break
-        
-        await browser.close()
-
-    # 存檔
-    if all_data:
-        if not os.path.exists('data'):
-            os.makedirs('data')
-        df = pd.DataFrame(all_data)
-        output_path = 'data/d2c_dietician_products.csv'
-        df.to_csv(output_path, index=False, encoding='utf-8-sig')
-        print(f"\n全部完成！共 {len(df)} 筆資料已儲存至 {output_path}")
-    else:
-        print("\n未抓取到任何資料。")
+    scraper = CatalogScraper(DIETICIAN_CATALOG, pool=pool, workers=workers, max_rps=max_rps)
+    await scraper.run()
+    scraper.save_to_csv()
+    return scraper.data
 
 if __name__ == '__main__':
-    asyncio.run(scrape_dietician_all_products())
\ No newline at end of file
+    asyncio.run(scrape_dietician_all_products())
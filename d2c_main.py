@@ -4,27 +4,35 @@ import os
 from d2c_daiken_crawler import scrape_daiken_all_products
 from d2c_dietician_crawler import scrape_dietician_all_products
 from d2c_vitabox_crawler import VitaboxStealthCrawler
+from scrapers.browser_pool import SharedBrowser
 
-async def run_vitabox():
+async def run_vitabox(pool):
     """封裝 Vitabox 爬蟲執行邏輯"""
     print("🚀 [Vitabox] 任務啟動...")
     crawler = VitaboxStealthCrawler()
-    await crawler.run()
+    await crawler.run(pool)
     crawler.save_csv()
     print("✅ [Vitabox] 任務完成")
 
-async def run_daiken():
+async def run_daiken(pool):
     """封裝大研生醫爬蟲執行邏輯"""
     print("🚀 [Daiken] 任務啟動...")
-    await scrape_daiken_all_products()
+    await scrape_daiken_all_products(pool)
     print("✅ [Daiken] 任務完成")
 
-async def run_dietician():
+async def run_dietician(pool):
     """封裝營養師輕食爬蟲執行邏輯"""
     print("🚀 [Dietician] 任務啟動 (含 AI 分析)...")
-    await scrape_dietician_all_products()
+    await scrape_dietician_all_products(pool)
     print("✅ [Dietician] 任務完成")
 
+# 新增品牌爬蟲時只需加入此清單 (名稱, async fn(pool))
+CRAWLERS = [
+    ("Daiken", run_daiken),
+    ("Vitabox", run_vitabox),
+    ("Dietician", run_dietician),
+]
+
 async def main():
     start_time = time.time()
     print("="*50)
@@ -34,13 +42,11 @@ async def main():
     # 確保資料夾存在
     os.makedirs("data", exist_ok=True)
 
-    # 平行執行所有爬蟲
-    # 注意：這會同時開啟多個瀏覽器視窗，請確保系統資源充足
-    await asyncio.gather(
-        run_daiken(),
-        run_vitabox(),
-        run_dietician()
-    )
+    # 平行執行所有爬蟲，共用同一個瀏覽器
+    # 同時作業的頁面數依記憶體/CPU 預算限制 (D2C_MEMORY_BUDGET_MB / D2C_PAGE_SLOT_MB)，並由各爬蟲公平分配
+    async with SharedBrowser(headless=True) as pool:
+        await asyncio.gather(*(pool.run(name, fn) for name, fn in CRAWLERS))
+    pool.print_report()
 
     end_time = time.time()
     duration = end_time - start_time
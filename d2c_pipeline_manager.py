@@ -1,9 +1,11 @@
 import asyncio
-import pandas as pd
 import os
 from data.serp_discovery import SerpDiscovery
 from data.sitemap_parser import SitemapParser
 from data.agent_d2c_scanner import AgentD2CScanner
+from data.entity_resolution import run_resolution
+from data.price_history import record_observations
+from data.product_record import records_to_frame
 
 async def run_pipeline():
     print("🚀 [Pipeline] D2C 獵人自動化系統啟動...")
@@ -68,21 +70,18 @@ async def run_pipeline():
     # --- Step 4: Save Data (存檔) ---
     print("\n--- Phase 4: Data Saving ---")
     if all_products_data:
-        df = pd.DataFrame(all_products_data)
-        
-        # 確保欄位順序符合 Unified Schema
-        schema = ["source", "brand", "title", "price", "unit_price", "total_count", "url", "image_url", "product_highlights"]
-        # 補全缺失欄位
-        for col in schema:
-            if col not in df.columns:
-                df[col] = ""
-        
-        df = df[schema] # 重排
+        # 欄位順序與型別符合 Unified Schema
+        df = records_to_frame(all_products_data)
         
         os.makedirs("data", exist_ok=True)
         output_file = "data/d2c_full_database.csv"
         df.to_csv(output_file, index=False, encoding="utf-8-sig")
         print(f"💾 資料已儲存至: {output_file} (共 {len(df)} 筆)")
+        record_observations(df)
+
+        # 跨通路歸戶：只為新報價計算簽章，既有商品沿用 canonical_id
+        result = run_resolution()
+        print(f"🧩 歸戶完成: {result['entities']} 個商品 (跨通路 {result['multi_source']} 個，新報價 {result['new']} 筆)")
     else:
         print("⚠️ 本次任務未採集到任何有效資料。")
 
@@ -8,6 +8,9 @@ from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeo
 from playwright_stealth import stealth_sync
 from bs4 import BeautifulSoup
 
+from data.price_history import record_observations
+from scrapers.dom_extract import extract_all_sync, print_extract_stats
+
 # ==========================================
 # 共享工具函式 (從 general_scraper.py 移轉)
 # ==========================================
@@ -129,15 +132,19 @@ def scrape_d2c_site(config, keyword_filter, max_retries=2):
                     time.sleep(random.uniform(2, 4))
 
                 # 3. 抓取所有商品連結
-                all_items = page.locator(config["selectors"]["list_item"]).all()
+                # 一次 evaluate 取回所有卡片的標題與連結，不再逐卡片 locator 往返
+                all_items = extract_all_sync(page, config["selectors"]["list_item"], {
+                    "title": {"selector": config["selectors"]["list_title"], "default": ""},
+                    "link": {"selector": config["selectors"]["product_url"], "attr": "href"},
+                }, label="d2c_listing")
                 print(f"🕵️‍♂️ 找到 {len(all_items)} 個產品項目，開始過濾...")
                 for item in all_items:
                     try:
                         # 過濾出包含關鍵字的商品
-                        title_text = item.locator(config["selectors"]["list_title"]).inner_text()
-                        print(f"   - 正在檢查: {title_text.strip()}") # 除錯：印出所有抓到的標題
+                        title_text = item["title"]
+                        print(f"   - 正在檢查: {title_text}") # 除錯：印出所有抓到的標題
                         if keyword_filter.lower() in title_text.lower():
-                            link = item.locator(config["selectors"]["product_url"]).get_attribute("href")
+                            link = item["link"]
                             if link and not link.startswith("http"):
                                 base_url = config['product_list_url'].split('/allgoods.php')[0]
                                 link = base_url + "/" + link.lstrip("/")
@@ -232,6 +239,7 @@ def scrape_d2c_site(config, keyword_filter, max_retries=2):
             print(f"❌ [D2C Scraper] 發生嚴重錯誤: {e}")
         finally:
             browser.close()
+            print_extract_stats()
             print("✅ 瀏覽器已關閉。")
 
     return data_list
@@ -255,6 +263,7 @@ if __name__ == "__main__":
         # --- 輸出 CSV，與現有格式兼容 ---
         filename = f"data/D2C_{TARGET_KEYWORD}_data.csv"
         df_d2c.to_csv(filename, index=False, encoding="utf-8-sig")
+        record_observations(df_d2c)
         
         print("\n\n" + "="*50)
         print("🎉 D2C 爬蟲任務完成！")
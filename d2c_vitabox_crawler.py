@@ -1,9 +1,14 @@
 import asyncio
 import random
-import pandas as pd
 import os
+import time
 from datetime import datetime
-from playwright.async_api import async_playwright
+
+from data.price_history import record_observations
+from data.product_record import records_to_frame
+from scrapers.browser_pool import acquire_browser, page_budget, page_slot
+from scrapers.dom_extract import absolute_image_url, extract_all, parse_int, print_extract_stats
+from scrapers.response_capture import ProductResponseCapture
 
 # 嘗試匯入 playwright_stealth，若無則提醒安裝
 try:
@@ -16,7 +21,32 @@ except ImportError:
 # 設定與常數
 # ==========================================
 TARGET_URL = "https://shop.vitabox.com.tw/categories/featured-products"  # Vitabox 產品列表頁
+BASE_URL = "https://shop.vitabox.com.tw"
 OUTPUT_FILE = "data/d2c_vitabox.csv"
+# 攔截模式：直接讀取商品列表 API 的 JSON，攔截不到時才改用 DOM 解析 (設為 0 可強制 DOM 模式)
+CAPTURE_MODE = os.environ.get("VITABOX_CAPTURE", "1") != "0"
+CAPTURE_WAIT_SECONDS = 8
+# 產品卡片欄位規格 (一次 page.evaluate 取回所有卡片)
+PRODUCT_CARD_ROOT = "a[href*='/products/'], a[href*='/product/']"
+PRODUCT_CARD_FIELDS = {
+    "title": {"selector": "h3, h4, .title, .product-title", "default": ""},
+    # 優先找特價，若無則找原價；a 標籤只是圖片時，價格在兄弟元素 (往上層找)
+    "price_text": {"selector": [".price, .money", {"css": "span", "contains": "NT$"}], "search_parent": True, "default": ""},
+    "href": {"attr": "href"},
+    "image": {"selector": "img", "attr": ["src", "data-src"], "default": ""},
+    "text": {"default": ""},
+}
+# Shopline 分頁結構：嘗試多種選擇器以確保能抓到下一頁按鈕
+NEXT_PAGE_SELECTORS = [
+    "a[rel='next']",                      # 標準語義
+    "li.next a",                          # 常見 Bootstrap 結構
+    ".pagination .next a",                # 另一種結構
+    ".pagination-next a",                 # Shopline 變體
+    "a:has-text('下一頁')",               # 中文文字
+    "a:has-text('Next')",                 # 英文文字
+    "a:has(i.fa-angle-right)",            # FontAwesome 圖示
+    "a:has(i.fa-chevron-right)"           # 另一種圖示
+]
 USER_AGENTS = [
     "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
@@ -25,8 +55,9 @@ USER_AGENTS = [
 ]
 
 class VitaboxStealthCrawler:
-    def __init__(self):
+    def __init__(self, capture=CAPTURE_MODE):
         self.data = []
+        self.capture = capture
 
     async def human_like_delay(self, min_seconds=2, max_seconds=5):
         """模擬人類隨機思考/閱讀時間"""
@@ -87,184 +118,178 @@ class VitaboxStealthCrawler:
         """
         解析產品卡片資料
         使用較為寬鬆的 Selector 策略以適應改版
+        所有卡片欄位以一次 page.evaluate 批次取回 (見 scrapers/dom_extract.py)，不再逐卡 locator 往返
         """
         print("🔍 開始解析產品資料...")
-        
-        # 定位產品卡片：通常在 Collection 頁面會有特定的 Grid Item Class
-        # 這裡嘗試抓取常見的 Shopify/Cyberbiz 結構
-        # 策略：尋找包含 'product' 且有 'item' 或 'card' 的容器，或是直接找連結
-        # product_cards = await page.locator(".product-item, .product-card, .grid__item").all()
-        
+
         # Shopline 策略：直接抓取所有指向 /products/ 的 <a> 標籤
         # Shopline 的產品連結通常是 /products/product-slug
-        product_cards = await page.locator("a[href*='/products/'], a[href*='/product/']").all()
-        
-        if not product_cards:
+        start = time.perf_counter()
+        cards = await extract_all(page, PRODUCT_CARD_ROOT, PRODUCT_CARD_FIELDS, label="Vitabox 列表卡片")
+
+        if not cards:
             print("⚠️ 未偵測到任何產品連結，嘗試等待更久...")
-            # Fallback: 抓取所有包含價格的連結區塊
-            product_cards = await page.locator("a[href*='/products/'], a[href*='/product/']").all()
+            await asyncio.sleep(2)
+            cards = await extract_all(page, PRODUCT_CARD_ROOT, PRODUCT_CARD_FIELDS, label="Vitabox 列表卡片")
 
-        print(f"📊 偵測到 {len(product_cards)} 個潛在產品項目")
+        print(f"📊 偵測到 {len(cards)} 個潛在產品項目 (抽取耗時 {(time.perf_counter() - start) * 1000:.0f} ms)")
 
-        for card in product_cards:
-            try:
-                # 1. Title
-                title_el = card.locator("h3, h4, .title, .product-title").first
-                # 如果找不到標題元素，嘗試直接讀取連結內的文字
-                if await title_el.count() > 0:
-                    title = await title_el.text_content()
-                else:
-                    title = await card.text_content()
-                
-                title = title.strip()
-                # 過濾掉太短的標題 (可能是 "查看更多" 之類的按鈕)
-                if len(title) < 2: continue
-                
-                # 過濾非保健食品 (盤子、提袋等)
-                if any(keyword in title for keyword in ["瓷盤", "禮袋", "提袋", "購物袋"]):
-                    continue
-
-                # 2. Price
-                # 優先找特價，若無則找原價
-                price_el = card.locator(".price, .money, span:has-text('NT$')").first
-                # 如果卡片內找不到價格，嘗試往上層找 (有時 a 標籤只是圖片，價格在兄弟元素)
-                if await price_el.count() == 0:
-                    # 嘗試找父層容器
-                    parent = card.locator("..")
-                    price_el = parent.locator(".price, .money, span:has-text('NT$')").first
-
-                price_text = await price_el.text_content() if await price_el.count() > 0 else ""
-                # 清洗價格: 去除 NT$, 逗號, 空白
-                price = int(''.join(filter(str.isdigit, price_text)) or 0)
-
-                # 3. URL
-                # 如果 card 本身是 <a> 標籤
-                raw_url = await card.get_attribute("href")
-                
-                full_url = f"https://shop.vitabox.com.tw{raw_url}" if raw_url.startswith("/") else raw_url
-
-                # 4. Image
-                img_el = card.locator("img").first
-                raw_img_url = await img_el.get_attribute("src") or await img_el.get_attribute("data-src") or ""
-                if raw_img_url.startswith("//"):
-                    image_url = f"https:{raw_img_url}"
-                elif raw_img_url.startswith("http"):
-                    image_url = raw_img_url
-                else:
-                    image_url = ""
-
-                # 去重檢查：避免同一個產品抓到兩次 (圖片連結和文字連結)
-                if any(d['url'] == full_url for d in self.data):
-                    continue
-
-                # 5. Highlights (嘗試從卡片文字中提取非標題/價格的描述)
-                text_content = await card.text_content()
-                # 簡單過濾：把標題和價格扣掉剩下的字串當作潛在亮點 (這很粗略，但符合"嘗試抓取")
-                highlights = text_content.replace(title, "").replace(price_text, "").strip()
-                highlights = highlights.replace("\n", ";").strip()[:50] # 截斷避免過長
-
-                item = {
-                    "source": "Vitabox",
-                    "brand": "Vitabox",
-                    "title": title,
-                    "price": price,
-                    "unit_price": 0, # 依指示填 0
-                    "url": full_url,
-                    "image_url": image_url,
-                    "product_highlights": highlights,
-                    "total_count": "" # 暫空
-                }
-                self.data.append(item)
-                # print(f"   Found: {title} | ${price}")
+        seen_urls = {d['url'] for d in self.data}
+        for card in cards:
+            # 1. Title：找不到標題元素時直接使用連結內的文字
+            title = card["title"] or card["text"]
+            # 過濾掉太短的標題 (可能是 "查看更多" 之類的按鈕)
+            if len(title) < 2: continue
 
-            except Exception as e:
-                # 容錯：單一產品解析失敗不中斷整個爬蟲
+            # 過濾非保健食品 (盤子、提袋等)
+            if any(keyword in title for keyword in ["瓷盤", "禮袋", "提袋", "購物袋"]):
                 continue
 
-    async def run(self):
-        async with async_playwright() as p:
-            # 隨機選取 User-Agent
-            user_agent = random.choice(USER_AGENTS)
-            
-            # 啟動瀏覽器 (Headless=True 也可以，但 False 方便除錯且有時較不易被擋)
-            browser = await p.chromium.launch(headless=True) 
+            # 2. Price (卡片內找不到時已往上層容器找)
+            price_text = card["price_text"]
+            price = parse_int(price_text)
+
+            # 3. URL
+            raw_url = card["href"]
+            if not raw_url: continue
+            full_url = f"https://shop.vitabox.com.tw{raw_url}" if raw_url.startswith("/") else raw_url
+
+            # 去重檢查：避免同一個產品抓到兩次 (圖片連結和文字連結)
+            if full_url in seen_urls:
+                continue
+            seen_urls.add(full_url)
+
+            # 4. Image
+            image_url = absolute_image_url(card["image"])
+
+            # 5. Highlights (把標題和價格扣掉剩下的字串當作潛在亮點)
+            highlights = card["text"].replace(title, "").replace(price_text, "").strip()
+            highlights = highlights.replace("\n", ";").strip()[:50] # 截斷避免過長
+
+            self.data.append({
+                "source": "Vitabox",
+                "brand": "Vitabox",
+                "title": title,
+                "price": price,
+                "unit_price": 0, # 依指示填 0
+                "url": full_url,
+                "image_url": image_url,
+                "product_highlights": highlights,
+                "total_count": "" # 暫空
+            })
+
+    async def find_next_button(self, page):
+        for selector in NEXT_PAGE_SELECTORS:
+            btn = page.locator(selector).first
+            if await btn.count() > 0 and await btn.is_visible():
+                print(f"🔎 發現下一頁按鈕 (Selector: {selector})")
+                return btn
+        return None
+
+    def merge_items(self, items):
+        """加入資料並去重 (同一網址的不同規格以標題區分)。"""
+        seen = {(d['url'], d['title']) for d in self.data}
+        for item in items:
+            key = (item['url'], item['title'])
+            if key not in seen:
+                seen.add(key)
+                self.data.append(item)
+
+    async def run_capture(self, page, capture):
+        """攔截模式：每頁直接捲到底觸發列表 API，商品資料取自 JSON，不逐卡解析。"""
+        while True:
+            await capture.settle(page)
+            next_btn = await self.find_next_button(page)
+            if not next_btn:
+                print("✅ 已無下一頁，停止爬取")
+                break
+            print("👉 點擊下一頁...")
+            await next_btn.click()
+            await page.wait_for_load_state("domcontentloaded", timeout=60000)
+            await capture.wait_for_products(CAPTURE_WAIT_SECONDS)
+        await capture.drain()
+        self.merge_items(capture.results())
+        print(f"📡 攔截模式完成：{capture.responses_seen} 個 API 回應，{len(capture.items)} 筆商品")
+
+    async def run_dom(self, page):
+        """DOM 模式 (備援)：漸進式滾動 + 逐卡解析。"""
+        # 執行擬人行為
+        await self.random_mouse_move(page)
+
+        while True:
+            await self.human_like_delay(2, 4)
+            await self.progressive_scroll(page)
+
+            # 再次隨機移動滑鼠確保元素穩定
+            await self.random_mouse_move(page)
+
+            # 提取當前頁面資料
+            await self.extract_product_data(page)
+
+            next_btn = await self.find_next_button(page)
+            if next_btn:
+                print("👉 點擊下一頁...")
+                # 點擊並等待頁面導航完成
+                await next_btn.click()
+                await page.wait_for_load_state("networkidle", timeout=60000)
+            else:
+                print("✅ 已無下一頁，停止爬取")
+                break
+
+    async def run(self, pool=None):
+        """pool: d2c_main 傳入的共用瀏覽器 (SharedBrowser)；單獨執行時為 None，自行啟動瀏覽器。"""
+        # 隨機選取 User-Agent
+        user_agent = random.choice(USER_AGENTS)
+
+        # 啟動瀏覽器 (Headless=True 也可以，但 False 方便除錯且有時較不易被擋)
+        async with acquire_browser(pool, headless=True) as browser, page_budget(pool, "Vitabox"), page_slot(pool, "Vitabox"):
             context = await browser.new_context(
                 user_agent=user_agent,
                 viewport={"width": 1920, "height": 1080},
                 locale="zh-TW"
             )
-            
+
             page = await context.new_page()
-            
+
             # 應用 Stealth 插件
             await stealth_async(page)
 
-            print(f"🚀 啟動隱身爬蟲，目標: {TARGET_URL}")
+            # 必須在 goto 之前開始監聽，才能攔截到第一頁的列表 API
+            capture = ProductResponseCapture(page, BASE_URL, "Vitabox", "Vitabox") if self.capture else None
+
+            print(f"🚀 啟動隱身爬蟲，目標: {TARGET_URL} (模式: {'攔截' if capture else 'DOM'})")
             try:
-                # 改用 networkidle 確保動態內容載入完成
-                await page.goto(TARGET_URL, wait_until="networkidle", timeout=60000)
+                # 攔截模式只需 DOM 就緒；DOM 模式用 networkidle 確保動態內容載入完成
+                await page.goto(TARGET_URL, wait_until="domcontentloaded" if capture else "networkidle", timeout=60000)
             except Exception:
-                print("⚠️ NetworkIdle 超時，嘗試繼續執行...")
-            
+                print("⚠️ 頁面載入超時，嘗試繼續執行...")
+
             print(f"📄 當前頁面標題: {await page.title()}")
 
-            # 執行擬人行為
-            await self.random_mouse_move(page)
-            
-            while True:
-                await self.human_like_delay(2, 4)
-                await self.progressive_scroll(page)
-                
-                # 再次隨機移動滑鼠確保元素穩定
-                await self.random_mouse_move(page)
-                
-                # 提取當前頁面資料
-                await self.extract_product_data(page)
-
-                # 檢查並處理下一頁 (Shopline 分頁結構)
-                # 嘗試多種選擇器以確保能抓到按鈕
-                next_selectors = [
-                    "a[rel='next']",                      # 標準語義
-                    "li.next a",                          # 常見 Bootstrap 結構
-                    ".pagination .next a",                # 另一種結構
-                    ".pagination-next a",                 # Shopline 變體
-                    "a:has-text('下一頁')",               # 中文文字
-                    "a:has-text('Next')",                 # 英文文字
-                    "a:has(i.fa-angle-right)",            # FontAwesome 圖示
-                    "a:has(i.fa-chevron-right)"           # 另一種圖示
-                ]
-                
-                next_btn = None
-                for selector in next_selectors:
-                    btn = page.locator(selector).first
-                    if await btn.count() > 0 and await btn.is_visible():
-                        next_btn = btn
-                        print(f"🔎 發現下一頁按鈕 (Selector: {selector})")
-                        break
-                
-                if next_btn:
-                    print("👉 點擊下一頁...")
-                    # 點擊並等待頁面導航完成
-                    await next_btn.click()
-                    await page.wait_for_load_state("networkidle", timeout=60000)
-                else:
-                    print("✅ 已無下一頁，停止爬取")
-                    break
-            
-            await browser.close()
+            if capture and await capture.wait_for_products(CAPTURE_WAIT_SECONDS):
+                await self.run_capture(page, capture)
+            else:
+                if capture:
+                    print("⚠️ 未攔截到商品 API，改用 DOM 解析...")
+                    capture.detach()
+                await self.run_dom(page)
+                print_extract_stats()
+
+            await context.close()
 
     def save_csv(self):
         if not self.data:
             print("❌ 未抓取到任何資料。")
             return
             
-        df = pd.DataFrame(self.data)
+        df = records_to_frame(self.data)
         
         # 確保目錄存在
         os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
         
         df.to_csv(OUTPUT_FILE, index=False, encoding="utf-8-sig")
         print(f"💾 資料已儲存至: {OUTPUT_FILE} (共 {len(df)} 筆)")
+        record_observations(df)
 
 if __name__ == "__main__":
     crawler = VitaboxStealthCrawler()
@@ -4,14 +4,20 @@ import json
 import random
 import re
 import html as html_lib
+import time
 from bs4 import BeautifulSoup
 from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
 from playwright_stealth import stealth_async
-try:
-    import google.generativeai as genai
-except ImportError:
-    genai = None
-
+from scrapers.dom_extract import extract_all, extract_groups
+from data.cpu_offload import get_offload
+from data.llm_backend import get_llm_backend
+from data.page_archive import annotate_page, archive_page
+from data.page_fingerprint import CONDITIONAL_FETCH, FingerprintStore, compare, fingerprint_html
+from data.scan_outcome import (
+    BLOCKED, LLM_FAILED, PARTIAL, SKIPPED, SUCCESS, TRANSIENT, UNCHANGED,
+    ScanOutcome, classify_exception, classify_http_status,
+)
+from data.url_canon import canonicalize
 try:
     from dotenv import load_dotenv
 except ImportError:
@@ -22,23 +28,85 @@ except ImportError:
 script_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) # 回到專案根目錄
 load_dotenv(os.path.join(script_dir, '.env'))
 
+
+def html_to_text(html_content, soup=None):
+    """LLM 輸入用的頁面純文字：移除雜訊標籤並限制長度。傳入 soup 時會直接修改該 soup (移除標籤)。"""
+    if soup is None:
+        soup = BeautifulSoup(html_content, 'html.parser')
+    # 移除雜訊
+    for tag in soup(['script', 'style', 'nav', 'footer', 'noscript', 'svg']):
+        tag.decompose()
+    return soup.get_text(separator='\n', strip=True)[:15000] # 限制長度
+
+
+def extract_page(content, url, want_text=True):
+    """
+    頁面 HTML 的所有同步解析 (BeautifulSoup / 正則)，在 CPU offload pool 中執行，避免阻塞 event loop。
+    回傳 HTML 價格、基本資料、九五之丹欄位與 LLM 用純文字。
+    整頁只解析一次，各 extractor 共用同一個 soup (html_to_text 會移除標籤，放在最後)。
+    """
+    is_95dan = "95dan.com.tw" in (url or "")
+    soup = BeautifulSoup(content or "", 'html.parser')
+    return {
+        "html_price": AgentD2CScanner._extract_price_from_html_content(content, soup),
+        "basic": AgentD2CScanner._extract_basic_info_from_html(content, url, soup),
+        "d95": AgentD2CScanner._extract_95dan_highlights_and_count(content, soup) if is_95dan else {},
+        "text": html_to_text(content, soup) if want_text else "",
+    }
+
+
+def build_record(url, ai_data, parsed, dom_price=0, image_url=""):
+    """
+    整合 LLM 結果、extract_page 解析結果與 DOM 價格為 Unified Schema 商品 dict。
+    ai_data 為 None (LLM 失敗) 或 {} (未啟用) 時以規則解析的資料補上。
+    scan_url 與 page_archive 的重新抽取共用，兩者組出的資料一致。
+    """
+    html_price = parsed["html_price"]
+    basic_data = parsed["basic"]
+    d95_meta = parsed["d95"]
+
+    # 整合資料（LLM 成功/失敗都會組裝結果，避免 pending）
+    final_price = (ai_data or {}).get("price", 0)
+    # DOM / HTML script 優先策略
+    # 九五之丹先信任 HTML/JSON-LD（避免 DOM 抓到「已熱銷1000份」）
+    if "95dan.com.tw" in (url or ""):
+        if html_price > 0:
+            final_price = html_price
+        elif dom_price > 0:
+            final_price = dom_price
+    else:
+        if dom_price > 0:
+            final_price = dom_price
+        elif html_price > 0:
+            final_price = html_price
+
+    return {
+        "source": "D2C_Hunter", # 標記來源
+        "brand": (ai_data or {}).get("brand") or basic_data.get("brand", "Unknown"),
+        "title": (ai_data or {}).get("title") or basic_data.get("title", "Unknown"),
+        "price": int(final_price or 0),
+        "unit_price": (ai_data or {}).get("unit_price", 0),
+        "total_count": (ai_data or {}).get("total_count", 0) or d95_meta.get("total_count", 0),
+        "url": url,
+        "image_url": image_url or "",
+        "product_highlights": (ai_data or {}).get("product_highlights", "") or d95_meta.get("product_highlights", "")
+    }
+
+
 class AgentD2CScanner:
     """
     通用型 D2C 掃描 Agent
     不依賴特定 CSS Selector，而是抓取全頁文字後交由 LLM 提取結構化資料。
     """
     def __init__(self):
-        self.api_key = os.environ.get("GOOGLE_API_KEY")
         self.llm_timeout_seconds = int(os.environ.get("D2C_LLM_TIMEOUT", "15"))
         self.page_timeout_seconds = 30
-        if not self.api_key or genai is None:
-            if genai is None:
-                print("⚠️ [Agent] 未安裝 google-generativeai，AI 分析將失效。")
-            else:
-                print("⚠️ [Agent] 未設定 GOOGLE_API_KEY，AI 分析將失效。")
-        else:
-            genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel('gemini-2.0-flash', generation_config={"response_mime_type": "application/json"})
+        # 上次完整掃描的頁面指紋 (ETag / Last-Modified / simhash)，未變動的頁面不渲染
+        self.fingerprints = FingerprintStore() if CONDITIONAL_FETCH else None
+        # D2C_LLM_BACKEND=local 時改打本機替身伺服器 (data/llm_standin.py)
+        self.llm = get_llm_backend(generation_config={"response_mime_type": "application/json"})
+        if not self.llm.enabled:
+            print(f"⚠️ [Agent] {self.llm.unavailable_reason}，AI 分析將失效。")
 
     @staticmethod
     def _normalize_url(url):
@@ -142,28 +210,26 @@ class AgentD2CScanner:
             ".price"
         ]
 
-        for selector in selectors:
-            try:
-                locator = page.locator(selector)
-                count = await locator.count()
-                if count == 0:
-                    continue
-
+        # 所有 selector 的前幾個可見元素以一次 page.evaluate 取回，避免逐元素 count/is_visible/text_content 往返
+        try:
+            groups = await extract_groups(
+                page,
                 # 只檢查前幾個元素，避免抓太慢
-                check_n = min(count, 8)
-                for i in range(check_n):
-                    el = locator.nth(i)
-                    if not await el.is_visible():
-                        continue
-                    p_text = (await el.text_content() or "").strip()
-                    if not any(c.isdigit() for c in p_text):
-                        continue
-                    p_val = int(re.sub(r'[^\d]', '', p_text) or 0)
-                    # 合理價格區間，避免誤抓評分/件數
-                    if 100 <= p_val <= 200000:
-                        return p_val
-            except:
-                continue
+                [{"root": selector, "fields": {"text": {"default": ""}}, "limit": 8, "visible_only": True} for selector in selectors],
+                label="Agent DOM 價格",
+            )
+        except Exception:
+            groups = []
+
+        for rows in groups:
+            for row in rows:
+                p_text = row["text"]
+                if not any(c.isdigit() for c in p_text):
+                    continue
+                p_val = int(re.sub(r'[^\d]', '', p_text) or 0)
+                # 合理價格區間，避免誤抓評分/件數
+                if 100 <= p_val <= 200000:
+                    return p_val
 
         # Fallback：全文找 NT$ / TWD / $
         try:
@@ -185,16 +251,39 @@ class AgentD2CScanner:
         product_tokens = ["/product", "/products", "/shop/", "lutein", "fish-oil", "probiotic"]
         return any(t in u for t in product_tokens)
 
-    async def analyze_with_llm(self, html_content, url):
-        """呼叫 Gemini 進行語義分析"""
-        if not self.api_key or genai is None:
+    async def _probe_fingerprint(self, url):
+        """
+        完整渲染前的 tier-1 檢查：條件式 GET (不開瀏覽器) 並與上次完整掃描的指紋比較。
+        回傳 probe dict (含 unchanged / reason，以及 200 時的 simhash / price)；未啟用時回傳 None。
+        """
+        if self.fingerprints is None:
+            return None
+        stored = await asyncio.to_thread(self.fingerprints.get, url)
+        probe = await asyncio.to_thread(self.fingerprints.probe, url, stored)
+        html = probe.pop("html")
+        if html:
+            probe.update(await get_offload().run(fingerprint_html, html))
+        probe["unchanged"], probe["reason"] = compare(stored, probe)
+        if probe["unchanged"]:
+            # 304 / ETag 命中時沒有 HTML，沿用上次完整掃描時的指紋價格
+            probe["verified_price"] = probe.get("price") or stored["price"]
+            await asyncio.to_thread(self.fingerprints.mark_unchanged, url, probe)
+        return probe
+
+    @property
+    def llm_enabled(self):
+        return self.llm.enabled
+
+    async def analyze_with_llm(self, html_content, url, text=None):
+        """
+        呼叫 LLM 後端進行語義分析；未啟用 LLM 時回傳 {}，逾時或回應無法解析時回傳 None。
+        text 為已清理的頁面文字 (extract_page 產生)，未提供時在 offload pool 中由 HTML 轉換。
+        """
+        if not self.llm_enabled:
             return {}
 
-        soup = BeautifulSoup(html_content, 'html.parser')
-        # 移除雜訊
-        for tag in soup(['script', 'style', 'nav', 'footer', 'noscript', 'svg']):
-            tag.decompose()
-        text = soup.get_text(separator='\n', strip=True)[:15000] # 限制長度
+        if text is None:
+            text = await get_offload().run(html_to_text, html_content)
 
         prompt = f"""
         你是一個專業的電商數據爬蟲。請分析以下產品頁面的 HTML 文字內容，並提取結構化資料。
@@ -214,7 +303,7 @@ class AgentD2CScanner:
 
         try:
             response = await asyncio.wait_for(
-                self.model.generate_content_async(prompt),
+                self.llm.generate(prompt),
                 timeout=self.llm_timeout_seconds
             )
             text = response.text
@@ -234,18 +323,20 @@ class AgentD2CScanner:
             return data
         except asyncio.TimeoutError:
             print(f"⚠️ [Agent] LLM 逾時（>{self.llm_timeout_seconds}s），改用非 LLM fallback")
-            return {}
+            return None
         except Exception as e:
             print(f"⚠️ [Agent] LLM 分析失敗: {e}")
-            return {}
+            return None
 
-    def _extract_basic_info_from_html(self, html_content, url):
+    @staticmethod
+    def _extract_basic_info_from_html(html_content, url, soup=None):
         """LLM 失敗時的最小可用資料。"""
         title = "Unknown"
         brand = "Unknown"
 
         try:
-            soup = BeautifulSoup(html_content or "", 'html.parser')
+            if soup is None:
+                soup = BeautifulSoup(html_content or "", 'html.parser')
             h1 = soup.select_one('h1')
             og_title = soup.select_one('meta[property="og:title"]')
             doc_title = soup.title.string.strip() if soup.title and soup.title.string else ""
@@ -264,7 +355,8 @@ class AgentD2CScanner:
 
         return {"brand": brand, "title": title}
 
-    def _extract_95dan_highlights_and_count(self, html_content):
+    @staticmethod
+    def _extract_95dan_highlights_and_count(html_content, soup=None):
         """九五之丹頁面專用：提取商品特色與單包裝數量（粒/包）。"""
         highlights = ""
         total_count = 0
@@ -273,7 +365,8 @@ class AgentD2CScanner:
             return {"product_highlights": highlights, "total_count": total_count}
 
         try:
-            soup = BeautifulSoup(html_content, 'html.parser')
+            if soup is None:
+                soup = BeautifulSoup(html_content, 'html.parser')
 
             # 商品特色：.pro_info_div 中 title 為「商品特色」的 ul/li
             for block in soup.select("div.pro_info_div"):
@@ -304,7 +397,8 @@ class AgentD2CScanner:
 
         return {"product_highlights": highlights, "total_count": total_count}
 
-    def _extract_price_from_html_content(self, html_content):
+    @staticmethod
+    def _extract_price_from_html_content(html_content, soup=None):
         """
         第二輪價格策略：直接從 HTML / script 資料層提取價格。
         優先順序：
@@ -335,7 +429,8 @@ class AgentD2CScanner:
 
         # 1) JSON-LD
         try:
-            soup = BeautifulSoup(html_content, 'html.parser')
+            if soup is None:
+                soup = BeautifulSoup(html_content, 'html.parser')
             for tag in soup.select("script[type='application/ld+json']"):
                 raw = (tag.string or tag.text or "").strip()
                 if not raw:
@@ -395,15 +490,32 @@ class AgentD2CScanner:
 
         return 0
 
+    @staticmethod
+    def _outcome_status(data, llm_failed):
+        """已組出商品資料時的分類：LLM 失敗優先 (可只重跑 LLM)，其次缺價格或標題。"""
+        if llm_failed:
+            return LLM_FAILED
+        if int(data.get("price") or 0) <= 0 or data.get("title") in ("", "Unknown"):
+            return PARTIAL
+        return SUCCESS
+
     async def scan_url(self, url):
-        """掃描單一 URL"""
-        url = self._normalize_url(url)
+        """掃描單一 URL，回傳 ScanOutcome (status / data / 耗時)。"""
+        # 正規化後的網址同時是封存 / 指紋 / 價格歷史的鍵
+        url = canonicalize(self._normalize_url(url))
         if not url:
             print("❌ [Agent] 無效 URL，跳過")
-            return None
+            return ScanOutcome(SKIPPED, url, reason="invalid url")
         print(f"[INFO] Start scraping: {url}...")
         print(f"🤖 [Agent] 正在掃描: {url}")
-        data = None
+        start = time.perf_counter()
+        outcome = None
+
+        probe = await self._probe_fingerprint(url)
+        if probe is not None and probe["unchanged"]:
+            print(f"♻️ [Agent] 頁面未變動 ({probe['reason']})，略過渲染: {url}")
+            return ScanOutcome(UNCHANGED, url, reason=probe["reason"], http_status=probe["status_code"],
+                               elapsed=time.perf_counter() - start, verified_price=probe["verified_price"])
         
         async with async_playwright() as p:
             browser = await p.chromium.launch(headless=True)
@@ -417,17 +529,24 @@ class AgentD2CScanner:
             await stealth_async(page)
 
             async def _run_page_work():
-                nonlocal data
+                nonlocal outcome
                 # 隨機延遲，模擬真人
                 await asyncio.sleep(random.uniform(1, 3))
                 
                 response = await page.goto(url, wait_until="domcontentloaded", timeout=30000)
+                http_status = response.status if response else 0
                 
-                # 處理 403/429 重試邏輯 (簡單版)
-                if response.status in [403, 429]:
-                    print(f"⚠️ [Agent] 遇到 {response.status}，等待 10 秒後重試...")
+                # 處理 403/429 重試邏輯 (簡單版)：重新載入後仍被擋才回報 BLOCKED，交由排程器冷卻後重試
+                if classify_http_status(http_status) == BLOCKED:
+                    print(f"⚠️ [Agent] 遇到 {http_status}，等待 10 秒後重試...")
                     await asyncio.sleep(10)
-                    await page.reload(wait_until="domcontentloaded", timeout=30000)
+                    response = await page.reload(wait_until="domcontentloaded", timeout=30000)
+                    http_status = response.status if response else 0
+                http_class = classify_http_status(http_status)
+                if http_class is not None:
+                    print(f"⚠️ [Agent] HTTP {http_status}: {url}")
+                    outcome = ScanOutcome(http_class, url, reason=f"http {http_status}", http_status=http_status)
+                    return
                 
                 # 等待價格元素渲染 (在 dump HTML 前執行)
                 await self._wait_for_price_elements(page, url)
@@ -448,7 +567,8 @@ class AgentD2CScanner:
                 
                 if not is_product:
                     print(f"⏩ [Agent] 跳過非產品頁面 (無 Product 標記): {url}")
-                    return None
+                    outcome = ScanOutcome(SKIPPED, url, reason="non-product", http_status=http_status)
+                    return
 
                 # 滾動頁面觸發 Lazy Load
                 await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
@@ -456,7 +576,10 @@ class AgentD2CScanner:
 
                 # 抓取基礎資料 (圖片與 HTML)
                 content = await page.content()
-                html_price = self._extract_price_from_html_content(content)
+                # BeautifulSoup / 正則解析在 process pool 執行，其他頁面的 I/O 不受影響
+                is_95dan = "95dan.com.tw" in (url or "")
+                parsed = await get_offload().run(extract_page, content, url, self.llm_enabled and not is_95dan)
+                html_price = parsed["html_price"]
                 if html_price == 0 and dom_price == 0 and ("vitabox" in url or "shopline" in url):
                     try:
                         with open("debug_vitabox_page.html", "w", encoding="utf-8") as f:
@@ -467,64 +590,80 @@ class AgentD2CScanner:
                 # 嘗試抓取 og:image
                 image_url = await page.get_attribute("meta[property='og:image']", "content")
                 if not image_url:
-                    # Fallback: 找第一張大圖
-                    imgs = await page.locator("img").all()
+                    # Fallback: 找第一張大圖 (一次 evaluate 取回所有 src)
+                    imgs = await extract_all(page, "img", {"src": {"attr": "src"}}, label="Agent 圖片備援")
                     for img in imgs:
-                        src = await img.get_attribute("src")
+                        src = img["src"]
                         if src and "http" in src and ("jpg" in src or "png" in src):
                             image_url = src
                             break
                 
                 # LLM 分析（九五之丹先走規則引擎，避免 API 延遲造成整體 timeout）
+                llm_start = time.perf_counter()
                 if "95dan.com.tw" in (url or ""):
                     ai_data = {}
                 else:
-                    ai_data = await self.analyze_with_llm(content, url)
-                basic_data = self._extract_basic_info_from_html(content, url)
-                d95_meta = self._extract_95dan_highlights_and_count(content) if "95dan.com.tw" in (url or "") else {}
-
-                # 整合資料（LLM 成功/失敗都會組裝結果，避免 pending）
-                final_price = (ai_data or {}).get("price", 0)
-                # DOM / HTML script 優先策略
-                # 九五之丹先信任 HTML/JSON-LD（避免 DOM 抓到「已熱銷1000份」）
-                if "95dan.com.tw" in (url or ""):
-                    if html_price > 0:
-                        final_price = html_price
-                    elif dom_price > 0:
-                        final_price = dom_price
-                else:
-                    if dom_price > 0:
-                        final_price = dom_price
-                    elif html_price > 0:
-                        final_price = html_price
-
-                data = {
-                    "source": "D2C_Hunter", # 標記來源
-                    "brand": (ai_data or {}).get("brand") or basic_data.get("brand", "Unknown"),
-                    "title": (ai_data or {}).get("title") or basic_data.get("title", "Unknown"),
-                    "price": int(final_price or 0),
-                    "unit_price": (ai_data or {}).get("unit_price", 0),
-                    "total_count": (ai_data or {}).get("total_count", 0) or d95_meta.get("total_count", 0),
-                    "url": url,
-                    "image_url": image_url or "",
-                    "product_highlights": (ai_data or {}).get("product_highlights", "") or d95_meta.get("product_highlights", "")
-                }
+                    ai_data = await self.analyze_with_llm(content, url, text=parsed["text"])
+                llm_seconds = time.perf_counter() - llm_start
+                llm_failed = ai_data is None
+                data = build_record(url, ai_data, parsed, dom_price, image_url)
+                status = self._outcome_status(data, llm_failed)
+                # 封存渲染後的 HTML 與無法從 HTML 重現的欄位，之後改善 extractor / prompt 時可離線重新抽取
+                await asyncio.to_thread(archive_page, url, content, http_status,
+                                        {"dom_price": dom_price, "image_url": image_url or "", "ai": ai_data})
+                # 只有完整成功時更新指紋基準，缺價格 / LLM 失敗的頁面下次仍完整渲染
+                if status == SUCCESS and probe is not None and "simhash" in probe:
+                    await asyncio.to_thread(self.fingerprints.save, url, probe)
+                outcome = ScanOutcome(
+                    status, url, data=data, http_status=http_status, llm_seconds=llm_seconds,
+                    reason="llm error" if llm_failed else ("missing price/title" if status == PARTIAL else ""),
+                    # 只有 LLM 失敗時保留 HTML，重試時不必重新開頁
+                    html=content if llm_failed else "",
+                )
                 print(f"✅ [Agent] 成功提取: {data['title']} (${data['price']})")
                 
             try:
                 await asyncio.wait_for(_run_page_work(), timeout=self.page_timeout_seconds)
             except (PlaywrightTimeoutError, asyncio.TimeoutError):
                 print(f"[WARN] Timeout skipping: {url}")
-                return None
+                outcome = ScanOutcome(TRANSIENT, url, reason="timeout")
             except Exception as e:
                 print(f"❌ [Agent] 掃描失敗 {url}: {e}")
+                status, reason = classify_exception(e)
+                outcome = ScanOutcome(status, url, reason=reason)
             finally:
                 await browser.close()
         
-        return data
+        outcome.elapsed = time.perf_counter() - start
+        return outcome
+
+    async def rerun_llm(self, outcome):
+        """
+        LLM_FAILED 的重試：以保留的 HTML 重跑 LLM，不重新載入頁面。
+        DOM / HTML 取得的價格仍優先於 LLM 價格 (與 scan_url 相同)；沒有保留 HTML 時退回完整掃描。
+        """
+        if not outcome.html or outcome.data is None:
+            return await self.scan_url(outcome.url)
+        start = time.perf_counter()
+        ai_data = await self.analyze_with_llm(outcome.html, outcome.url)
+        llm_seconds = time.perf_counter() - start
+        if ai_data is None:
+            return ScanOutcome(LLM_FAILED, outcome.url, data=outcome.data, reason="llm error",
+                               http_status=outcome.http_status, elapsed=llm_seconds, llm_seconds=llm_seconds, html=outcome.html)
+
+        await asyncio.to_thread(annotate_page, outcome.url, outcome.html, ai=ai_data)
+        data = dict(outcome.data)
+        for key in ("brand", "title", "unit_price", "total_count", "product_highlights"):
+            data[key] = ai_data.get(key) or data.get(key)
+        if int(data.get("price") or 0) <= 0:
+            data["price"] = int(ai_data.get("price") or 0)
+        status = self._outcome_status(data, llm_failed=False)
+        return ScanOutcome(status, outcome.url, data=data, http_status=outcome.http_status,
+                           reason="missing price/title" if status == PARTIAL else "",
+                           elapsed=llm_seconds, llm_seconds=llm_seconds)
 
     async def scan_batch(self, urls):
-        """批次掃描"""
+        """批次掃描 (不重試)，回傳有資料的商品 dict。"""
         results = []
         # 限制並發數，避免被封鎖
         semaphore = asyncio.Semaphore(3)
@@ -538,15 +677,15 @@ class AgentD2CScanner:
 
         # 過濾失敗的結果
         for res in scanned:
-            if res:
-                results.append(res)
+            if res.data is not None:
+                results.append(res.data)
         return results
 
 
 class D2CScanner:
-    """向後相容封裝：提供同步介面，方便腳本直接呼叫。"""
+    """向後相容封裝：提供同步介面，方便腳本直接呼叫 (回傳商品 dict，失敗為 None)。"""
     def __init__(self):
         self._scanner = AgentD2CScanner()
 
     def scan_url(self, url):
-        return asyncio.run(self._scanner.scan_url(url))
\ No newline at end of file
+        return asyncio.run(self._scanner.scan_url(url)).data
@@ -1,11 +1,16 @@
+import argparse
 import asyncio
 import csv
 import json
 import os
+import heapq
+import multiprocessing
+import socket
 import sys
+import time
 import traceback
 from datetime import datetime
-from collections import defaultdict
+from collections import Counter, defaultdict, deque
 from tqdm import tqdm
 
 import pandas as pd
@@ -15,12 +20,23 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from data.sitemap_parser import SitemapParser
 from data.agent_d2c_scanner import AgentD2CScanner
-
-
-DOMAINS_CSV = "data/d2c_domains_list.csv"
-TARGET_JSON = "data/target_product_urls.json"
-OUTPUT_CSV = "data/d2c_full_database.csv"
-ERROR_LOG = "data/batch_scanner_error.log"
+from data.cpu_offload import get_lag_monitor, get_offload, lag_stage
+from data.price_history import record_observations
+from data.recrawl_scheduler import DEFAULT_SCAN_SECONDS, RecrawlScheduler
+from data.product_record import normalize_frame, records_to_frame, to_records
+from data.scan_outcome import (
+    HAS_DATA, LLM_FAILED, SKIPPED, STATUSES, SUCCESS, TRANSIENT, UNCHANGED,
+    ScanOutcome, better_outcome, classify_exception, retry_delay,
+)
+from data.url_canon import SEEN_PATH, SeenSet
+from data.work_queue import DONE, FAILED, QUEUE_PATH, VISIBILITY_TIMEOUT, open_queue
+
+
+# D2C_DOMAINS_CSV / D2C_OUTPUT_CSV 可改指向本機替身站台 (data/llm_standin.py --site) 做離線壓力測試
+DOMAINS_CSV = os.environ.get("D2C_DOMAINS_CSV", "data/d2c_domains_list.csv")
+TARGET_JSON = os.environ.get("D2C_TARGET_JSON", "data/target_product_urls.json")
+OUTPUT_CSV = os.environ.get("D2C_OUTPUT_CSV", "data/d2c_full_database.csv")
+ERROR_LOG = os.environ.get("D2C_ERROR_LOG", "data/batch_scanner_error.log")
 
 TOP_N_BRANDS = 10
 MAX_URLS_PER_BRAND = int(os.environ.get("MAX_URLS_PER_BRAND", "100"))
@@ -40,15 +56,20 @@ EXPECTED_MIN_PRODUCTS = {
 }
 
 # 若某品牌產品數預期較高，可放寬該品牌 URL 掃描上限
+# (上限總和 × 預估單頁秒數 = 本輪瀏覽器時間預算，實際掃哪些 URL 由 RecrawlScheduler 依優先度決定)
 BRAND_URL_CAPS = {
     "悠活原力": 100,
 }
+# 本輪瀏覽器時間預算 (秒)；未設定時依上方各品牌上限換算
+CRAWL_BUDGET_SECONDS = float(os.environ.get("D2C_CRAWL_BUDGET_SECONDS", "0")) or None
+# 品牌重要度 (重掃優先度的倍數，未列出者為 1.0)
+BRAND_PRIORITY = {}
 
-ISSUE_TRACKER_DIR = "data/issue_tracker"
+ISSUE_TRACKER_DIR = os.environ.get("D2C_ISSUE_TRACKER_DIR", "data/issue_tracker")
 
 
 def log_error(stage, brand, url, err):
-    os.makedirs("data", exist_ok=True)
+    os.makedirs(os.path.dirname(ERROR_LOG) or ".", exist_ok=True)
     ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     msg = (
         f"[{ts}] stage={stage} brand={brand} url={url}\n"
@@ -78,32 +99,12 @@ def save_to_csv(data, filepath):
     if not data:
         return
 
-    schema = [
-        "source",
-        "brand",
-        "title",
-        "price",
-        "unit_price",
-        "total_count",
-        "url",
-        "image_url",
-        "product_highlights",
-    ]
-
-    df_new = pd.DataFrame(data)
-    for c in schema:
-        if c not in df_new.columns:
-            df_new[c] = ""
-    df_new = df_new[schema]
+    df_new = records_to_frame(data)
 
     # 若舊檔存在則合併去重
     if os.path.exists(filepath):
         try:
-            df_old = pd.read_csv(filepath)
-            for c in schema:
-                if c not in df_old.columns:
-                    df_old[c] = ""
-            df_old = df_old[schema]
+            df_old = normalize_frame(pd.read_csv(filepath))
             df_all = pd.concat([df_old, df_new], ignore_index=True)
             if "url" in df_all.columns:
                 df_all = df_all.drop_duplicates(subset=["url"], keep="last")
@@ -113,31 +114,40 @@ def save_to_csv(data, filepath):
         df_all = df_new
 
     df_all.to_csv(filepath, index=False, encoding="utf-8-sig")
+    # 價格歷史只記錄本次實際抓到的商品 (合併進來的舊列不是新的觀測)
+    record_observations(df_new)
     print(f"💾 已更新存檔: {filepath} (共 {len(df_all)} 筆)")
 
 
-def enforce_required_product_fields(records):
-    """強制每筆資料都有既定產品欄位，避免後續分析出現缺欄。"""
-    required = {
-        "title": "",
-        "price": 0,
-        "unit_price": 0,
-        "total_count": 0,
-        "url": "",
-        "image_url": "",
-        "product_highlights": "",
-    }
+def record_verified_observations(verified, filepath):
+    """
+    確認未變動 (UNCHANGED) 的 URL 不會出現在本次抓到的資料中，但當天同樣是一筆有效的價格觀測。
+    verified 為 [{"url", "price"}]：存檔中有舊列時沿用其價格 / 單價 / 來源 (與先前完整掃描的觀測一致)，
+    否則以確認時的指紋價格記錄。回傳寫入筆數。
+    """
+    if not verified:
+        return 0
+    previous = {}
+    if os.path.exists(filepath):
+        try:
+            df_old = pd.read_csv(filepath, usecols=lambda c: c in ("url", "price", "unit_price", "source"))
+            previous = {row["url"]: row for row in df_old.to_dict("records")}
+        except Exception as e:
+            print(f"⚠️ 讀取既有存檔失敗，未變動頁面改用指紋價格: {e}")
+    rows = []
+    for item in verified:
+        old = previous.get(item["url"])
+        if old is not None and (old.get("price") or 0) > 0:
+            rows.append({"url": item["url"], "price": old["price"], "unit_price": old.get("unit_price", 0),
+                         "source": old.get("source", "")})
+        elif item["price"]:
+            rows.append({"url": item["url"], "price": item["price"], "source": "D2C_Hunter"})
+    return record_observations(rows)
 
-    normalized = []
-    for row in records or []:
-        item = dict(row or {})
-        for key, default_val in required.items():
-            val = item.get(key, default_val)
-            if val is None:
-                val = default_val
-            item[key] = val
-        normalized.append(item)
-    return normalized
+
+def enforce_required_product_fields(records):
+    """強制每筆資料都有既定產品欄位與型別 (ProductRecord)，避免後續分析出現缺欄。"""
+    return to_records(records)
 
 
 def build_issue_tasks(parse_metrics, success_metrics):
@@ -185,7 +195,7 @@ def build_issue_tasks(parse_metrics, success_metrics):
     return issues
 
 
-def save_issue_tracker(parse_metrics, success_metrics, issues):
+def save_issue_tracker(parse_metrics, success_metrics, issues, outcome_report=None):
     os.makedirs(ISSUE_TRACKER_DIR, exist_ok=True)
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
     json_path = os.path.join(ISSUE_TRACKER_DIR, f"issues_{ts}.json")
@@ -196,6 +206,7 @@ def save_issue_tracker(parse_metrics, success_metrics, issues):
         "parse_metrics": parse_metrics,
         "success_metrics": success_metrics,
         "issues": issues,
+        "scan_outcomes": outcome_report or {},
     }
 
     with open(json_path, "w", encoding="utf-8") as f:
@@ -217,6 +228,21 @@ def save_issue_tracker(parse_metrics, success_metrics, issues):
             f"| {brand} | {stats.get('parsed_urls', 0)} | {stats.get('capped_urls', 0)} | {success_metrics.get(brand, 0)} |"
         )
 
+    by_brand = (outcome_report or {}).get("by_brand") or {}
+    if by_brand:
+        lines.extend([
+            "",
+            "## 掃描結果分類",
+            "",
+            "| 品牌 | " + " | ".join(STATUSES) + " | 未變動略過率 |",
+            "|---|" + "---:|" * (len(STATUSES) + 1),
+        ])
+        for brand, counts in by_brand.items():
+            lines.append(
+                f"| {brand} | " + " | ".join(str(counts.get(s, 0)) for s in STATUSES)
+                + f" | {unchanged_ratio(counts):.0%} |"
+            )
+
     lines.extend(["", "## 自動產生任務", ""])
     if not issues:
         lines.append("✅ 本輪未發現需要升級處理的品牌任務。")
@@ -233,28 +259,347 @@ def save_issue_tracker(parse_metrics, success_metrics, issues):
     return json_path, md_path
 
 
-async def scan_url_with_retry(scanner, brand, url, max_retries=3):
-    for attempt in range(1, max_retries + 1):
-        try:
-            result = await scanner.scan_url(url)
-            if result:
-                # 品牌歸屬以目標域名清單為主，避免 LLM/頁面文案造成品牌別名分裂
-                result["brand"] = brand
-                return result
-            return None
-        except Exception as e:
-            log_error("scan_url", brand, url, e)
-            if attempt < max_retries:
-                wait_sec = min(2 ** attempt, 8)
-                print(f"⚠️ [{brand}] URL 重試 {attempt}/{max_retries}: {url} ({wait_sec}s)")
-                await asyncio.sleep(wait_sec)
-            else:
-                print(f"❌ [{brand}] URL 最終失敗: {url}")
-    return None
+async def _scan_once(scanner, item, previous):
+    """單次嘗試：LLM_FAILED 的重試只重跑 LLM；未預期例外 (如瀏覽器啟動失敗) 轉成 ScanOutcome。"""
+    start = time.perf_counter()
+    try:
+        if previous is not None and previous.status == LLM_FAILED:
+            return await scanner.rerun_llm(previous)
+        return await scanner.scan_url(item["url"])
+    except Exception as e:
+        log_error("scan_url", item["brand"], item["url"], e)
+        status, reason = classify_exception(e)
+        return ScanOutcome(status, item["url"], reason=reason, elapsed=time.perf_counter() - start)
+
+
+# ------------------------------------------
+# 單一 URL 的嘗試紀錄 (記憶體排程與工作佇列共用)
+# attempts：各類別出現次數；retries：各類別觸發重試的次數
+# ------------------------------------------
+def _new_job(item):
+    return {"item": item, "previous": None, "best": None, "attempts": Counter(), "retries": Counter(), "backoff": 0.0, "elapsed": 0.0}
+
+
+def _record_attempt(job, outcome):
+    """記錄一次嘗試並決定下一步：回傳重試前應等待的秒數，None 表示這個 URL 已結束。"""
+    job["attempts"][outcome.status] += 1
+    job["elapsed"] += outcome.elapsed
+    job["best"] = better_outcome(job["best"], outcome)
+    delay = retry_delay(outcome.status, job["attempts"][outcome.status])
+    if delay is not None:
+        job["retries"][outcome.status] += 1
+        job["backoff"] += delay
+        job["previous"] = outcome
+        print(f"⚠️ [{job['item']['brand']}] {outcome.status} 重試 {job['retries'][outcome.status]}: {job['item']['url']} ({delay:.0f}s 後)")
+    return delay
+
+
+def _final_outcome(job, outcome):
+    """URL 結束時的結果：有資料的最佳結果優先 (重試失敗時仍保留先前的部分資料)。"""
+    item, best = job["item"], job["best"]
+    final = best if best is not None and best.status in HAS_DATA else outcome
+    if final.data is not None:
+        # 品牌歸屬以目標域名清單為主，避免 LLM/頁面文案造成品牌別名分裂
+        final.data["brand"] = item["brand"]
+    if final.status not in (SUCCESS, SKIPPED, UNCHANGED):
+        print(f"❌ [{item['brand']}] URL 最終結果 {final.status}: {item['url']} ({final.reason})")
+        log_error("scan_url", item["brand"], item["url"], f"{final.status}: {final.reason}")
+    return final
+
+
+def _job_to_state(job):
+    """寫入工作佇列的嘗試狀態 (LLM_FAILED 的 previous 保留 HTML，下次只重跑 LLM)。"""
+    previous, best = job["previous"], job["best"]
+    return {
+        "previous": previous.to_dict(keep_html=previous.status == LLM_FAILED) if previous is not None else None,
+        "best": best.to_dict() if best is not None else None,
+        "attempts": dict(job["attempts"]),
+        "retries": dict(job["retries"]),
+        "backoff": job["backoff"],
+        "elapsed": job["elapsed"],
+    }
 
 
-async def main():
-    os.makedirs("data", exist_ok=True)
+def _job_from_state(item, state):
+    job = _new_job(item)
+    if state:
+        job["previous"] = ScanOutcome.from_dict(state.get("previous"))
+        job["best"] = ScanOutcome.from_dict(state.get("best"))
+        job["attempts"].update(state.get("attempts") or {})
+        job["retries"].update(state.get("retries") or {})
+        job["backoff"] = state.get("backoff") or 0.0
+        job["elapsed"] = state.get("elapsed") or 0.0
+    return job
+
+
+def _new_report():
+    return {
+        "final": Counter(),
+        "attempts": Counter(),
+        "retries": Counter(),
+        "backoff_seconds": 0.0,
+        "idle_seconds": 0.0,
+        "by_brand": defaultdict(Counter),
+    }
+
+
+def _add_to_report(report, brand, final_status, attempts, retries, backoff):
+    report["final"][final_status] += 1
+    report["by_brand"][brand][final_status] += 1
+    report["attempts"].update(attempts)
+    report["retries"].update(retries)
+    report["backoff_seconds"] += backoff
+
+
+def _close_report(report):
+    report["by_brand"] = {brand: dict(counts) for brand, counts in report["by_brand"].items()}
+    for key in ("final", "attempts", "retries"):
+        report[key] = dict(report[key])
+    report["backoff_seconds"] = round(report["backoff_seconds"], 1)
+    report["idle_seconds"] = round(report["idle_seconds"], 1)
+    return report
+
+
+async def scan_with_retry_queues(scanner, pending, concurrency=CONCURRENCY, progress=None, on_final=None):
+    """
+    依結果類別分流的掃描排程 (單一行程)：
+    - 每個類別一個重試佇列 (依可執行時間排序的 heap)，退避秒數與次數上限見 scan_outcome.RETRY_POLICY
+    - 等待退避的 URL 不佔用 worker，worker 先做已到期的重試、再做新 URL，全部都在等待時才休息
+    - 每個 URL 保留最好的一次結果 (重試失敗時仍保留先前的部分資料)
+    每個 URL 結束時呼叫 on_final(item, 最終結果, 所有嘗試的耗時秒數)。
+    回傳 (有資料的商品 dict 清單, 統計報告)。
+    """
+    fresh = deque(pending)
+    retry_queues = {status: [] for status in STATUSES}
+    seq = 0
+    in_flight = 0
+    results = []
+    report = _new_report()
+
+    def _next_job():
+        now = time.monotonic()
+        ready = [q for q in retry_queues.values() if q and q[0][0] <= now]
+        if ready:
+            _, _, job = heapq.heappop(min(ready, key=lambda q: q[0][0]))
+            return job
+        if fresh:
+            return _new_job(fresh.popleft())
+        return None
+
+    async def _worker():
+        nonlocal seq, in_flight
+        while True:
+            job = _next_job()
+            if job is None:
+                waiting = [q[0][0] for q in retry_queues.values() if q]
+                if not waiting and in_flight == 0:
+                    return
+                # 只剩退避中的重試 (或其他 worker 仍在執行、可能產生新重試)
+                pause = min(waiting) - time.monotonic() if waiting else 0.2
+                pause = min(max(pause, 0.05), 0.2) if in_flight else max(pause, 0.05)
+                report["idle_seconds"] += pause
+                await asyncio.sleep(pause)
+                continue
+
+            in_flight += 1
+            try:
+                outcome = await _scan_once(scanner, job["item"], job["previous"])
+            finally:
+                in_flight -= 1
+            delay = _record_attempt(job, outcome)
+            if delay is not None:
+                seq += 1
+                heapq.heappush(retry_queues[outcome.status], (time.monotonic() + delay, seq, job))
+                continue
+
+            final = _final_outcome(job, outcome)
+            if final.data is not None:
+                results.append(final.data)
+            _add_to_report(report, job["item"]["brand"], final.status, job["attempts"], job["retries"], job["backoff"])
+            if on_final is not None:
+                on_final(job["item"], final, job["elapsed"])
+            if progress is not None:
+                progress.update(1)
+
+    await asyncio.gather(*[_worker() for _ in range(max(1, concurrency))])
+    return results, _close_report(report)
+
+
+# ------------------------------------------
+# 工作佇列模式：多行程 / 多機 worker 共用同一個佇列
+# 退避中的重試以 nack(delay) 放回佇列，任何 worker 都可接手
+# ------------------------------------------
+QUEUE_POLL_SECONDS = 1.0
+# 本機 worker 連續這麼多輪全部結束卻沒有完成任何工作 (瀏覽器啟動失敗、匯入錯誤、佇列路徑錯誤...) 即中止
+MAX_IDLE_RESPAWNS = int(os.environ.get("D2C_QUEUE_MAX_IDLE_RESPAWNS", "3"))
+
+
+async def run_queue_worker(queue_spec=None, concurrency=CONCURRENCY, worker_id=None):
+    """
+    持續從佇列租工作來掃描，佇列中沒有未完成的工作 (含其他 worker 租用中的) 時結束。
+    租用中的工作定期 heartbeat；worker 當掉時租約過期，工作自動回到佇列。
+    回傳此 worker 處理的嘗試次數。
+    """
+    queue = open_queue(queue_spec)
+    scanner = AgentD2CScanner()
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    active = set()
+    handled = 0
+    print(f"👷 [Worker {worker_id}] 連接佇列 {queue_spec or QUEUE_PATH} (並行 {concurrency})")
+    lag_monitor = get_lag_monitor().start()
+
+    async def _heartbeat():
+        while True:
+            await asyncio.sleep(VISIBILITY_TIMEOUT / 3)
+            if active:
+                with lag_stage("queue"):
+                    queue.heartbeat(worker_id, list(active))
+
+    async def _slot():
+        nonlocal handled
+        while True:
+            with lag_stage("queue"):
+                leases = queue.lease(worker_id, 1)
+            if not leases:
+                if queue.remaining() == 0:
+                    return
+                await asyncio.sleep(QUEUE_POLL_SECONDS)
+                continue
+
+            task = leases[0]
+            active.add(task["id"])
+            try:
+                job = _job_from_state(task["payload"], task["state"])
+                outcome = await _scan_once(scanner, job["item"], job["previous"])
+                handled += 1
+                delay = _record_attempt(job, outcome)
+                with lag_stage("queue"):
+                    if delay is not None:
+                        queue.nack(task["id"], worker_id, delay, state=_job_to_state(job), error=outcome.reason)
+                        continue
+                    final = _final_outcome(job, outcome)
+                    queue.ack(task["id"], worker_id, result=final.to_dict(), state=_job_to_state(job))
+            finally:
+                active.discard(task["id"])
+
+    heartbeat = asyncio.create_task(_heartbeat())
+    try:
+        await asyncio.gather(*[_slot() for _ in range(max(1, concurrency))])
+    finally:
+        heartbeat.cancel()
+        queue.close()
+        await lag_monitor.stop()
+        get_offload().shutdown()
+    print(f"👷 [Worker {worker_id}] 佇列已清空，共處理 {handled} 次掃描")
+    scanner.llm.usage.print_report(scanner.llm.name)
+    lag_monitor.print_report()
+    return handled
+
+
+def _worker_process(queue_spec, concurrency):
+    asyncio.run(run_queue_worker(queue_spec, concurrency))
+
+
+def collect_queue_results(queue, batch, on_final=None):
+    """彙整某個 batch 的結果：(有資料的商品 dict 清單, 統計報告)，格式與 scan_with_retry_queues 相同。"""
+    results = []
+    report = _new_report()
+    for row in queue.results(batch):
+        state = row["state"] or {}
+        final = ScanOutcome.from_dict(row["result"])
+        if final is None:
+            # 反覆讓 worker 當掉、被標記為 failed 的工作
+            final = ScanOutcome(TRANSIENT, row["key"], reason=row["error"] or row["status"])
+        if final.data is not None:
+            results.append(final.data)
+        _add_to_report(report, row["payload"].get("brand", "Unknown"), final.status,
+                       state.get("attempts") or {}, state.get("retries") or {}, state.get("backoff") or 0.0)
+        if on_final is not None:
+            on_final(row["payload"], final, state.get("elapsed") or 0.0)
+    return results, _close_report(report)
+
+
+async def scan_with_work_queue(pending, queue_spec=None, workers=2, concurrency=CONCURRENCY, progress=None, on_final=None):
+    """
+    將 pending 放進共用佇列並啟動 workers 個本機 worker 行程 (workers=0 時只等待外部 worker)。
+    其他機器可用 `python data/batch_scanner.py worker --queue <同一佇列>` 隨時加入。
+    本機 worker 全部結束但仍有未完成工作 (例如 worker 當掉) 時會補啟動；
+    連續 MAX_IDLE_RESPAWNS 次補啟動都沒有完成任何工作時拋出 RuntimeError (附 worker exitcode)。
+    """
+    queue = open_queue(queue_spec)
+    batch = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}-{os.getpid()}"
+    queue.enqueue(batch, pending)
+    total = sum(queue.counts(batch).values())
+    print(f"📮 已放入佇列 {queue_spec or QUEUE_PATH} (batch {batch}，{total} 筆)，啟動 {workers} 個本機 worker")
+
+    ctx = multiprocessing.get_context("spawn")
+
+    def _spawn(n):
+        procs = [ctx.Process(target=_worker_process, args=(queue_spec, concurrency)) for _ in range(n)]
+        for proc in procs:
+            proc.start()
+        return procs
+
+    procs = _spawn(workers)
+    finished = 0
+    finished_at_spawn = 0
+    idle_respawns = 0
+    try:
+        while True:
+            counts = queue.counts(batch)
+            now_finished = counts.get(DONE, 0) + counts.get(FAILED, 0)
+            if progress is not None and now_finished > finished:
+                progress.update(now_finished - finished)
+            finished = now_finished
+            if finished >= total:
+                break
+            if workers and not any(p.is_alive() for p in procs):
+                idle_respawns = idle_respawns + 1 if finished == finished_at_spawn else 0
+                exitcodes = [p.exitcode for p in procs]
+                if idle_respawns > MAX_IDLE_RESPAWNS:
+                    raise RuntimeError(
+                        f"本機 worker 連續 {idle_respawns} 輪未完成任何工作即結束 (exitcode {exitcodes})，"
+                        f"佇列 batch {batch} 仍有 {total - finished} 筆未完成"
+                    )
+                print(f"⚠️ 本機 worker 皆已結束 (exitcode {exitcodes}) 但佇列仍有工作，重新啟動 worker")
+                finished_at_spawn = finished
+                procs = _spawn(workers)
+            await asyncio.sleep(QUEUE_POLL_SECONDS)
+    finally:
+        for proc in procs:
+            proc.join()
+
+    results, report = collect_queue_results(queue, batch, on_final)
+    queue.purge(batch)
+    queue.close()
+    return results, report
+
+
+def unchanged_ratio(counts):
+    """條件式請求確認未變動而略過渲染的 URL 比例 (分母為該品牌所有結束的 URL)。"""
+    total = sum(counts.values())
+    return counts.get(UNCHANGED, 0) / total if total else 0.0
+
+
+def print_outcome_report(report):
+    print("\n📊 掃描結果分類 (最終 / 嘗試次數 / 重試次數)")
+    for status in STATUSES:
+        final = report["final"].get(status, 0)
+        attempts = report["attempts"].get(status, 0)
+        retries = report["retries"].get(status, 0)
+        if final or attempts:
+            print(f"  - {status:<11} {final:>5} / {attempts:>5} / {retries:>5}")
+    print(f"  排定退避 {report['backoff_seconds']}s，worker 閒置等待 {report['idle_seconds']}s")
+    if report["final"].get(UNCHANGED):
+        print("  未變動略過率 (不渲染、不送 LLM)：")
+        for brand, counts in report["by_brand"].items():
+            print(f"    - {brand:<12} {counts.get(UNCHANGED, 0):>5} / {sum(counts.values()):>5} ({unchanged_ratio(counts):.0%})")
+
+
+async def main(workers=None, queue_spec=None, concurrency=CONCURRENCY):
+    """workers / queue_spec 皆未指定時在本行程掃描；否則改用共用工作佇列與 worker 行程。"""
+    os.makedirs(os.path.dirname(TARGET_JSON) or ".", exist_ok=True)
+    lag_monitor = get_lag_monitor().start()
 
     if not os.path.exists(DOMAINS_CSV):
         print(f"❌ 找不到網域清單: {DOMAINS_CSV}")
@@ -265,25 +610,27 @@ async def main():
     for i, (brand, domain) in enumerate(domains, 1):
         print(f"  {i:02d}. {brand} -> {domain}")
 
-    parser = SitemapParser()
-    scanner = AgentD2CScanner()
+    # 本輪已見網址 (只存 hash)：sitemap、產品總覽頁補抓與各品牌之間重複的網址在解析時即略過
+    # (追蹤參數 / fragment / 結尾斜線 / http / www 變體以正規化網址視為同一頁)
+    run_seen = SeenSet()
+    parser = SitemapParser(seen=run_seen)
     parse_metrics = {}
 
     # 1) 先做 sitemap 解析（每個品牌可重試）
-    target_list = []
+    discovered = []
     for brand, domain in domains:
         parsed_ok = False
         for attempt in range(1, MAX_RETRIES + 1):
             try:
-                items_all = parser.process_domain(brand, domain)
+                # 同步 requests，移到 thread 執行以免卡住 event loop
+                with lag_stage("sitemap"):
+                    items_all = await asyncio.to_thread(parser.process_domain, brand, domain)
                 cap = BRAND_URL_CAPS.get(brand, MAX_URLS_PER_BRAND)
-                # 每品牌限制前 N 個，控時與穩定（可品牌化調整）
-                items = items_all[:cap]
-                target_list.extend(items)
+                discovered.extend(items_all)
                 parse_metrics[brand] = {
                     "domain": domain,
                     "parsed_urls": len(items_all),
-                    "capped_urls": len(items),
+                    "capped_urls": 0,
                     "url_cap": cap,
                 }
                 parsed_ok = True
@@ -305,18 +652,35 @@ async def main():
             }
             continue
 
+    pending = [{"url": item["url"], "brand": item.get("brand", "Unknown")} for item in discovered if item.get("url")]
+
+    # 跨次執行的已見網址 (只存 hash)：統計各品牌本輪新出現的 URL
+    # (已知網址仍需交給排程器決定是否重掃，因此不在解析時略過)
+    known_urls = SeenSet(SEEN_PATH)
+    new_urls = set(known_urls.add_many(item["url"] for item in pending))
+    known_urls.save()
+    new_per_brand = Counter(item["brand"] for item in pending if item["url"] in new_urls)
+    for brand, stats in parse_metrics.items():
+        stats["new_urls"] = new_per_brand.get(brand, 0)
+    if new_urls:
+        print(f"🆕 新發現 URL {len(new_urls)} 個：" + "、".join(f"{b} {n}" for b, n in new_per_brand.most_common()))
+
+    # 依過期程度 / 價格波動 / 品牌重要度排序，填滿本輪瀏覽器時間預算（取代每品牌取 sitemap 前 N 個）
+    scheduler = RecrawlScheduler(brand_weights=BRAND_PRIORITY)
+    budget = CRAWL_BUDGET_SECONDS or DEFAULT_SCAN_SECONDS * sum(
+        min(stats["parsed_urls"], stats["url_cap"]) for stats in parse_metrics.values()
+    )
+    with lag_stage("schedule"):
+        scheduler.register(pending)
+        pending, per_brand = scheduler.plan(pending, budget)
+    for brand, stats in parse_metrics.items():
+        stats["capped_urls"] = per_brand.get(brand, 0)
+    if pending:
+        print(f"🗓️ 本輪預算 {budget:.0f}s：從 {len(run_seen)} 個 URL 中排入 {len(pending)} 個")
+
     # 存 target json（方便追蹤）
     with open(TARGET_JSON, "w", encoding="utf-8") as f:
-        json.dump(target_list, f, ensure_ascii=False, indent=2)
-
-    # URL 去重
-    dedup_map = {}
-    for item in target_list:
-        u = item.get("url")
-        b = item.get("brand", "Unknown")
-        if u:
-            dedup_map[u] = b
-    pending = [{"url": u, "brand": b} for u, b in dedup_map.items()]
+        json.dump(pending, f, ensure_ascii=False, indent=2)
 
     if not pending:
         if FALLBACK_URLS:
@@ -333,39 +697,75 @@ async def main():
 
     print(f"🔗 待掃描 URL 數量: {len(pending)}")
 
-    # 2) 掃描（自動重試 + 錯誤記錄 + 不中斷）
-    sem = asyncio.Semaphore(CONCURRENCY)
-    scanned_results = []
+    # 2) 掃描（依失敗類別分流重試 + 錯誤記錄 + 不中斷）；每個 URL 的結果回寫重掃排程紀錄
+    verified = []
+
+    def _on_final(item, final, elapsed):
+        with lag_stage("record"):
+            scheduler.record(item["url"], final.status, (final.data or {}).get("price", 0), elapsed)
+        if final.status == UNCHANGED:
+            verified.append({"url": item["url"], "price": final.verified_price})
+
+    scanner = None
+    scan_start = time.perf_counter()
+    with tqdm(total=len(pending), desc="Scanning URLs", unit="url") as progress:
+        if workers is None and queue_spec is None:
+            scanner = AgentD2CScanner()
+            scanned_results, outcome_report = await scan_with_retry_queues(
+                scanner, pending, concurrency, progress, _on_final
+            )
+        else:
+            scanned_results, outcome_report = await scan_with_work_queue(
+                pending, queue_spec, 1 if workers is None else workers, concurrency, progress, _on_final
+            )
+    scan_seconds = time.perf_counter() - scan_start
+    scheduler.close()
     success_metrics = defaultdict(int)
-
-    async def _job(item):
-        async with sem:
-            res = await scan_url_with_retry(scanner, item["brand"], item["url"], MAX_RETRIES)
-            if res:
-                scanned_results.append(res)
-                b = (res.get("brand") or item["brand"] or "Unknown").strip()
-                success_metrics[b] += 1
-
-    tasks = [asyncio.create_task(_job(it)) for it in pending]
-    for job in tqdm(asyncio.as_completed(tasks), total=len(tasks), desc="Scanning URLs", unit="url"):
-        await job
+    for res in scanned_results:
+        success_metrics[(res.get("brand") or "Unknown").strip()] += 1
+    # 確認未變動的 URL 沿用既有資料 (存檔合併時保留舊列)，同樣算入成功筆數
+    for brand, counts in outcome_report["by_brand"].items():
+        success_metrics[brand] += counts.get(UNCHANGED, 0)
 
     # 3) 輸出（先做欄位強制補齊）
     scanned_results = enforce_required_product_fields(scanned_results)
     save_to_csv(scanned_results, OUTPUT_CSV)
+    # 略過渲染的未變動頁面同樣記入價格歷史，區間最低 / 最高與「某日價格」查詢才不會漏掉穩定的商品
+    record_verified_observations(verified, OUTPUT_CSV)
 
     # 4) 問題追蹤與解題任務清單
     issue_tasks = build_issue_tasks(parse_metrics, success_metrics)
-    issue_json, issue_md = save_issue_tracker(parse_metrics, success_metrics, issue_tasks)
+    issue_json, issue_md = save_issue_tracker(parse_metrics, success_metrics, issue_tasks, outcome_report)
 
     print("\n✅ 任務完成")
     print(f"- 目標品牌數: {len(domains)}")
     print(f"- 提取目標 URL: {len(pending)}")
     print(f"- 成功抓取筆數: {len(scanned_results)}")
+    print(f"- 掃描吞吐量: {len(pending) / max(scan_seconds, 1e-9):.2f} URL/s ({scan_seconds:.0f}s)")
+    print_outcome_report(outcome_report)
+    # 多 worker 行程時各 worker 結束時各自列出
+    if scanner is not None:
+        scanner.llm.usage.print_report(scanner.llm.name)
     print(f"- Error Log: {ERROR_LOG}")
     print(f"- 問題追蹤(JSON): {issue_json}")
     print(f"- 問題追蹤(MD): {issue_md}")
+    await lag_monitor.stop()
+    lag_monitor.print_report()
+    get_offload().shutdown()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    # 用法：
+    #   python data/batch_scanner.py                          # 單一行程
+    #   python data/batch_scanner.py --workers 4              # 4 個本機 worker 行程共用佇列
+    #   python data/batch_scanner.py worker --queue <佇列>    # 加入既有佇列 (可在其他機器執行)
+    cli = argparse.ArgumentParser(description="D2C 批次掃描")
+    cli.add_argument("command", nargs="?", choices=["run", "worker"], default="run")
+    cli.add_argument("--workers", type=int, default=None, help="本機 worker 行程數 (0 = 只等待外部 worker)")
+    cli.add_argument("--queue", default=None, help=f"工作佇列位置 (預設 {QUEUE_PATH})")
+    cli.add_argument("--concurrency", type=int, default=CONCURRENCY, help="每個 worker 同時掃描的 URL 數")
+    args = cli.parse_args()
+    if args.command == "worker":
+        asyncio.run(run_queue_worker(args.queue, args.concurrency))
+    else:
+        asyncio.run(main(args.workers, args.queue, args.concurrency))
@@ -0,0 +1,181 @@
+import asyncio
+import contextlib
+import functools
+import multiprocessing
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# ==========================================
+# CPU 密集工作 (HTML 解析、正則抽取) 移出 asyncio event loop
+# ==========================================
+# 每個行程的解析 worker 數；batch_scanner --workers 會再乘上行程數，預設保留一半核心給瀏覽器
+CPU_WORKERS = int(os.environ.get("D2C_CPU_WORKERS", "0")) or max(1, (os.cpu_count() or 2) // 2)
+# 同時送進 pool 的工作上限 (每個 worker)，超過時呼叫端在 event loop 上等待而不是無限排隊
+MAX_PENDING_PER_WORKER = 2
+# event loop 延遲取樣間隔與回報門檻 (秒)
+LAG_INTERVAL = 0.1
+LAG_THRESHOLD = 0.05
+
+
+class CpuOffload:
+    """
+    把同步的解析函式丟到 process pool 執行，event loop 只負責等待結果。
+    - 送出數量以 semaphore 限制 (workers × MAX_PENDING_PER_WORKER)
+    - process pool 無法建立或中途損毀 (BrokenProcessPool) 時改用 thread pool，不中斷掃描
+    fn 與參數必須可 pickle (模組層級函式)。
+    """
+
+    def __init__(self, max_workers=CPU_WORKERS, use_processes=True):
+        self.max_workers = max(1, max_workers)
+        self.mode = "process" if use_processes else "thread"
+        self._pool = None
+        self._threads = None
+        self._sem = None
+
+    def _thread_pool(self):
+        if self._threads is None:
+            self._threads = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="cpu-offload")
+        return self._threads
+
+    def _executor(self):
+        if self.mode == "thread":
+            return self._thread_pool()
+        if self._pool is None:
+            try:
+                # spawn：子行程不繼承 event loop 與瀏覽器連線
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+            except (OSError, ValueError, NotImplementedError) as e:
+                self._fallback(e)
+                return self._thread_pool()
+        return self._pool
+
+    def _fallback(self, err):
+        print(f"⚠️ [CpuOffload] process pool 無法使用 ({err})，改用 thread pool")
+        self.mode = "thread"
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.max_workers * MAX_PENDING_PER_WORKER)
+        call = functools.partial(fn, *args, **kwargs)
+        async with self._sem:
+            executor = self._executor()
+            if executor is self._pool:
+                try:
+                    return await loop.run_in_executor(executor, call)
+                except BrokenProcessPool as e:
+                    self._fallback(e)
+            return await loop.run_in_executor(self._thread_pool(), call)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+        if self._threads is not None:
+            self._threads.shutdown(wait=True)
+            self._threads = None
+
+
+class LoopLagMonitor:
+    """
+    量測 event loop 被阻塞的時間：每 LAG_INTERVAL 秒排一次計時器，實際醒來時間的延遲即為阻塞時間。
+    以 stage("名稱") 標記同步程式區段，延遲會歸給上一次取樣後進入或離開過的區段 (多個區段平均分攤)，
+    沒有任何區段時歸為 "(unlabelled)"。區段內若有 await，只有進出的那一刻會被計入，不會吃掉等待期間其他程式造成的延遲。
+    """
+
+    def __init__(self, interval=LAG_INTERVAL, threshold=LAG_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        self.samples = 0
+        self.by_stage = defaultdict(lambda: {"blocked_seconds": 0.0, "events": 0, "max": 0.0})
+        self._touched = set()
+        self._task = None
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        self._touched.add(name)
+        try:
+            yield
+        finally:
+            # 同步區段結束後才輪到計時器，離開時也要記錄，延遲才歸得到這個區段
+            self._touched.add(name)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(loop.time() - expected, 0.0)
+            self.samples += 1
+            stages, self._touched = self._touched, set()
+            if lag < self.threshold:
+                continue
+            self.total_lag += lag
+            self.max_lag = max(self.max_lag, lag)
+            stages = stages or {"(unlabelled)"}
+            for name in stages:
+                entry = self.by_stage[name]
+                entry["blocked_seconds"] += lag / len(stages)
+                entry["events"] += 1
+                entry["max"] = max(entry["max"], lag)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    def report(self):
+        return {
+            "samples": self.samples,
+            "blocked_seconds": round(self.total_lag, 2),
+            "max_lag": round(self.max_lag, 3),
+            "by_stage": {
+                name: {"blocked_seconds": round(v["blocked_seconds"], 2), "events": v["events"], "max": round(v["max"], 3)}
+                for name, v in sorted(self.by_stage.items(), key=lambda kv: -kv[1]["blocked_seconds"])
+            },
+        }
+
+    def print_report(self):
+        info = self.report()
+        print(f"\n⏱️ Event loop 阻塞 {info['blocked_seconds']}s (最長 {info['max_lag']}s，取樣 {info['samples']} 次)")
+        for name, v in info["by_stage"].items():
+            print(f"  - {name:<12} {v['blocked_seconds']:>7.2f}s / {v['events']} 次 / 最長 {v['max']:.3f}s")
+
+
+# 行程內共用的預設實例 (掃描器與 batch_scanner 共用同一個 pool 與監測器)
+_default_offload = None
+_default_monitor = None
+
+
+def get_offload():
+    global _default_offload
+    if _default_offload is None:
+        _default_offload = CpuOffload()
+    return _default_offload
+
+
+def get_lag_monitor():
+    global _default_monitor
+    if _default_monitor is None:
+        _default_monitor = LoopLagMonitor()
+    return _default_monitor
+
+
+def lag_stage(name):
+    """標記目前程式區段 (供 event loop 阻塞時間歸因)：with lag_stage("parse"): ..."""
+    return get_lag_monitor().stage(name)
+
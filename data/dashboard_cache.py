@@ -0,0 +1,56 @@
+import glob
+import hashlib
+import os
+
+import pandas as pd
+
+
+def data_manifest(data_dir="data", pattern="*.csv"):
+    """
+    列出資料夾內所有資料檔的 (路徑, mtime_ns, 大小)。
+    爬蟲寫入新 CSV 時 mtime/大小會改變，作為前台快取失效的依據。
+    """
+    manifest = []
+    for path in sorted(glob.glob(os.path.join(data_dir, pattern))):
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        manifest.append((os.path.basename(path), st.st_mtime_ns, st.st_size))
+    return tuple(manifest)
+
+
+def data_version(data_dir="data", pattern="*.csv"):
+    """將 manifest 壓成短雜湊，作為 st.cache_* 的快取鍵（只 stat 不讀檔，成本極低）。"""
+    digest = hashlib.sha1(repr(data_manifest(data_dir, pattern)).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def build_dashboard_artifacts(df):
+    """
+    每個資料版本只計算一次的側邊欄選項與概況指標。
+    回傳 dict，避免每次 rerun 重新 unique/sort/value_counts。
+    """
+    if df is None or df.empty:
+        return {
+            "categories": [],
+            "sources": [],
+            "brands": [],
+            "metrics": {"total": 0, "avg_price": 0, "top_brand": "未標示", "free_form_count": 0},
+        }
+
+    prices = pd.to_numeric(df["price"], errors="coerce")
+    positive = prices[prices > 0]
+    brand_counts = df["brand"].value_counts()
+
+    return {
+        "categories": sorted(df["category"].dropna().astype(str).unique().tolist()) if "category" in df.columns else [],
+        "sources": df["source"].dropna().astype(str).unique().tolist(),
+        "brands": sorted(df["brand"].dropna().astype(str).unique().tolist()),
+        "metrics": {
+            "total": int(len(df)),
+            "avg_price": int(positive.mean()) if not positive.empty else 0,
+            "top_brand": brand_counts.idxmax() if not brand_counts.empty else "未標示",
+            "free_form_count": int(df["product_highlights"].str.contains("游離型", na=False, regex=False).sum()),
+        },
+    }
@@ -0,0 +1,273 @@
+import glob
+import hashlib
+import os
+import re
+import sys
+import time
+import zlib
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from data.fda_index import normalize_term
+from data.product_record import match_key
+from data.search_index import char_ngrams
+
+# ==========================================
+# 跨來源商品歸戶 (Entity Resolution)
+# ==========================================
+# 同一個 SKU 可能同時出現在 PChome / Momo / 品牌官網 / 專屬爬蟲；
+# 這裡把它們歸到同一個 canonical_id，前台即可做真正的跨平台比價。
+DERIVED_DIR = os.environ.get("VITAGUIDE_DERIVED_DIR", "data/derived")
+OFFERS_TABLE = os.path.join(DERIVED_DIR, "entity_offers.csv")
+
+NUM_PERM = 32
+BANDS = 8                 # 每 band 4 列 → 約 Jaccard 0.6 以上才容易落入同一桶
+MATCH_JACCARD = 0.6
+_MERSENNE = np.uint64((1 << 31) - 1)
+_rng = np.random.RandomState(20240611)
+_PERM_A = _rng.randint(1, (1 << 31) - 1, size=NUM_PERM).astype(np.uint64)
+_PERM_B = _rng.randint(0, (1 << 31) - 1, size=NUM_PERM).astype(np.uint64)
+
+OFFER_COLUMNS = [
+    "canonical_id", "offer_key", "source", "brand", "title", "price", "unit_price",
+    "total_count", "url", "image_url", "norm_title", "block", "band_keys",
+]
+
+_BRACKET_RE = re.compile(r"[【\[]([^】\]]*)[】\]]")
+_PROMO_RE = re.compile(
+    r"限量|限時|限定|優惠\S{0,2}|特價|特惠|免運|熱銷|人氣|買\d*送\d*|加贈|再送|贈品|組合|禮盒|體驗組|"
+    r"新朋友|首購價?|團購|官方|原廠|正品|公司貨|現貨|醫師推薦|專科醫師推薦|獨家|第二代升級|升級版|新品"
+)
+# 組數：x3、*4盒、3入、2盒組、三入 (不含 粒/顆/錠，那是單盒規格)
+_BUNDLE_RE = re.compile(
+    r"(?<![a-z])[x*×]\s*\d{1,2}\s*(?:盒|瓶|罐|包|入|組|件)?|[\d一二三四五六七八九十兩]{1,2}\s*(?:入|件|盒|瓶|罐)\s*組?|\d{1,2}\s*組"
+)
+# 規格殘留的容器字 (60入/瓶 → 瓶)
+_CONTAINER_RE = re.compile(r"[盒瓶罐]")
+_COUNT_RE = re.compile(r"(\d+)\s*[粒顆錠包]")
+_BUNDLE_SIZE_RE = re.compile(r"[xX*]\s*(\d{1,2})\b")
+_BUNDLE_UNIT_RE = re.compile(r"[\s，\(（](\d{1,2})\s*[入件組]")
+_MARK_RE = re.compile(r"[®™©]")
+_NON_WORD_RE = re.compile(r"[^\w一-鿿]+")
+
+
+def parse_spec(title):
+    """(單盒顆數, 組數)；與各爬蟲 calculate_unit_price 相同的規則，找不到顆數時為 0。"""
+    if not isinstance(title, str):
+        return 0, 1
+    match = _COUNT_RE.search(title)
+    unit_count = int(match.group(1)) if match else 0
+    bundle = _BUNDLE_SIZE_RE.search(title) or _BUNDLE_UNIT_RE.search(title)
+    return unit_count, int(bundle.group(1)) if bundle else 1
+
+
+def brand_key(brand, title=""):
+    """品牌鍵：品牌欄正規化；品牌欄空白時改用標題開頭【】內的文字。"""
+    key = _NON_WORD_RE.sub("", _MARK_RE.sub("", normalize_term(brand)))
+    if not key or key in ("未標示", "nan"):
+        match = _BRACKET_RE.match(normalize_term(title))
+        key = _NON_WORD_RE.sub("", match.group(1)) if match else ""
+    return key
+
+
+def normalize_title(title, brand=""):
+    """
+    「【悠活原力】80%深海黃金魚油軟膠囊(60入/瓶)x3 限時優惠」→「80深海黃金魚油軟膠囊」
+    去掉【】內文字、促銷字、組數、顆數規格與品牌名，只留可比較的品名主體。
+    """
+    text = _MARK_RE.sub("", normalize_term(title))
+    text = _BRACKET_RE.sub(" ", text)
+    text = _PROMO_RE.sub(" ", text)
+    text = _COUNT_RE.sub(" ", text)
+    text = _BUNDLE_RE.sub(" ", text)
+    text = re.sub(r"\d+\s*(?:mg|g|ml|億)", " ", text)
+    text = _CONTAINER_RE.sub(" ", text)
+    key = normalize_term(brand)
+    if len(key) >= 2:
+        text = text.replace(key, " ")
+    return _NON_WORD_RE.sub("", text)
+
+
+def minhash_signature(grams):
+    """字元 bigram 集合 → NUM_PERM 維 MinHash 簽章 (crc32 + 線性雜湊族)。"""
+    if not grams:
+        return np.zeros(NUM_PERM, dtype=np.uint64)
+    hashed = np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams)) % _MERSENNE
+    return ((hashed[None, :] * _PERM_A[:, None] + _PERM_B[:, None]) % _MERSENNE).min(axis=1)
+
+
+def band_keys(signature):
+    rows = NUM_PERM // BANDS
+    return [f"{i}:{zlib.crc32(signature[i * rows:(i + 1) * rows].tobytes()):08x}" for i in range(BANDS)]
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def canonical_id_for(block, norm_title):
+    return "P" + hashlib.sha1(f"{block}|{norm_title}".encode("utf-8")).hexdigest()[:12]
+
+
+def infer_source(filename):
+    """與前台 load_data 相同的來源推斷 (CSV 沒有 source 欄位時使用)。"""
+    name = filename.lower()
+    if "daiken" in name:
+        return "大研生醫官網"
+    if "dietician" in name:
+        return "營養師輕食官網"
+    if "momo" in name:
+        return "Momo"
+    if "pchome" in name:
+        return "PChome"
+    return "Other"
+
+
+def load_offers(data_dir="data"):
+    """讀取 data/*.csv 中所有商品檔 (有 title 或 product_name 欄位者)，回傳統一欄位的報價表。"""
+    frames = []
+    for path in sorted(glob.glob(os.path.join(data_dir, "*.csv"))):
+        try:
+            df = pd.read_csv(path, dtype=str, keep_default_na=False)
+        except Exception as e:
+            print(f"⚠️ [Entity] 檔案 {path} 讀取失敗: {e}")
+            continue
+        df = df.rename(columns={"product_name": "title", "special_price": "price", "product_url": "url"})
+        if "title" not in df.columns or df.empty:
+            continue
+        if "source" not in df.columns:
+            df["source"] = infer_source(os.path.basename(path))
+        for col in OFFER_COLUMNS[2:10]:
+            if col not in df.columns:
+                df[col] = ""
+        frames.append(df[OFFER_COLUMNS[2:10]])
+    if not frames:
+        return pd.DataFrame(columns=OFFER_COLUMNS[1:10])
+    offers = pd.concat(frames, ignore_index=True)
+    offers = offers[offers["title"].str.strip() != ""]
+    offers.insert(0, "offer_key", [match_key(r) for r in offers.to_dict("records")])
+    return offers.drop_duplicates("offer_key", keep="last").reset_index(drop=True)
+
+
+def split_block(block):
+    brand, _, count = block.rpartition("|")
+    return brand, int(count or 0)
+
+
+class EntityResolver:
+    """
+    以 block (品牌|單盒顆數) 分組、組內以 MinHash-LSH 找候選的歸戶器。
+    - LSH 桶以品牌為範圍；單盒顆數在驗證時比對 (任一方未知視為相容，官網標題常不寫顆數)
+    - 每筆報價的 band key 會持久化，之後只需為新報價計算簽章並查桶，不必重掃整個商品庫
+    - 候選以正規化品名的 bigram Jaccard 驗證，超過 MATCH_JACCARD 即沿用對方的 canonical_id
+    - 已存在的 canonical_id 不再變動 (前台連結與歷史價格可以穩定引用)
+    """
+
+    def __init__(self):
+        self._buckets = defaultdict(list)   # brand#band_key → [(canonical_id, unit_count, grams)]
+
+    def add(self, canonical_id, block, norm_title, keys):
+        brand, count = split_block(block)
+        grams = char_ngrams(norm_title, 2)
+        for key in keys:
+            self._buckets[f"{brand}#{key}"].append((canonical_id, count, grams))
+
+    def resolve(self, block, norm_title):
+        """回傳 (canonical_id, band_keys)。"""
+        brand, count = split_block(block)
+        grams = char_ngrams(norm_title, 2)
+        keys = band_keys(minhash_signature(grams))
+        best_id, best_score = None, 0.0
+        seen = set()
+        for key in keys:
+            for cid, other_count, other in self._buckets.get(f"{brand}#{key}", ()):
+                if cid in seen or (count and other_count and count != other_count):
+                    continue
+                seen.add(cid)
+                score = jaccard(grams, other)
+                if score > best_score:
+                    best_id, best_score = cid, score
+        if best_score < MATCH_JACCARD:
+            best_id = canonical_id_for(block, norm_title)
+        self.add(best_id, block, norm_title, keys)
+        return best_id, keys
+
+
+def load_offer_table(path=OFFERS_TABLE):
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=OFFER_COLUMNS)
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+
+def run_resolution(data_dir="data", table_path=OFFERS_TABLE, full=False):
+    """
+    重新整理報價表：既有報價 (offer_key 相同) 沿用 canonical_id 只更新價格，
+    新報價才計算簽章並歸戶；來源 CSV 已不存在的報價移除。
+    """
+    start = time.perf_counter()
+    offers = load_offers(data_dir)
+    previous = pd.DataFrame(columns=OFFER_COLUMNS) if full else load_offer_table(table_path)
+    previous = previous.drop_duplicates("offer_key").set_index("offer_key")
+
+    resolver = EntityResolver()
+    for cid, block, norm, keys in previous[["canonical_id", "block", "norm_title", "band_keys"]].itertuples(index=False):
+        resolver.add(cid, block, norm, keys.split())
+
+    known = offers["offer_key"].isin(previous.index).to_numpy()
+    resolved = {col: [] for col in ("canonical_id", "norm_title", "block", "band_keys")}
+    for is_known, record in zip(known, offers.to_dict("records")):
+        if is_known:
+            old = previous.loc[record["offer_key"]]
+            values = (old["canonical_id"], old["norm_title"], old["block"], old["band_keys"])
+        else:
+            unit_count, _ = parse_spec(record["title"])
+            block = f"{brand_key(record['brand'], record['title'])}|{unit_count}"
+            norm = normalize_title(record["title"], record["brand"])
+            cid, keys = resolver.resolve(block, norm)
+            values = (cid, norm, block, " ".join(keys))
+        for col, value in zip(resolved, values):
+            resolved[col].append(value)
+
+    table = offers.assign(**resolved)[OFFER_COLUMNS]
+    os.makedirs(os.path.dirname(table_path) or ".", exist_ok=True)
+    table.to_csv(table_path, index=False, encoding="utf-8-sig")
+    return {
+        "offers": len(table),
+        "new": int((~known).sum()),
+        "entities": int(table["canonical_id"].nunique()),
+        "multi_source": int((table.groupby("canonical_id")["source"].nunique() > 1).sum()),
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+
+
+def attach_entities(df, table_path=OFFERS_TABLE):
+    """
+    前台用：為商品 DataFrame 加上 canonical_id、offer_count (同一商品的通路數) 與 best_unit_price
+    (同一商品各通路的最低單價)。尚未建立報價表時欄位為空值。
+    """
+    out = df.copy()
+    table = load_offer_table(table_path)
+    if table.empty or out.empty:
+        out["canonical_id"], out["offer_count"], out["best_unit_price"] = "", 1, 0.0
+        return out
+    keys = [match_key(r) for r in out[[c for c in ("url", "brand", "title") if c in out.columns]].to_dict("records")]
+    ids = pd.Series(keys).map(table.drop_duplicates("offer_key").set_index("offer_key")["canonical_id"]).fillna("")
+    out["canonical_id"] = ids.to_numpy()
+
+    unit_prices = pd.to_numeric(out["unit_price"], errors="coerce") if "unit_price" in out.columns else pd.Series(0.0, index=out.index)
+    grouped = out.assign(_unit=unit_prices.where(unit_prices > 0))[out["canonical_id"] != ""].groupby("canonical_id")
+    offer_count = grouped["source"].nunique() if "source" in out.columns else grouped.size()
+    out["offer_count"] = out["canonical_id"].map(offer_count).fillna(1).astype(int).to_numpy()
+    out["best_unit_price"] = out["canonical_id"].map(grouped["_unit"].min()).fillna(0.0).to_numpy()
+    return out
+
+
+if __name__ == "__main__":
+    # 用法：python -m data.entity_resolution [--full]
+    result = run_resolution(full="--full" in sys.argv)
+    print(f"🧩 [Entity] 報價 {result['offers']} 筆 (新 {result['new']} 筆) → 商品 {result['entities']} 個，"
+          f"跨通路商品 {result['multi_source']} 個 → {OFFERS_TABLE} (耗時 {result['seconds']} 秒)")
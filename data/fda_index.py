@@ -0,0 +1,195 @@
+import json
+import os
+import re
+import sys
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
+
+from data.fda_registry import REGISTRY_PARQUET, load_registry_frame, registry_version
+
+INDEX_PATH = os.environ.get("FDA_INDEX_PATH", "data/fda_registry_index.json")
+
+# NFKC 後全形標點已轉半形，剩下的中文頓號、句讀另外列出
+# 政府資料偶有私用區造字 (無法顯示的分隔符號)，一併視為分隔
+_SPLIT_RE = re.compile(r"[、,;/\n\ue000-\uf8ff]|(?<![A-Za-z0-9])\+(?![A-Za-z0-9])")
+_PAREN_RE = re.compile(r"\(([^()]*)\)")
+# 含量 / 規格數值：9.6~14.4 mg/g、22.4 ~ 33.6 mg/g、1.2~1.8公克/ 58.5公克(每份)
+_QUANTITY_RE = re.compile(
+    r"[:]?\s*\d+(?:\.\d+)?\s*(?:~\s*\d+(?:\.\d+)?)?\s*"
+    r"(?:mg|g|μg|µg|ug|IU|cfu|CFU|%|毫克|公克|微克|克|億|個)(?:\s*/\s*\d*(?:\.\d+)?\s*(?:mg|g|ml|mL|公克|克|顆|粒|錠|份))?"
+)
+_PREFIX_RE = re.compile(r"^(?:品管指標成分|指標成分|機能性成分|保健功效成分|每份\S*?含)\s*[:]?\s*")
+_STANDARD_RE = re.compile(r"^(.+?)\(規格標準\)\s*-\s*(.+)$")
+
+
+def normalize_term(text):
+    """全形轉半形 (NFKC)、小寫、壓縮空白；查詢字與索引詞使用同一套規則。"""
+    if not isinstance(text, str):
+        return ""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return re.sub(r"\s+", " ", text).strip(" :-.")
+
+
+def tokenize_effects(text):
+    """
+    「調節血脂功能, 紅麴(規格標準)-調節血脂功能」→ ({"調節血脂"}, {"紅麴"})
+    功效去掉「功能」字尾；規格標準類的前綴另外回傳為成分。
+    """
+    effects, ingredients = set(), set()
+    for part in _SPLIT_RE.split(normalize_term(text)):
+        part = part.strip()
+        match = _STANDARD_RE.match(part)
+        if match:
+            ingredients.add(match.group(1).strip())
+            part = match.group(2).strip()
+        part = re.sub(r"功能$", "", part).strip()
+        if part:
+            effects.add(part)
+    return effects, ingredients
+
+
+def tokenize_ingredients(text):
+    """
+    「總乳酸菌(包含Streptococcus thermophilus、Lactobacillus delbrueckii)」、
+    「五味子乙素(Schisandrin B) 0.74~1.1 mg/g 芝麻素(Sesamin) 9.6~14.4 mg/g」等自由文字 → 成分詞集合。
+    括號內的別名 (英文名、俗名) 一併收錄，含量數值移除。
+    """
+    text = normalize_term(text)
+    if not text:
+        return set()
+    text = _QUANTITY_RE.sub("、", text)
+
+    tokens = set()
+    aliases = []
+    # 括號內容視為別名 (可能再以頓號分隔)，主詞保留括號外的部分
+    text = _PAREN_RE.sub(lambda m: aliases.append(m.group(1)) or "、", text)
+    for chunk in [text] + aliases:
+        for part in _SPLIT_RE.split(chunk):
+            part = _PREFIX_RE.sub("", part.strip()).strip(" :-.")
+            part = re.sub(r"^(?:包含|含)\s*|\s*計$", "", part).strip()
+            # 單字成分 (鈣、鐵) 只收中文字
+            if (len(part) >= 2 or "\u4e00" <= part[:1] <= "\u9fff") and not re.fullmatch(r"[\d.~\s]+", part):
+                tokens.add(part)
+    return tokens
+
+
+class RegistryIndex:
+    """
+    健康食品許可清單的成分 / 功效倒排索引。
+    - ingredient → license row id、effect → license row id (posting list 為排序過的 int32 陣列)
+    - 查詢詞先找完全相同的索引詞，找不到時以「索引詞包含查詢詞」展開 (結果快取)
+    - 多個條件取交集，回傳許可證字號
+    索引以 JSON 存放於 Parquet 旁，並記錄對應的原始檔指紋以判斷是否過期。
+    """
+
+    FIELDS = ("ingredient", "effect")
+
+    def __init__(self, license_ids, postings, source_digest=""):
+        self.license_ids = list(license_ids)
+        self.source_digest = source_digest
+        self._postings = {
+            field: {term: np.asarray(ids, dtype=np.int32) for term, ids in postings.get(field, {}).items()}
+            for field in self.FIELDS
+        }
+        self._expanded = {}
+
+    @classmethod
+    def build(cls, df, source_digest=""):
+        """df 需含 license_id / key_ingredients / approved_effect 欄位 (health_data.csv 或 fda_registry.parquet)。"""
+        postings = {field: defaultdict(list) for field in cls.FIELDS}
+        ingredients = df["key_ingredients"].tolist() if "key_ingredients" in df.columns else [""] * len(df)
+        effects = df["approved_effect"].tolist() if "approved_effect" in df.columns else [""] * len(df)
+        for row_id, (ing_text, effect_text) in enumerate(zip(ingredients, effects)):
+            effect_terms, standard_ingredients = tokenize_effects(effect_text)
+            for term in tokenize_ingredients(ing_text) | standard_ingredients:
+                postings["ingredient"][term].append(row_id)
+            for term in effect_terms:
+                postings["effect"][term].append(row_id)
+        return cls(df["license_id"].astype(str).tolist(), postings, source_digest)
+
+    def vocabulary(self, field):
+        return sorted(self._postings[field])
+
+    def lookup(self, field, term):
+        """單一查詢詞 → row id 陣列 (完全相同優先，否則展開為所有包含該詞的索引詞)。"""
+        term = normalize_term(term)
+        key = (field, term)
+        if key not in self._expanded:
+            postings = self._postings[field]
+            if term in postings:
+                ids = postings[term]
+            else:
+                hits = [ids for vocab, ids in postings.items() if term and term in vocab]
+                ids = np.unique(np.concatenate(hits)) if hits else np.empty(0, dtype=np.int32)
+            self._expanded[key] = ids
+        return self._expanded[key]
+
+    def query(self, ingredients=(), effects=()):
+        """所有條件皆需符合 (AND)，回傳許可證字號清單；未給任何條件時回傳空清單。"""
+        if isinstance(ingredients, str):
+            ingredients = [ingredients]
+        if isinstance(effects, str):
+            effects = [effects]
+        lists = [self.lookup("ingredient", t) for t in ingredients] + [self.lookup("effect", t) for t in effects]
+        if not lists:
+            return []
+        lists.sort(key=len)
+        ids = lists[0]
+        for other in lists[1:]:
+            if not len(ids):
+                break
+            ids = np.intersect1d(ids, other, assume_unique=True)
+        return [self.license_ids[i] for i in ids]
+
+    def save(self, path=INDEX_PATH):
+        payload = {
+            "source_digest": self.source_digest,
+            "license_ids": self.license_ids,
+            "postings": {
+                field: {term: ids.tolist() for term, ids in sorted(terms.items())}
+                for field, terms in self._postings.items()
+            },
+        }
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        with open(path, encoding="utf-8") as f:
+            payload = json.load(f)
+        return cls(payload["license_ids"], payload["postings"], payload.get("source_digest", ""))
+
+
+def load_or_build_index(path=INDEX_PATH, parquet_path=None, csv_path="health_data.csv"):
+    """
+    讀取已存檔的索引；不存在或與 Parquet 的原始檔指紋不符時重新建立並存檔。
+    未匯入 Parquet 時改由 health_data.csv 建立。
+    """
+    parquet_path = parquet_path or REGISTRY_PARQUET
+    digest = registry_version(parquet_path, csv_path)
+    if os.path.exists(path):
+        index = RegistryIndex.load(path)
+        if index.source_digest == digest:
+            return index
+
+    df = load_registry_frame(parquet_path, csv_path)
+    index = RegistryIndex.build(df, source_digest=digest)
+    index.save(path)
+    return index
+
+
+if __name__ == "__main__":
+    # 用法：python -m data.fda_index 葉黃素 --effect 護眼
+    args = sys.argv[1:]
+    effect_terms = [args[i + 1] for i, a in enumerate(args[:-1]) if a == "--effect"]
+    ingredient_terms = [a for i, a in enumerate(args) if a != "--effect" and (i == 0 or args[i - 1] != "--effect")]
+    idx = load_or_build_index()
+    matches = idx.query(ingredients=ingredient_terms, effects=effect_terms)
+    print(f"🔍 成分 {ingredient_terms} / 功效 {effect_terms} → {len(matches)} 張許可證")
+    for license_id in matches:
+        print(f"  - {license_id}")
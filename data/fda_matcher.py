@@ -0,0 +1,217 @@
+import glob
+import math
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from data.fda_index import normalize_term
+from data.fda_registry import REGISTRY_PARQUET, load_registry_frame, registry_version
+from data.product_record import key_brand, match_key
+from data.search_index import char_ngrams
+
+# ==========================================
+# 商品 ↔ 健康食品許可證比對
+# ==========================================
+MATCH_TABLE = os.environ.get("FDA_MATCH_TABLE", "data/derived/fda_matches.csv")
+MIN_SCORE = float(os.environ.get("FDA_MATCH_MIN_SCORE", "0.75"))
+# 商品沒有品牌時無法以申請商把關，改用較高門檻 (「納豆紅麴Q10膠囊」↔「納麴Q10膠囊」這類近似品名約 0.8)
+NO_BRAND_MIN_SCORE = float(os.environ.get("FDA_MATCH_NO_BRAND_MIN_SCORE", "0.9"))
+BRAND_BONUS = 0.15
+# 出現在超過此比例許可證中的 bigram (膠囊、軟膠…) 不拿來產生候選，只參與計分
+BLOCKING_MAX_DF_RATIO = 0.05
+MAX_CANDIDATES = 20
+# 比對規則版本：規則 / 門檻改變時遞增，比對表中舊版本的結果會全部重新比對
+RULES_VERSION = "2"
+
+DEFAULT_INPUTS = ["data/d2c_full_database.csv"] + sorted(glob.glob("data/*_data.csv"))
+MATCH_COLUMNS = [
+    "match_key", "source_file", "title", "brand",
+    "license_id", "license_name", "approved_effect", "score", "registry_version",
+]
+
+_MARK_RE = re.compile(r"[®™©]")
+# 規格數量：60粒、2盒組、20mg、(100粒/盒)
+_QUANTITY_RE = re.compile(r"\d+(?:\.\d+)?\s*(?:粒|顆|錠|包|入|盒|瓶|罐|組|件|ml|mg|g|公克|毫克|克|日份|天份)")
+_NON_WORD_RE = re.compile(r"[^\w一-鿿]+")
+_COMPANY_SUFFIX_RE = re.compile(r"(?:股份)?有限公司.*$|企業社$|商行$")
+
+
+def clean_name(text):
+    """品名正規化：全形轉半形、去商標符號與規格數量、標點視為空白後移除。"""
+    text = _QUANTITY_RE.sub(" ", _MARK_RE.sub("", normalize_term(text)))
+    return _NON_WORD_RE.sub("", text)
+
+
+def clean_company(text):
+    """申請商去掉「股份有限公司」等字尾，留下可與品牌比對的部分。"""
+    return clean_name(_COMPANY_SUFFIX_RE.sub("", normalize_term(text)))
+
+
+class LicenseMatcher:
+    """
+    以字元 bigram 做 blocking 的許可證比對器 (避免每個商品對整份許可清單逐一模糊比對)。
+    - 許可證品名 bigram → row id 倒排表；IDF 權重壓低「膠囊」這類到處都有的 bigram
+    - 候選：只用低頻 bigram 的 posting list 取出，依命中數取前 MAX_CANDIDATES 名
+    - 計分：商品標題涵蓋許可證品名的 IDF 加權比例 (0~1)，品牌與申請商 / 品名相符再加 BRAND_BONUS
+    - 商品有品牌時只接受品牌與申請商 / 品名相符的許可證；沒有品牌時門檻提高為 min_score_no_brand
+    """
+
+    def __init__(self, registry_df, min_score=MIN_SCORE, min_score_no_brand=NO_BRAND_MIN_SCORE):
+        self.min_score = min_score
+        self.min_score_no_brand = min_score_no_brand
+        self.license_ids = registry_df["license_id"].astype(str).tolist()
+        self.names = registry_df["product_name"].astype(str).tolist()
+        self.effects = registry_df["approved_effect"].astype(str).tolist() if "approved_effect" in registry_df.columns else [""] * len(self.names)
+        companies = registry_df["brand"].tolist() if "brand" in registry_df.columns else [""] * len(self.names)
+
+        self._grams = [char_ngrams(clean_name(n), 2) for n in self.names]
+        # 品牌比對對象：申請商 + 品名本身 (品牌名常出現在品名開頭)
+        self._owner_text = [clean_company(c) + clean_name(n) for c, n in zip(companies, self.names)]
+
+        postings = defaultdict(list)
+        for row_id, grams in enumerate(self._grams):
+            for gram in grams:
+                postings[gram].append(row_id)
+        size = max(len(self._grams), 1)
+        self._idf = {g: math.log(1 + size / len(ids)) for g, ids in postings.items()}
+        max_df = max(int(size * BLOCKING_MAX_DF_RATIO), 5)
+        self._blocking = {g: np.asarray(ids, dtype=np.int32) for g, ids in postings.items() if len(ids) <= max_df}
+        self._weight = np.array([sum(self._idf[g] for g in grams) or 1.0 for grams in self._grams])
+
+    def candidates(self, title_grams):
+        hits = [self._blocking[g] for g in title_grams if g in self._blocking]
+        if not hits:
+            return np.empty(0, dtype=np.int32)
+        counts = np.bincount(np.concatenate(hits))
+        nonzero = np.flatnonzero(counts)
+        if len(nonzero) > MAX_CANDIDATES:
+            nonzero = nonzero[np.argsort(-counts[nonzero], kind="stable")[:MAX_CANDIDATES]]
+        return nonzero
+
+    def match(self, title, brand=""):
+        """回傳 (row_id, score)；沒有超過門檻的候選時回傳 (None, 最佳分數)。"""
+        title_grams = char_ngrams(clean_name(title), 2)
+        brand_key = clean_name(key_brand(brand))
+        brand_grams = char_ngrams(brand_key, 2) if len(brand_key) >= 2 else set()
+        min_score = self.min_score if brand_grams else self.min_score_no_brand
+        best_row, best_score = None, 0.0
+        for row_id in self.candidates(title_grams):
+            shared = title_grams & self._grams[row_id]
+            if brand_grams:
+                # 商品有品牌：申請商 / 品名不符的許可證不採用 (同款通用品名常由其他廠商取得許可)
+                if brand_key not in self._owner_text[row_id]:
+                    continue
+                # 品牌相符：品牌字本身不再計入品名相似度，改以固定加分計算，避免同品牌不同商品互相誤配
+                brand_part = self._grams[row_id] & brand_grams
+                weight = self._weight[row_id] - sum(self._idf[g] for g in brand_part)
+                score = BRAND_BONUS
+                if weight > 0:
+                    score += sum(self._idf[g] for g in shared - brand_part) / weight
+            else:
+                score = sum(self._idf[g] for g in shared) / self._weight[row_id]
+            if score > best_score:
+                best_row, best_score = int(row_id), score
+        if best_score < min_score:
+            return None, round(best_score, 3)
+        return best_row, round(min(best_score, 1.0), 3)
+
+    def match_frame(self, df, source_file="", version=""):
+        """商品 DataFrame (需有 title，brand/url 可選) → 比對表 DataFrame (MATCH_COLUMNS)。"""
+        rows = []
+        for record in df.to_dict("records"):
+            row_id, score = self.match(record.get("title") or "", record.get("brand") or "")
+            rows.append({
+                "match_key": match_key(record),
+                "source_file": source_file,
+                "title": record.get("title") or "",
+                "brand": record.get("brand") or "",
+                "license_id": self.license_ids[row_id] if row_id is not None else "",
+                "license_name": self.names[row_id] if row_id is not None else "",
+                "approved_effect": self.effects[row_id] if row_id is not None else "",
+                "score": score,
+                "registry_version": version,
+            })
+        return pd.DataFrame(rows, columns=MATCH_COLUMNS)
+
+
+def load_match_table(path=MATCH_TABLE):
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=MATCH_COLUMNS)
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+
+def run_matching(inputs=None, table_path=MATCH_TABLE, parquet_path=REGISTRY_PARQUET, csv_path="health_data.csv", full=False):
+    """
+    比對所有商品檔並更新比對表。
+    增量模式：比對表中已存在、且許可清單版本相同的商品 (match_key) 直接沿用，只比對新商品；
+    許可清單或比對規則 (RULES_VERSION) 更新後版本不同，舊結果會全部重新比對。未命中的商品也會記錄 (license_id 為空)，避免每次重算。
+    """
+    start = time.perf_counter()
+    version = f"{registry_version(parquet_path, csv_path)}+r{RULES_VERSION}"
+    matcher = LicenseMatcher(load_registry_frame(parquet_path, csv_path))
+
+    table = pd.DataFrame(columns=MATCH_COLUMNS) if full else load_match_table(table_path)
+    table = table[table["registry_version"] == version]
+    done = set(table["match_key"])
+
+    new_frames = []
+    stats = {"products": 0, "new": 0, "matched": 0}
+    for path in inputs or DEFAULT_INPUTS:
+        if not os.path.exists(path):
+            print(f"⚠️ [FDA Match] 找不到 {path}，略過")
+            continue
+        df = pd.read_csv(path, usecols=lambda c: c in ("title", "brand", "url", "product_name", "product_url"), dtype=str, keep_default_na=False)
+        # 欄位對齊前台 load_data (大研官網檔為 product_name / product_url)，match_key 才對得上
+        if "title" not in df.columns and "product_name" in df.columns:
+            df = df.rename(columns={"product_name": "title"})
+        if "url" not in df.columns and "product_url" in df.columns:
+            df = df.rename(columns={"product_url": "url"})
+        if "title" not in df.columns:
+            continue
+        stats["products"] += len(df)
+        keys = df.apply(lambda r: match_key(r), axis=1) if len(df) else pd.Series(dtype=str)
+        pending = df[~keys.isin(done).to_numpy()].drop_duplicates()
+        if pending.empty:
+            continue
+        matched = matcher.match_frame(pending, source_file=os.path.basename(path), version=version)
+        matched = matched.drop_duplicates("match_key")
+        done.update(matched["match_key"])
+        new_frames.append(matched)
+        stats["new"] += len(matched)
+
+    if new_frames or full:
+        table = pd.concat([f for f in [table] + new_frames if not f.empty] or [table], ignore_index=True)
+        os.makedirs(os.path.dirname(table_path) or ".", exist_ok=True)
+        table.to_csv(table_path, index=False, encoding="utf-8-sig")
+    stats["matched"] = int((table["license_id"] != "").sum())
+    stats["seconds"] = round(time.perf_counter() - start, 2)
+    return stats
+
+
+def attach_licenses(df, table_path=MATCH_TABLE):
+    """
+    前台用：將比對表的 license_id / approved_effect 併入商品 DataFrame (以 match_key 對應，未命中為空字串)。
+    尚未建立比對表 (python -m data.fda_matcher) 時欄位為空字串。
+    """
+    out = df.copy()
+    table = load_match_table(table_path)
+    table = table[table["license_id"] != ""].drop_duplicates("match_key").set_index("match_key")
+    if table.empty or out.empty:
+        out["license_id"], out["approved_effect"] = "", ""
+        return out
+    keys = pd.Series([match_key(r) for r in out[[c for c in ("url", "brand", "title") if c in out.columns]].to_dict("records")])
+    for col in ("license_id", "approved_effect"):
+        out[col] = keys.map(table[col]).fillna("").to_numpy()
+    return out
+
+if __name__ == "__main__":
+    # 用法：python -m data.fda_matcher [商品檔...] [--full]
+    files = [a for a in sys.argv[1:] if not a.startswith("--")]
+    result = run_matching(files or None, full="--full" in sys.argv)
+    print(f"🔗 [FDA Match] 商品 {result['products']} 筆，本次新比對 {result['new']} 筆，"
+          f"已對應許可證 {result['matched']} 筆 → {MATCH_TABLE} (耗時 {result['seconds']} 秒)")
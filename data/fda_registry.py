@@ -0,0 +1,206 @@
+import codecs
+import hashlib
+import os
+import time
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# ==========================================
+# 衛福部「健康食品」許可資料匯入
+# ==========================================
+# 政府 CSV 欄位 → 系統欄位 (app.py 等前台使用英文欄名)
+FIELD_MAP = {
+    "許可證字號": "license_id",
+    "中文品名": "product_name",
+    "申請商": "brand",
+    "保健功效": "approved_effect",
+    "保健功效相關成分": "key_ingredients",
+}
+KEY_COLUMN = "license_id"
+VALUE_COLUMNS = [c for c in FIELD_MAP.values() if c != KEY_COLUMN]
+
+REGISTRY_PARQUET = os.environ.get("FDA_REGISTRY_PARQUET", "data/fda_registry.parquet")
+CHUNK_ROWS = int(os.environ.get("FDA_CHUNK_ROWS", "50000"))
+SNIFF_BYTES = 64 * 1024
+
+# Parquet schema metadata：記錄上次匯入的原始檔指紋，同一份檔案重跑直接略過
+META_SOURCE_DIGEST = b"source_sha256"
+
+
+def sniff_encoding(path, sample_bytes=SNIFF_BYTES):
+    """
+    只讀檔頭判斷編碼：BOM → utf-8-sig；前 64KB 可解為 UTF-8 → utf-8；否則 cp950 (Big5)。
+    取代「整檔用 UTF-8 讀一次、失敗再整檔重讀」的做法。
+    """
+    with open(path, "rb") as f:
+        head = f.read(sample_bytes)
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    try:
+        # final=False：樣本尾端被截斷的多位元組字元不算錯誤
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "cp950"
+
+
+def file_digest(path, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_registry_chunks(path, encoding=None, chunk_rows=CHUNK_ROWS):
+    """
+    分塊讀取原始 CSV，只解析 FIELD_MAP 中存在的欄位 (usecols)，全部以字串讀入。
+    每塊已改為英文欄名並去除頭尾空白；缺少的欄位補空字串。
+    """
+    encoding = encoding or sniff_encoding(path)
+    header = pd.read_csv(path, encoding=encoding, nrows=0).columns
+    header = [str(c).strip() for c in header]
+    if "許可證字號" not in header:
+        raise ValueError(f"找不到主鍵欄位 '許可證字號'，檔案欄位為: {header}")
+    missing = [c for c in FIELD_MAP if c not in header]
+    if missing:
+        print(f"⚠️ 警告：找不到欄位 {missing}，將以空白補齊。")
+
+    reader = pd.read_csv(
+        path,
+        encoding=encoding,
+        usecols=lambda c: str(c).strip() in FIELD_MAP,
+        dtype=str,
+        keep_default_na=False,
+        chunksize=chunk_rows,
+    )
+    for chunk in reader:
+        chunk.columns = [FIELD_MAP[str(c).strip()] for c in chunk.columns]
+        for col in FIELD_MAP.values():
+            chunk[col] = chunk[col].str.strip() if col in chunk.columns else ""
+        chunk = chunk[chunk[KEY_COLUMN] != ""]
+        yield chunk[list(FIELD_MAP.values())]
+
+
+def row_hashes(df):
+    """每列內容雜湊 (uint64)，用來判斷同一張許可證的內容是否變動。"""
+    return pd.util.hash_pandas_object(df[VALUE_COLUMNS], index=False).to_numpy()
+
+
+def _require_pyarrow():
+    if pq is None:
+        raise ImportError("fda_registry 需要 pyarrow：pip install pyarrow")
+
+
+def _schema(source_digest=""):
+    fields = [(c, pa.string()) for c in FIELD_MAP.values()] + [("row_hash", pa.uint64())]
+    return pa.schema(fields, metadata={META_SOURCE_DIGEST: source_digest.encode()})
+
+
+def stored_source_digest(parquet_path=REGISTRY_PARQUET):
+    if pq is None or not os.path.exists(parquet_path):
+        return ""
+    metadata = pq.read_schema(parquet_path).metadata or {}
+    return metadata.get(META_SOURCE_DIGEST, b"").decode()
+
+
+def load_registry(parquet_path=REGISTRY_PARQUET, columns=None):
+    """讀回已匯入的許可清單 (以 license_id 為索引，columns 須包含 license_id)；尚未匯入時回傳空表。"""
+    _require_pyarrow()
+    if os.path.exists(parquet_path):
+        df = pq.read_table(parquet_path, columns=columns).to_pandas()
+    else:
+        df = _schema().empty_table().select(columns or _schema().names).to_pandas()
+    return df.set_index(KEY_COLUMN, drop=False)
+
+
+def registry_version(parquet_path=REGISTRY_PARQUET, csv_path="health_data.csv"):
+    """
+    許可清單的版本字串：已匯入 Parquet 時為原始檔指紋，否則以 health_data.csv 的 mtime/大小代替。
+    衍生資料 (索引、比對表) 以此判斷是否需要重建。
+    """
+    digest = stored_source_digest(parquet_path)
+    if not digest and csv_path and os.path.exists(csv_path):
+        st = os.stat(csv_path)
+        digest = f"csv:{st.st_mtime_ns}:{st.st_size}"
+    return digest
+
+
+def load_registry_frame(parquet_path=REGISTRY_PARQUET, csv_path="health_data.csv"):
+    """優先讀 Parquet，尚未匯入時改讀 health_data.csv；回傳以位置為索引的 DataFrame (字串欄位)。"""
+    if pq is not None and os.path.exists(parquet_path):
+        return load_registry(parquet_path).reset_index(drop=True)
+    return pd.read_csv(csv_path, dtype=str, keep_default_na=False)
+
+
+def _write_registry(df, parquet_path, source_digest):
+    os.makedirs(os.path.dirname(parquet_path) or ".", exist_ok=True)
+    table = pa.Table.from_pandas(df.reset_index(drop=True), schema=_schema(source_digest), preserve_index=False)
+    tmp_path = parquet_path + ".tmp"
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, parquet_path)
+
+
+def ingest_registry(raw_path, parquet_path=REGISTRY_PARQUET, csv_path="health_data.csv", full=False):
+    """
+    匯入 (或更新) 健康食品許可清單。
+    - 原始檔指紋與上次相同 → 直接略過
+    - 否則分塊讀取，逐塊與既有 row_hash 比對，只保留新增 / 內容變動的許可證 (diff)
+    - 有變動才重寫 Parquet (以 license_id 排序) 與相容用的 health_data.csv
+    原始檔中消失的許可證不會刪除 (政府資料以「證況」欄表示註銷，舊資料保留)。
+    full=True 時忽略既有資料重新建立。
+    回傳統計 dict。
+    """
+    _require_pyarrow()
+    start = time.perf_counter()
+    stats = {"read": 0, "added": 0, "changed": 0, "unchanged": 0, "total": 0, "skipped": False}
+
+    digest = file_digest(raw_path)
+    if not full and digest == stored_source_digest(parquet_path):
+        stats["skipped"] = True
+        stats["seconds"] = round(time.perf_counter() - start, 2)
+        print(f"⏭️ [FDA] 原始檔與上次匯入相同，略過 ({raw_path})")
+        return stats
+
+    # 比對只需要主鍵與雜湊兩欄 (轉 object 避免 uint64 在 reindex 補 NaN 時被轉成 float 失真)
+    existing = pd.Series(dtype=object) if full else load_registry(parquet_path, columns=[KEY_COLUMN, "row_hash"])["row_hash"].astype(object)
+    encoding = sniff_encoding(raw_path)
+    print(f"📂 [FDA] 讀取 {raw_path} (編碼: {encoding}，每塊 {CHUNK_ROWS} 筆)")
+
+    deltas = []
+    for chunk in read_registry_chunks(raw_path, encoding=encoding):
+        stats["read"] += len(chunk)
+        # 同一檔案內重複的許可證以最後一筆為準
+        chunk = chunk.drop_duplicates(KEY_COLUMN, keep="last").set_index(KEY_COLUMN, drop=False)
+        chunk["row_hash"] = row_hashes(chunk)
+        old_hash = existing.reindex(chunk.index).to_numpy()
+        is_new = pd.isna(old_hash)
+        is_changed = ~is_new & (old_hash != chunk["row_hash"].astype(object).to_numpy())
+        stats["added"] += int(is_new.sum())
+        stats["changed"] += int(is_changed.sum())
+        stats["unchanged"] += int((~is_new & ~is_changed).sum())
+        if (is_new | is_changed).any():
+            deltas.append(chunk[is_new | is_changed])
+
+    registry = load_registry("" if full else parquet_path)
+    if deltas:
+        delta = pd.concat(deltas)
+        # 跨塊重複的許可證同樣以最後一筆為準
+        delta = delta[~delta.index.duplicated(keep="last")]
+        registry = pd.concat([registry[~registry.index.isin(delta.index)], delta]).sort_index()
+        registry["row_hash"] = registry["row_hash"].astype("uint64")
+
+    # 內容無變動時也重寫一次以更新指紋，下次同檔直接略過
+    _write_registry(registry, parquet_path, digest)
+    if csv_path and (deltas or full):
+        registry[list(FIELD_MAP.values())].to_csv(csv_path, index=False, encoding="utf-8-sig")
+    stats["total"] = len(registry)
+
+    stats["seconds"] = round(time.perf_counter() - start, 2)
+    return stats
@@ -0,0 +1,242 @@
+import glob
+import hashlib
+import io
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from PIL import Image, ImageDraw
+
+# 放在 static/ 之下：Streamlit 開啟 enableStaticServing 後可直接以 app/static/... 提供縮圖
+STATIC_DIR = "static"
+CACHE_DIR = os.environ.get("VITAGUIDE_THUMB_DIR", os.path.join(STATIC_DIR, "thumbs"))
+MAX_CACHE_MB = int(os.environ.get("VITAGUIDE_THUMB_MAX_MB", "300"))
+THUMB_SIZE = (300, 300)
+THUMB_QUALITY = 70
+FETCH_TIMEOUT = 10
+FETCH_WORKERS = 8
+# 下載失敗的網址在這段時間內不重試，避免每次 rerun 都打到壞掉的 CDN
+FAILURE_TTL_SECONDS = 24 * 3600
+MAX_SOURCE_BYTES = 15 * 1024 * 1024
+
+
+class ThumbnailCache:
+    """
+    商品圖片本地縮圖快取 (content-addressed + LRU)。
+    - 每個 image_url 只下載一次，以 Pillow 轉為小尺寸 WebP
+    - 縮圖以原圖內容 sha256 命名 (objects/ab/<sha256>.webp)，不同網址的同一張圖只存一份
+    - SQLite 索引記錄 url → digest 與最後存取時間，總容量超過上限時淘汰最久未用的縮圖
+    - 本地產生的佔位圖取代 via.placeholder.com，前台不再依賴外部圖床
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_MB * 1024 * 1024, max_workers=FETCH_WORKERS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        # 只有 static/ 底下的目錄能經由 Streamlit 靜態路徑提供；其他位置 public_url 退回檔案路徑
+        static_root = os.path.abspath(STATIC_DIR)
+        self.servable = os.path.commonpath([static_root, os.path.abspath(cache_dir)]) == static_root
+        if not self.servable:
+            print(f"⚠️ [ImageCache] 縮圖目錄 {cache_dir} 不在 {STATIC_DIR}/ 之下，無法以 app/static/ 路徑提供，改回傳本地檔案路徑")
+        os.makedirs(os.path.join(cache_dir, "objects"), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(cache_dir, "index.sqlite3"), check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS objects (digest TEXT PRIMARY KEY, size INTEGER, last_access REAL);
+            CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, digest TEXT, fetched_at REAL);
+            CREATE TABLE IF NOT EXISTS failures (url TEXT PRIMARY KEY, failed_at REAL);
+        """)
+        self._url_map = dict(self._db.execute("SELECT url, digest FROM urls"))
+        self._failures = dict(self._db.execute("SELECT url, failed_at FROM failures"))
+        self._total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM objects").fetchone()[0]
+
+        self._session = requests.Session()
+        self._session.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+        })
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="thumb")
+        self._inflight = {}
+        self.placeholder_path = self._ensure_placeholder()
+
+    # ------------------------------------------
+    # 路徑工具
+    # ------------------------------------------
+    def _object_path(self, digest):
+        return os.path.join(self.cache_dir, "objects", digest[:2], f"{digest}.webp")
+
+    def public_url(self, path):
+        """static/ 下的檔案對應 Streamlit 靜態路徑 (app/static/...)，供 ImageColumn 使用；快取目錄不在 static/ 下時回傳檔案路徑。"""
+        if not self.servable:
+            return path
+        rel = os.path.relpath(path, STATIC_DIR).replace(os.sep, "/")
+        return f"app/static/{rel}"
+
+    def _ensure_placeholder(self):
+        """本地產生質感灰底佔位圖 (只做一次)。"""
+        path = os.path.join(self.cache_dir, "placeholder.webp")
+        if not os.path.exists(path):
+            img = Image.new("RGB", (300, 200), (248, 249, 250))
+            draw = ImageDraw.Draw(img)
+            text = "VitaGuide"
+            box = draw.textbbox((0, 0), text)
+            draw.text(((300 - (box[2] - box[0])) / 2, (200 - (box[3] - box[1])) / 2), text, fill=(108, 117, 125))
+            img.save(path, "WEBP", quality=THUMB_QUALITY)
+        return path
+
+    # ------------------------------------------
+    # 查詢
+    # ------------------------------------------
+    def lookup(self, url):
+        """只查快取不下載；命中回傳縮圖路徑，否則 None。"""
+        digest = self._url_map.get(url)
+        return self._object_path(digest) if digest else None
+
+    def lookup_many(self, urls):
+        """批次查詢 (適合表格 / 卡片模式一次對應整欄)；命中者以單次批次 UPDATE 更新存取時間，淘汰才是真正的 LRU。"""
+        digests = [self._url_map.get(u) if u else None for u in urls]
+        hits = [d for d in digests if d]
+        if hits:
+            self._touch(hits)
+        return [self._object_path(d) if d else None for d in digests]
+
+    def _touch(self, digests):
+        digests = set(digests)
+        now = time.time()
+        with self._lock:
+            self._db.executemany("UPDATE objects SET last_access = ? WHERE digest = ?", [(now, d) for d in digests])
+            self._db.commit()
+
+    # ------------------------------------------
+    # 下載與縮圖
+    # ------------------------------------------
+    def _download_and_store(self, url):
+        failed_at = self._failures.get(url)
+        if failed_at and time.time() - failed_at < FAILURE_TTL_SECONDS:
+            return None
+        try:
+            resp = self._session.get(url, timeout=FETCH_TIMEOUT, stream=True)
+            resp.raise_for_status()
+            raw = resp.raw.read(MAX_SOURCE_BYTES + 1, decode_content=True)
+            if len(raw) > MAX_SOURCE_BYTES:
+                raise ValueError("image too large")
+            digest = hashlib.sha256(raw).hexdigest()
+            path = self._object_path(digest)
+            if not os.path.exists(path):
+                img = Image.open(io.BytesIO(raw))
+                img.thumbnail(THUMB_SIZE)
+                if img.mode not in ("RGB", "RGBA"):
+                    img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                img.save(tmp_path, "WEBP", quality=THUMB_QUALITY)
+                os.replace(tmp_path, path)
+            self._register(url, digest, os.path.getsize(path))
+            return path
+        except Exception as e:
+            print(f"⚠️ [ImageCache] 圖片下載/轉檔失敗 {url}: {e}")
+            with self._lock:
+                self._failures[url] = time.time()
+                self._db.execute("INSERT OR REPLACE INTO failures VALUES (?, ?)", (url, self._failures[url]))
+                self._db.commit()
+            return None
+
+    def _register(self, url, digest, size):
+        now = time.time()
+        with self._lock:
+            known = self._db.execute("SELECT 1 FROM objects WHERE digest = ?", (digest,)).fetchone()
+            if not known:
+                self._db.execute("INSERT INTO objects VALUES (?, ?, ?)", (digest, size, now))
+                self._total_bytes += size
+            self._db.execute("INSERT OR REPLACE INTO urls VALUES (?, ?, ?)", (url, digest, now))
+            self._url_map[url] = digest
+            self._failures.pop(url, None)
+            self._db.execute("DELETE FROM failures WHERE url = ?", (url,))
+            self._evict_locked()
+            self._db.commit()
+
+    def _evict_locked(self):
+        """超過容量上限時，依 last_access 由舊到新淘汰縮圖（呼叫端需持有 lock）。"""
+        if self._total_bytes <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        rows = self._db.execute("SELECT digest, size FROM objects ORDER BY last_access ASC").fetchall()
+        for digest, size in rows:
+            if self._total_bytes <= target:
+                break
+            try:
+                os.remove(self._object_path(digest))
+            except OSError:
+                pass
+            self._db.execute("DELETE FROM objects WHERE digest = ?", (digest,))
+            for url in [u for u, d in self._db.execute("SELECT url, digest FROM urls WHERE digest = ?", (digest,))]:
+                self._url_map.pop(url, None)
+            self._db.execute("DELETE FROM urls WHERE digest = ?", (digest,))
+            self._total_bytes -= size
+
+    def _submit(self, url):
+        with self._lock:
+            future = self._inflight.get(url)
+            if future is None:
+                future = self._executor.submit(self._download_and_store, url)
+                self._inflight[url] = future
+                future.add_done_callback(lambda _f, u=url: self._inflight.pop(u, None))
+        return future
+
+    def fetch_many(self, urls):
+        """
+        取得多張圖片的本地縮圖路徑（未快取者並行下載）。
+        回傳與 urls 等長的路徑清單；無效或下載失敗者為佔位圖。
+        """
+        results = [None] * len(urls)
+        futures = {}
+        hits = []
+        for i, url in enumerate(urls):
+            if not isinstance(url, str) or not url.startswith("http"):
+                continue
+            digest = self._url_map.get(url)
+            if digest and os.path.exists(self._object_path(digest)):
+                results[i] = self._object_path(digest)
+                hits.append(digest)
+            else:
+                futures[i] = self._submit(url)
+        for i, future in futures.items():
+            results[i] = future.result()
+        if hits:
+            self._touch(hits)
+        return [p or self.placeholder_path for p in results]
+
+    def prefetch(self, urls):
+        """背景預先下載（不等待結果），供下一頁翻頁時直接命中。"""
+        for url in urls:
+            if isinstance(url, str) and url.startswith("http") and url not in self._url_map:
+                self._submit(url)
+
+
+def warm_cache_from_csv(data_dir="data"):
+    """離線預熱：把資料夾內所有 CSV 的 image_url 先轉成縮圖。"""
+    import pandas as pd
+
+    urls = set()
+    for path in glob.glob(os.path.join(data_dir, "*.csv")):
+        try:
+            df = pd.read_csv(path, usecols=lambda c: c == "image_url")
+        except Exception:
+            continue
+        if "image_url" in df.columns:
+            urls.update(u for u in df["image_url"].dropna().astype(str) if u.startswith("http"))
+
+    cache = ThumbnailCache()
+    pending = [u for u in urls if cache.lookup(u) is None]
+    print(f"🖼️ [ImageCache] 共 {len(urls)} 張圖片，需下載 {len(pending)} 張...")
+    start = time.time()
+    paths = cache.fetch_many(pending)
+    ok = sum(1 for p in paths if p != cache.placeholder_path)
+    print(f"✅ [ImageCache] 完成 {ok}/{len(pending)} 張，耗時 {time.time() - start:.1f} 秒，快取大小 {cache._total_bytes / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    warm_cache_from_csv(sys.argv[1] if len(sys.argv) > 1 else "data")
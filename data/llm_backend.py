@@ -0,0 +1,182 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import requests
+
+try:
+    import google.generativeai as genai
+except ImportError:
+    genai = None
+
+# ==========================================
+# LLM 後端介面：Gemini API 或本機替身伺服器 (data/llm_standin.py)
+# ==========================================
+# D2C_LLM_BACKEND=gemini (預設) / local；local 時改送 D2C_LOCAL_LLM_URL，不需 GOOGLE_API_KEY
+LLM_BACKEND = os.environ.get("D2C_LLM_BACKEND", "gemini")
+LOCAL_LLM_URL = os.environ.get("D2C_LOCAL_LLM_URL", "http://127.0.0.1:8765")
+DEFAULT_MODEL = "gemini-2.0-flash"
+# local 後端的同時請求上限 (HTTP 請求在專用 thread pool 中執行，不佔用 asyncio 預設 executor)
+LOCAL_CONCURRENCY = int(os.environ.get("D2C_LOCAL_LLM_CONCURRENCY", "32"))
+# HTTP 層逾時；呼叫端另有 D2C_LLM_TIMEOUT (asyncio.wait_for)
+LOCAL_HTTP_TIMEOUT = 120
+
+
+class LLMRateLimited(Exception):
+    """429 Resource exhausted (訊息格式與 Gemini SDK 相同，沿用既有的 "429" 字串判斷)。"""
+
+
+class LLMUsage:
+    """本行程的 LLM 呼叫統計：次數、token、延遲、錯誤 / 429 次數。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.latencies = []
+
+    def record(self, seconds, usage=None, error=None):
+        with self._lock:
+            self.calls += 1
+            self.latencies.append(seconds)
+            if isinstance(error, LLMRateLimited):
+                self.rate_limited += 1
+            elif error is not None:
+                self.errors += 1
+            if usage is not None:
+                self.prompt_tokens += getattr(usage, "prompt_token_count", 0) or 0
+                self.output_tokens += getattr(usage, "candidates_token_count", 0) or 0
+
+    def summary(self):
+        with self._lock:
+            lat = sorted(self.latencies)
+        pick = lambda q: round(lat[min(len(lat) - 1, int(q * len(lat)))], 3) if lat else 0.0
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "rate_limited": self.rate_limited,
+            "prompt_tokens": self.prompt_tokens,
+            "output_tokens": self.output_tokens,
+            "p50_seconds": pick(0.5),
+            "p95_seconds": pick(0.95),
+        }
+
+    def print_report(self, backend_name=""):
+        s = self.summary()
+        if not s["calls"]:
+            return
+        print(
+            f"🧠 [LLM] {backend_name} 呼叫 {s['calls']} 次 (錯誤 {s['errors']}、429 {s['rate_limited']})，"
+            f"token 輸入 {s['prompt_tokens']:,} / 輸出 {s['output_tokens']:,}，延遲 p50 {s['p50_seconds']}s / p95 {s['p95_seconds']}s"
+        )
+
+
+class GeminiBackend:
+    """google-generativeai SDK (generate_content_async)。"""
+
+    name = "gemini"
+
+    def __init__(self, model_name=DEFAULT_MODEL, generation_config=None):
+        self.api_key = os.environ.get("GOOGLE_API_KEY")
+        self.model = None
+        self.usage = LLMUsage()
+        if self.enabled:
+            genai.configure(api_key=self.api_key)
+            self.model = genai.GenerativeModel(model_name, generation_config=generation_config or {})
+
+    @property
+    def enabled(self):
+        return bool(self.api_key) and genai is not None
+
+    @property
+    def unavailable_reason(self):
+        if genai is None:
+            return "未安裝 google-generativeai"
+        return "" if self.api_key else "未設定 GOOGLE_API_KEY"
+
+    async def generate(self, prompt):
+        """回傳 SDK 的 response (.text / .usage_metadata)；失敗時拋出 SDK 的例外。"""
+        start = time.perf_counter()
+        try:
+            response = await self.model.generate_content_async(prompt)
+        except BaseException as e:
+            # 含呼叫端 wait_for 逾時造成的 CancelledError
+            self.usage.record(time.perf_counter() - start, error=e)
+            raise
+        self.usage.record(time.perf_counter() - start, getattr(response, "usage_metadata", None))
+        return response
+
+
+class LocalBackend:
+    """
+    本機替身伺服器 (Gemini REST 格式：POST /v1beta/models/<model>:generateContent)。
+    回應包成與 SDK 相同的 .text / .usage_metadata，呼叫端不需區分後端。
+    """
+
+    name = "local"
+
+    def __init__(self, model_name=DEFAULT_MODEL, generation_config=None, base_url=LOCAL_LLM_URL):
+        self.endpoint = f"{base_url.rstrip('/')}/v1beta/models/{model_name}:generateContent"
+        self.generation_config = generation_config or {}
+        self.usage = LLMUsage()
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=LOCAL_CONCURRENCY)
+        self.session.mount("http://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=LOCAL_CONCURRENCY, thread_name_prefix="llm-local")
+
+    @property
+    def enabled(self):
+        return True
+
+    @property
+    def unavailable_reason(self):
+        return ""
+
+    def _post(self, prompt):
+        body = {"contents": [{"parts": [{"text": prompt}]}], "generationConfig": self.generation_config}
+        res = self.session.post(self.endpoint, json=body, timeout=LOCAL_HTTP_TIMEOUT)
+        payload = res.json() if res.headers.get("Content-Type", "").startswith("application/json") else {}
+        if res.status_code == 429:
+            raise LLMRateLimited(f"429 Resource exhausted: {payload.get('error', {}).get('message', '')}")
+        if res.status_code != 200:
+            raise RuntimeError(f"{res.status_code} {payload.get('error', {}).get('message', res.text[:200])}")
+        text = "".join(
+            part.get("text", "")
+            for cand in payload.get("candidates", [])[:1]
+            for part in cand.get("content", {}).get("parts", [])
+        )
+        meta = payload.get("usageMetadata", {})
+        usage = SimpleNamespace(
+            prompt_token_count=meta.get("promptTokenCount", 0),
+            candidates_token_count=meta.get("candidatesTokenCount", 0),
+            total_token_count=meta.get("totalTokenCount", 0),
+        )
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+    async def generate(self, prompt):
+        start = time.perf_counter()
+        try:
+            response = await asyncio.get_running_loop().run_in_executor(self._executor, self._post, prompt)
+        except BaseException as e:
+            # 含呼叫端 wait_for 逾時造成的 CancelledError
+            self.usage.record(time.perf_counter() - start, error=e)
+            raise
+        self.usage.record(time.perf_counter() - start, response.usage_metadata)
+        return response
+
+
+BACKENDS = {"gemini": GeminiBackend, "local": LocalBackend}
+
+
+def get_llm_backend(model_name=DEFAULT_MODEL, generation_config=None, backend=None):
+    """依 D2C_LLM_BACKEND (或傳入的 backend 名稱) 建立 LLM 後端。"""
+    name = (backend or LLM_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"未知的 LLM 後端: {name} (可用: {', '.join(BACKENDS)})")
+    return BACKENDS[name](model_name, generation_config)
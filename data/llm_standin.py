@@ -0,0 +1,338 @@
+import argparse
+import glob
+import json
+import os
+import random
+import re
+import shlex
+import sys
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+# 確保可從專案根目錄匯入模組
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from general_scraper import calculate_unit_price, extract_brand, extract_highlights
+
+# ==========================================
+# 本機 Gemini 替身伺服器 (壓力 / 延遲測試用)
+# ==========================================
+# POST /v1beta/models/<model>:generateContent：以規則 extractor 從 prompt 中的頁面文字組出符合 schema 的 JSON
+# GET /stats：呼叫次數、各狀態碼、token 與延遲統計
+# --site <目錄>：另以 robots.txt / sitemap.xml / /products/item-NNNNN 提供該目錄的 HTML 商品頁
+#                (benchmarks/catalog_gen.py 的 html/)，batch_scanner 可完全離線執行
+DEFAULT_PORT = 8765
+# 延遲為對數常態分布 (中位數 / sigma)，另加輸出 token 的生成時間
+DEFAULT_LATENCY_MEDIAN = 1.2
+DEFAULT_LATENCY_SIGMA = 0.5
+DEFAULT_OUTPUT_TPS = 0.0
+# 模擬「卡住」的請求要等多久 (應大於呼叫端的 D2C_LLM_TIMEOUT)
+HANG_SECONDS = 60
+# prompt 中頁面文字的起點 (agent_d2c_scanner / d2c_dietician_crawler 的 prompt)
+_CONTENT_MARKERS = ("網頁內容:", "網頁內容摘要：")
+_CONTENT_END_MARKERS = ("請輸出 JSON", "任務要求")
+_PRICE_RE = re.compile(r"(?:NT\$|NTD|\$|售價[:：]?|特價[:：]?)\s*([\d,]{2,9})")
+_CJK_RE = re.compile(r"[㐀-鿿぀-ヿ가-힯]")
+
+
+def estimate_tokens(text):
+    """粗估 token 數：CJK 每字約 1 token，其餘每 4 字元約 1 token。"""
+    cjk = len(_CJK_RE.findall(text or ""))
+    return cjk + max(0, len(text or "") - cjk) // 4
+
+
+def _page_text(prompt):
+    for marker in _CONTENT_MARKERS:
+        if marker in prompt:
+            text = prompt.split(marker, 1)[1]
+            for end in _CONTENT_END_MARKERS:
+                text = text.split(end, 1)[0]
+            return text
+    return prompt
+
+
+def standin_extract(prompt):
+    """規則版「LLM」：標題取第一個含【】的行 (否則第一個夠長的行)，價格取第一個金額，規格與亮點沿用 general_scraper。"""
+    lines = [line.strip() for line in _page_text(prompt).splitlines() if line.strip()]
+    title = next((line for line in lines if "【" in line), "") or next((line for line in lines if len(line) >= 6), "")
+    # <title> 常見「商品名 | 品牌」
+    title = title.split(" | ")[0].strip()
+    price = 0
+    for line in lines:
+        match = _PRICE_RE.search(line)
+        if match:
+            price = int(match.group(1).replace(",", "") or 0)
+            if price:
+                break
+    total_count, unit_price = calculate_unit_price(title, price)
+    short_lines = [line for line in lines if len(line) <= 30]
+    highlights = [h for h in extract_highlights(title).split(";") if h]
+    for line in short_lines:
+        for h in extract_highlights(line).split(";"):
+            if h and h not in highlights:
+                highlights.append(h)
+    if "product_name" in prompt:
+        # d2c_dietician_crawler.extract_highlights_with_llm 的 schema
+        return {"product_name": title or "Unknown", "product_highlights": ";".join(highlights[:5])}
+    return {
+        "brand": extract_brand(title) if title else None,
+        "title": title or None,
+        "price": price,
+        "unit_price": unit_price or 0,
+        "total_count": total_count or 0,
+        "product_highlights": ";".join(highlights),
+    }
+
+
+class StandinState:
+    """故障注入設定與統計 (各 handler thread 共用)。"""
+
+    def __init__(self, latency_median=DEFAULT_LATENCY_MEDIAN, latency_sigma=DEFAULT_LATENCY_SIGMA, output_tps=DEFAULT_OUTPUT_TPS,
+                 error_rate=0.0, rate_429=0.0, hang_rate=0.0, bad_json_rate=0.0, rpm=0, site_dir=None, seed=None):
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.output_tps = output_tps
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.hang_rate = hang_rate
+        self.bad_json_rate = bad_json_rate
+        self.rpm = rpm
+        self.site_dir = site_dir
+        # 商品頁路徑 /products/item-00000 → HTML 檔 (避開 sitemap_parser 排除的 /page 等字樣)
+        self.site_pages = {
+            f"item-{i:05d}": path for i, path in enumerate(sorted(glob.glob(os.path.join(site_dir, "*.html"))))
+        } if site_dir else {}
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.window = deque()
+        self.status = Counter()
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.latencies = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.started = time.time()
+
+    def draw(self):
+        """一次請求的命運：(結果, 延遲秒數)。結果為 ok / error / 429 / hang / bad_json。"""
+        now = time.time()
+        with self.lock:
+            # 每分鐘配額 (滑動視窗)：超過即 429，與真實 API 的配額行為相同
+            while self.window and now - self.window[0] > 60:
+                self.window.popleft()
+            if self.rpm and len(self.window) >= self.rpm:
+                return "429", 0.05
+            self.window.append(now)
+            roll = self.rng.random()
+            latency = self.latency_median * self.rng.lognormvariate(0, self.latency_sigma) if self.latency_sigma else self.latency_median
+        for fate, rate in (("429", self.rate_429), ("error", self.error_rate), ("hang", self.hang_rate), ("bad_json", self.bad_json_rate)):
+            if roll < rate:
+                return fate, (HANG_SECONDS if fate == "hang" else min(latency, 0.2) if fate == "429" else latency)
+            roll -= rate
+        return "ok", latency
+
+    def begin(self):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def finish(self, code, seconds, prompt_tokens=0, output_tokens=0):
+        with self.lock:
+            self.in_flight -= 1
+            self.status[code] += 1
+            self.prompt_tokens += prompt_tokens
+            self.output_tokens += output_tokens
+            self.latencies.append(seconds)
+
+    def stats(self):
+        with self.lock:
+            lat = sorted(self.latencies)
+            status = dict(self.status)
+            elapsed = time.time() - self.started
+            pick = lambda q: round(lat[min(len(lat) - 1, int(q * len(lat)))], 3) if lat else 0.0
+            return {
+                "requests": len(lat),
+                "status": status,
+                "prompt_tokens": self.prompt_tokens,
+                "output_tokens": self.output_tokens,
+                "p50_seconds": pick(0.5),
+                "p95_seconds": pick(0.95),
+                "p99_seconds": pick(0.99),
+                "max_in_flight": self.max_in_flight,
+                "requests_per_second": round(len(lat) / elapsed, 2) if elapsed else 0.0,
+            }
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    state = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, code, body, content_type="application/json; charset=utf-8"):
+        data = body if isinstance(body, bytes) else (
+            json.dumps(body, ensure_ascii=False) if not isinstance(body, str) else body
+        ).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, code, status, message):
+        self._send(code, {"error": {"code": code, "message": message, "status": status}})
+
+    def do_GET(self):
+        if self.path == "/stats":
+            return self._send(200, self.state.stats())
+        site_dir = self.state.site_dir
+        if not site_dir:
+            return self._error(404, "NOT_FOUND", self.path)
+        host = self.headers.get("Host", f"127.0.0.1:{self.server.server_port}")
+        if self.path == "/robots.txt":
+            return self._send(200, f"User-agent: *\nAllow: /\nSitemap: http://{host}/sitemap.xml\n", "text/plain; charset=utf-8")
+        if self.path == "/sitemap.xml":
+            names = sorted(self.state.site_pages)
+            body = '<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+            body += "".join(f"<url><loc>{escape(f'http://{host}/products/{n}')}</loc></url>\n" for n in names)
+            return self._send(200, body + "</urlset>\n", "application/xml; charset=utf-8")
+        if self.path.startswith("/products/"):
+            path = self.state.site_pages.get(os.path.basename(self.path.split("?", 1)[0]))
+            if path:
+                with open(path, "rb") as f:
+                    return self._send(200, f.read(), "text/html; charset=utf-8")
+        return self._error(404, "NOT_FOUND", self.path)
+
+    def do_POST(self):
+        if not self.path.startswith("/v1beta/models/") or not self.path.endswith(":generateContent"):
+            return self._error(404, "NOT_FOUND", self.path)
+        start = time.perf_counter()
+        self.state.begin()
+        code, prompt_tokens, output_tokens = 500, 0, 0
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            prompt = "".join(
+                part.get("text", "") for content in body.get("contents", []) for part in content.get("parts", [])
+            )
+            prompt_tokens = estimate_tokens(prompt)
+            fate, latency = self.state.draw()
+            output = json.dumps(standin_extract(prompt), ensure_ascii=False) if fate in ("ok", "bad_json") else ""
+            output_tokens = estimate_tokens(output)
+            if fate == "ok" and self.state.output_tps:
+                latency += output_tokens / self.state.output_tps
+            time.sleep(latency)
+            if fate == "429":
+                code = 429
+                return self._error(429, "RESOURCE_EXHAUSTED", "Resource has been exhausted (e.g. check quota).")
+            if fate in ("error", "hang"):
+                code = 500 if fate == "error" else 504
+                return self._error(code, "INTERNAL", "An internal error has occurred.")
+            if fate == "bad_json":
+                # 截斷的 JSON：測試呼叫端的解析失敗處理
+                output = output[: len(output) // 2]
+            code = 200
+            self._send(200, {
+                "candidates": [{"content": {"parts": [{"text": output}], "role": "model"}, "finishReason": "STOP"}],
+                "usageMetadata": {
+                    "promptTokenCount": prompt_tokens,
+                    "candidatesTokenCount": output_tokens,
+                    "totalTokenCount": prompt_tokens + output_tokens,
+                },
+            })
+        except (BrokenPipeError, ConnectionResetError):
+            # 呼叫端逾時先斷線
+            code = 499
+        finally:
+            self.state.finish(code, time.perf_counter() - start, prompt_tokens, output_tokens if code == 200 else 0)
+
+
+# --site 離線跑 batch_scanner 時，所有會寫入的狀態都改指到站台目錄下的 state/，不碰 data/ 下的正式資料
+SITE_STATE_ENV = {
+    "D2C_TARGET_JSON": "target_product_urls.json",
+    "D2C_OUTPUT_CSV": "d2c_full_database.csv",
+    "D2C_ERROR_LOG": "batch_scanner_error.log",
+    "D2C_ISSUE_TRACKER_DIR": "issue_tracker",
+    "D2C_QUEUE_PATH": "scan_queue.sqlite3",
+    "D2C_RECRAWL_STATE": "recrawl_state.sqlite3",
+    "D2C_SEEN_PATH": "url_seen.npy",
+    "D2C_FINGERPRINT_PATH": "page_fingerprints.sqlite3",
+    "D2C_PAGE_ARCHIVE_DIR": "page_archive",
+    "VITAGUIDE_PRICE_HISTORY_DIR": "price_history",
+}
+
+
+def write_site_env(site_dir, host, port):
+    """
+    --site 時寫出只含本機站台的網域清單 (domains.csv) 與 site.env。
+    site.env 把 LLM 後端指向替身伺服器，並把 SITE_STATE_ENV 的每個狀態路徑改到 <site_dir>/state/；
+    以 `set -a; . <site_dir>/site.env; set +a` 載入後再執行 batch_scanner。
+    """
+    site_dir = os.path.abspath(site_dir)
+    state_dir = os.path.join(site_dir, "state")
+    os.makedirs(state_dir, exist_ok=True)
+    domains_path = os.path.join(site_dir, "domains.csv")
+    with open(domains_path, "w", encoding="utf-8-sig") as f:
+        f.write(f"brand,domain\n合成測試站,http://{host}:{port}/\n")
+
+    env = {
+        "D2C_LLM_BACKEND": "local",
+        "D2C_LOCAL_LLM_URL": f"http://{host}:{port}",
+        "D2C_DOMAINS_CSV": domains_path,
+    }
+    env.update({key: os.path.join(state_dir, name) for key, name in SITE_STATE_ENV.items()})
+    env_path = os.path.join(site_dir, "site.env")
+    with open(env_path, "w", encoding="utf-8") as f:
+        f.writelines(f"{key}={shlex.quote(value)}\n" for key, value in env.items())
+    return env_path
+
+
+def serve(host="127.0.0.1", port=DEFAULT_PORT, state=None):
+    handler = type("Handler", (StandinHandler,), {"state": state or StandinState()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    # 用法：
+    #   python -m data.llm_standin --latency-median 1.5 --rate-429 0.05 --rpm 600
+    #   D2C_LLM_BACKEND=local python data/batch_scanner.py                   # LLM 改打替身伺服器
+    # 完全離線 (商品頁也由替身提供，需先執行 benchmarks/catalog_gen.py)：
+    #   python -m data.llm_standin --site benchmarks/synthetic/10k/html
+    #   (set -a; . benchmarks/synthetic/10k/html/site.env; set +a; MAX_URLS_PER_BRAND=200 python data/batch_scanner.py)
+    # site.env 會把輸出 CSV、target json、價格歷史、重掃狀態、seen-set、指紋、頁面封存與佇列都指到 html/state/
+    cli = argparse.ArgumentParser(description="本機 Gemini 替身伺服器")
+    cli.add_argument("--host", default="127.0.0.1")
+    cli.add_argument("--port", type=int, default=DEFAULT_PORT)
+    cli.add_argument("--latency-median", type=float, default=DEFAULT_LATENCY_MEDIAN, help="延遲中位數 (秒)")
+    cli.add_argument("--latency-sigma", type=float, default=DEFAULT_LATENCY_SIGMA, help="對數常態 sigma (0 = 固定延遲)")
+    cli.add_argument("--output-tps", type=float, default=DEFAULT_OUTPUT_TPS, help="輸出 token/s (0 = 不另計生成時間)")
+    cli.add_argument("--error-rate", type=float, default=0.0, help="回傳 500 的比例")
+    cli.add_argument("--rate-429", type=float, default=0.0, help="隨機回傳 429 的比例")
+    cli.add_argument("--rpm", type=int, default=0, help="每分鐘請求配額，超過回傳 429 (0 = 不限)")
+    cli.add_argument("--hang-rate", type=float, default=0.0, help=f"卡住 {HANG_SECONDS}s 的比例 (測試 D2C_LLM_TIMEOUT)")
+    cli.add_argument("--bad-json-rate", type=float, default=0.0, help="回傳截斷 JSON 的比例")
+    cli.add_argument("--site", default=None, help="以此目錄的 *.html 提供本機商品站台")
+    cli.add_argument("--seed", type=int, default=None)
+    args = cli.parse_args()
+
+    state = StandinState(
+        args.latency_median, args.latency_sigma, args.output_tps, args.error_rate, args.rate_429,
+        args.hang_rate, args.bad_json_rate, args.rpm, args.site, args.seed,
+    )
+    server = serve(args.host, args.port, state)
+    print(f"🧪 [Standin] http://{args.host}:{args.port} (延遲中位數 {args.latency_median}s, sigma {args.latency_sigma}, "
+          f"500 {args.error_rate:.0%}, 429 {args.rate_429:.0%}, rpm {args.rpm or '不限'})")
+    if args.site:
+        print(f"🌐 [Standin] 商品站台：{args.site} → 環境設定 {write_site_env(args.site, args.host, args.port)} (狀態寫入 state/)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"📊 [Standin] {json.dumps(state.stats(), ensure_ascii=False)}")
@@ -0,0 +1,350 @@
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from data.product_record import normalize_frame, records_to_frame
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# ==========================================
+# 商品頁 HTML 封存 (內容定址) 與離線重新抽取
+# ==========================================
+ARCHIVE_DIR = os.environ.get("D2C_PAGE_ARCHIVE_DIR", "data/page_archive")
+# D2C_PAGE_ARCHIVE=0 時掃描器不封存頁面
+ARCHIVE_ENABLED = os.environ.get("D2C_PAGE_ARCHIVE", "1") != "0"
+ZSTD_LEVEL = 9
+# 重新抽取的預設輸出 (與 batch_scanner.OUTPUT_CSV 相同，依 url 取代舊列)
+REEXTRACT_OUTPUT = "data/d2c_full_database.csv"
+REEXTRACT_LLM_CONCURRENCY = 4
+
+# pyarrow 內建 zstd 時使用 .zst (標準 zstd frame，可用 zstd -d 解開)，否則退回 gzip
+if pa is not None and pa.Codec.is_available("zstd"):
+    _CODEC, _SUFFIX = "zstd", ".html.zst"
+else:
+    _CODEC, _SUFFIX = "gzip", ".html.gz"
+
+
+def _compress(raw):
+    if _CODEC == "zstd":
+        return pa.Codec("zstd", compression_level=ZSTD_LEVEL).compress(raw, asbytes=True)
+    return gzip.compress(raw, compresslevel=6)
+
+
+def _decompress(path, size):
+    with open(path, "rb") as f:
+        blob = f.read()
+    if path.endswith(".zst"):
+        return pa.Codec("zstd").decompress(blob, decompressed_size=size, asbytes=True)
+    return gzip.decompress(blob)
+
+
+class PageArchive:
+    """
+    掃描成功的商品頁 HTML 以 sha256 內容定址存放：objects/<前兩碼>/<sha256>.html.zst
+    (內容相同的頁面只存一份)，index.sqlite3 依 (url, 掃描時間) 記錄每次快照與掃描當下
+    無法從 HTML 重現的資料 (DOM 價格、圖片、LLM 結果)，供 reextract 離線重新組出商品資料。
+    """
+
+    def __init__(self, root=ARCHIVE_DIR):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        # 掃描器以 asyncio.to_thread 寫入，連線跨 thread 共用、以 lock 保護
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, "index.sqlite3"), timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS snapshots (
+                id INTEGER PRIMARY KEY,
+                url TEXT NOT NULL,
+                scanned_at REAL NOT NULL,
+                digest TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                http_status INTEGER,
+                meta TEXT
+            );
+            CREATE INDEX IF NOT EXISTS snapshots_url ON snapshots (url, scanned_at);
+            CREATE INDEX IF NOT EXISTS snapshots_digest ON snapshots (digest);
+        """)
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest + _SUFFIX)
+
+    def _find_object(self, digest):
+        # 封存時使用的壓縮格式可能與目前環境不同，兩種副檔名都找
+        for suffix in (".html.zst", ".html.gz"):
+            path = os.path.join(self.objects_dir, digest[:2], digest + suffix)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def put(self, url, html, http_status=0, meta=None, scanned_at=None):
+        """封存一次快照，回傳 digest。meta：dom_price / image_url / ai (LLM 結果，失敗為 None)。"""
+        raw = (html or "").encode("utf-8")
+        digest = hashlib.sha256(raw).hexdigest()
+        if self._find_object(digest) is None:
+            path = self.object_path(digest)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 先寫暫存檔再改名，避免中斷時留下不完整的物件
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(_compress(raw))
+            os.replace(tmp, path)
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO snapshots (url, scanned_at, digest, size, http_status, meta) VALUES (?, ?, ?, ?, ?, ?)",
+                (url, scanned_at or time.time(), digest, len(raw), http_status,
+                 json.dumps(meta or {}, ensure_ascii=False)),
+            )
+            self._db.commit()
+        return digest
+
+    def update_meta(self, url, digest, **fields):
+        """更新某個 url 最近一次 digest 相同的快照 meta (例如 LLM 重試成功後補上 ai)。"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, meta FROM snapshots WHERE url = ? AND digest = ? ORDER BY scanned_at DESC LIMIT 1",
+                (url, digest),
+            ).fetchone()
+            if row is None:
+                return False
+            meta = json.loads(row[1] or "{}")
+            meta.update(fields)
+            self._db.execute("UPDATE snapshots SET meta = ? WHERE id = ?", (json.dumps(meta, ensure_ascii=False), row[0]))
+            self._db.commit()
+        return True
+
+    def load(self, digest, size):
+        path = self._find_object(digest)
+        if path is None:
+            raise FileNotFoundError(f"封存物件不存在: {digest}")
+        return _decompress(path, size).decode("utf-8")
+
+    def history(self, url):
+        """某個 url 的所有快照 (由舊到新)。"""
+        rows = self._db.execute(
+            "SELECT scanned_at, digest, size, http_status, meta FROM snapshots WHERE url = ? ORDER BY scanned_at", (url,)
+        ).fetchall()
+        return [
+            {"url": url, "scanned_at": ts, "digest": digest, "size": size, "http_status": code, "meta": json.loads(meta or "{}")}
+            for ts, digest, size, code, meta in rows
+        ]
+
+    def latest(self, urls=None, since=None):
+        """每個 url 最新的一筆快照；urls 限定網址，since (epoch 秒) 只取該時間之後掃描的快照。"""
+        query = (
+            "SELECT s.url, s.scanned_at, s.digest, s.size, s.http_status, s.meta FROM snapshots s "
+            "JOIN (SELECT url, MAX(scanned_at) AS ts FROM snapshots GROUP BY url) m "
+            "ON s.url = m.url AND s.scanned_at = m.ts"
+        )
+        params = []
+        if since is not None:
+            query += " WHERE s.scanned_at >= ?"
+            params.append(since)
+        wanted = set(urls) if urls else None
+        out = []
+        for url, ts, digest, size, code, meta in self._db.execute(query + " ORDER BY s.url", params):
+            if wanted is not None and url not in wanted:
+                continue
+            out.append({"url": url, "scanned_at": ts, "digest": digest, "size": size, "http_status": code, "meta": json.loads(meta or "{}")})
+        return out
+
+    def stats(self):
+        snapshots, urls, raw = self._db.execute("SELECT COUNT(*), COUNT(DISTINCT url), SUM(size) FROM snapshots").fetchone()
+        objects, stored = 0, 0
+        for dirpath, _, files in os.walk(self.objects_dir):
+            for name in files:
+                if name.endswith((".zst", ".gz")):
+                    objects += 1
+                    stored += os.path.getsize(os.path.join(dirpath, name))
+        return {"snapshots": snapshots, "urls": urls, "objects": objects, "raw_bytes": raw or 0, "stored_bytes": stored}
+
+    def close(self):
+        self._db.close()
+
+
+# 掃描器共用的預設實例 (每個行程一個)
+_default_archive = None
+
+
+def get_page_archive():
+    global _default_archive
+    if _default_archive is None:
+        _default_archive = PageArchive()
+    return _default_archive
+
+
+def archive_page(url, html, http_status=0, meta=None):
+    """scan_url 呼叫 (在 thread 中執行)；封存失敗只警告，不影響掃描結果。"""
+    if not ARCHIVE_ENABLED:
+        return None
+    try:
+        return get_page_archive().put(url, html, http_status=http_status, meta=meta)
+    except Exception as e:
+        print(f"⚠️ [Archive] 頁面封存失敗 {url}: {e}")
+        return None
+
+
+def annotate_page(url, html, **fields):
+    """更新與 html 內容相同的最近一次快照 meta (LLM_FAILED 重試成功後補上 ai)。"""
+    if not ARCHIVE_ENABLED:
+        return False
+    try:
+        digest = hashlib.sha256((html or "").encode("utf-8")).hexdigest()
+        return get_page_archive().update_meta(url, digest, **fields)
+    except Exception as e:
+        print(f"⚠️ [Archive] 更新封存資料失敗 {url}: {e}")
+        return False
+
+
+def _reextract_one(task):
+    """process pool worker：讀取封存 HTML 並重跑 extract_page (不連網、不開瀏覽器)。"""
+    from data.agent_d2c_scanner import extract_page
+
+    path, size, url, want_text = task
+    try:
+        html = _decompress(path, size).decode("utf-8")
+        return url, extract_page(html, url, want_text), ""
+    except Exception as e:
+        return url, None, f"{type(e).__name__}: {e}"
+
+
+def _write_records(records, output):
+    """依 url 取代輸出檔中的舊列 (不寫入價格歷史：重新抽取不是新的價格觀測)。"""
+    df_new = records_to_frame(records)
+    if os.path.exists(output):
+        df_old = normalize_frame(pd.read_csv(output))
+        df_all = pd.concat([df_old, df_new], ignore_index=True).drop_duplicates(subset=["url"], keep="last")
+    else:
+        df_all = df_new
+    df_all.to_csv(output, index=False, encoding="utf-8-sig")
+    return len(df_all)
+
+
+async def _rerun_llm(items, parsed):
+    """--llm：以目前的 prompt 對封存頁面重跑 LLM (只呼叫 LLM API，不重新載入頁面)。"""
+    from data.agent_d2c_scanner import AgentD2CScanner
+
+    scanner = AgentD2CScanner()
+    if not scanner.llm_enabled:
+        print("⚠️ [Reextract] LLM 未啟用，沿用封存時的 LLM 結果")
+        return {}
+    semaphore = asyncio.Semaphore(REEXTRACT_LLM_CONCURRENCY)
+
+    async def _one(url):
+        async with semaphore:
+            return url, await scanner.analyze_with_llm("", url, text=parsed[url]["text"])
+
+    results = await asyncio.gather(*[_one(item["url"]) for item in items if parsed.get(item["url"])])
+    return {url: ai for url, ai in results if ai is not None}
+
+
+def reextract(urls=None, since=None, workers=None, output=REEXTRACT_OUTPUT, llm=False, root=ARCHIVE_DIR):
+    """
+    以封存的 HTML 重新抽取每個 url 最新快照的商品資料，依 url 更新 output。
+    - 規則 extractor (HTML 價格、標題、九五之丹欄位) 在 process pool 中重跑
+    - DOM 價格與圖片沿用掃描當下記錄的值 (需要即時頁面)
+    - LLM 欄位預設沿用封存的結果；llm=True 時以目前 prompt 重跑 (會呼叫 LLM API)
+    回傳統計 dict。
+    """
+    from data.agent_d2c_scanner import build_record
+
+    archive = PageArchive(root)
+    items = archive.latest(urls=urls, since=since)
+    if not items:
+        print("📭 [Reextract] 沒有符合條件的封存頁面")
+        archive.close()
+        return {"pages": 0, "updated": 0, "changed": 0, "errors": 0}
+
+    tasks = []
+    for item in items:
+        path = archive._find_object(item["digest"])
+        tasks.append((path or "", item["size"], item["url"], llm))
+    archive.close()
+
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    parsed, errors = {}, 0
+    print(f"♻️ [Reextract] 重新抽取 {len(tasks)} 個頁面 (workers={workers})")
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results = pool.map(_reextract_one, tasks, chunksize=max(1, min(64, len(tasks) // (workers * 4))))
+            for url, out, err in results:
+                parsed[url] = out
+                if err:
+                    errors += 1
+                    print(f"⚠️ [Reextract] {url}: {err}")
+    else:
+        for task in tasks:
+            url, out, err = _reextract_one(task)
+            parsed[url] = out
+            if err:
+                errors += 1
+                print(f"⚠️ [Reextract] {url}: {err}")
+    parse_seconds = time.perf_counter() - start
+
+    fresh_ai = asyncio.run(_rerun_llm(items, parsed)) if llm else {}
+
+    old = {}
+    if os.path.exists(output):
+        old_df = normalize_frame(pd.read_csv(output))
+        old = {row["url"]: row for row in old_df.to_dict("records")}
+
+    records, changed = [], 0
+    for item in items:
+        url, meta = item["url"], item["meta"]
+        if parsed.get(url) is None:
+            continue
+        ai_data = fresh_ai.get(url, meta.get("ai"))
+        data = build_record(url, ai_data, parsed[url], meta.get("dom_price", 0), meta.get("image_url", ""))
+        previous = old.get(url)
+        if previous is None or (previous["price"], previous["title"]) != (data["price"], data["title"]):
+            changed += 1
+        records.append(data)
+
+    total = _write_records(records, output) if records else 0
+    stats = {
+        "pages": len(items),
+        "updated": len(records),
+        "changed": changed,
+        "errors": errors,
+        "parse_seconds": round(parse_seconds, 1),
+    }
+    print(f"✅ [Reextract] 更新 {len(records)} 筆 (價格或標題變動 {changed}，失敗 {errors})，解析 {parse_seconds:.1f}s → {output} (共 {total} 筆)")
+    return stats
+
+
+if __name__ == "__main__":
+    # 用法：
+    #   python -m data.page_archive stats
+    #   python -m data.page_archive reextract [--since 2026-10-01] [--url URL ...] [--workers 8] [--llm]
+    cli = argparse.ArgumentParser(description="商品頁 HTML 封存 / 離線重新抽取")
+    cli.add_argument("command", choices=["stats", "reextract"])
+    cli.add_argument("--url", action="append", default=None, help="只處理指定網址 (可重複)")
+    cli.add_argument("--since", default=None, help="只處理此日期之後掃描的快照 (YYYY-MM-DD)")
+    cli.add_argument("--workers", type=int, default=None, help="解析行程數 (預設 CPU 核心數)")
+    cli.add_argument("--output", default=REEXTRACT_OUTPUT, help=f"輸出 CSV (預設 {REEXTRACT_OUTPUT})")
+    cli.add_argument("--llm", action="store_true", help="以目前的 prompt 重跑 LLM (會呼叫 LLM API)")
+    args = cli.parse_args()
+
+    if args.command == "stats":
+        info = PageArchive().stats()
+        ratio = info["raw_bytes"] / info["stored_bytes"] if info["stored_bytes"] else 0
+        print(f"🗄️ [Archive] {info['urls']} 個網址 / {info['snapshots']} 次快照 / {info['objects']} 個物件，"
+              f"原始 {info['raw_bytes'] / 1e6:.1f} MB → 壓縮後 {info['stored_bytes'] / 1e6:.1f} MB ({ratio:.1f}x)")
+    else:
+        since = pd.Timestamp(args.since).timestamp() if args.since else None
+        reextract(urls=args.url, since=since, workers=args.workers, output=args.output, llm=args.llm)
@@ -0,0 +1,193 @@
+import hashlib
+import html as html_lib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import requests
+
+# ==========================================
+# 商品頁指紋：ETag / Last-Modified / 商品文字 simhash，判斷頁面是否需要重新渲染
+# ==========================================
+FINGERPRINT_PATH = os.environ.get("D2C_FINGERPRINT_PATH", "data/page_fingerprints.sqlite3")
+# D2C_CONDITIONAL_FETCH=0 時一律完整渲染
+CONDITIONAL_FETCH = os.environ.get("D2C_CONDITIONAL_FETCH", "1") != "0"
+# 距上次完整渲染超過此天數時不論指紋一律重新渲染 (價格可能由 JS 載入，不在原始 HTML 中)
+FULL_SCAN_MAX_AGE_DAYS = float(os.environ.get("D2C_FULL_SCAN_MAX_AGE_DAYS", "7"))
+# 兩次 simhash 的漢明距離 <= 此值視為內容相同 (容許推薦商品、計數器等小幅變動)
+SIMHASH_THRESHOLD = 3
+PROBE_TIMEOUT = 10
+SHINGLE_SIZE = 3
+
+_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+# 與商品內容無關、每次請求都可能不同的區塊 (JSON-LD 保留：含價格與庫存)
+_NOISE_RE = re.compile(
+    r"<script(?![^>]*application/ld\+json)[^>]*>.*?</script>|<style[^>]*>.*?</style>|<noscript[^>]*>.*?</noscript>"
+    r"|<svg[^>]*>.*?</svg>|<(header|nav|footer)[^>]*>.*?</\1>|<!--.*?-->",
+    re.IGNORECASE | re.DOTALL,
+)
+_TAG_RE = re.compile(r"<[^>]+>")
+# 英數字詞或單一 CJK 字元
+_TOKEN_RE = re.compile(r"[A-Za-z0-9$.,]+|[㐀-鿿]")
+
+
+def compact_text(html):
+    """原始 HTML → 商品文字 (移除 script / style / 導覽列 / 頁尾 / 註解後的純文字)。"""
+    text = _TAG_RE.sub(" ", _NOISE_RE.sub(" ", html or ""))
+    return " ".join(html_lib.unescape(text).split())
+
+
+def simhash(text, bits=64):
+    """以 SHINGLE_SIZE 個 token 為一組特徵的 simhash；相似文字的 hash 只差少數位元。"""
+    tokens = _TOKEN_RE.findall(text.lower())
+    if not tokens:
+        return 0
+    weights = [0] * bits
+    for i in range(max(1, len(tokens) - SHINGLE_SIZE + 1)):
+        feature = " ".join(tokens[i:i + SHINGLE_SIZE]).encode("utf-8")
+        h = int.from_bytes(hashlib.blake2b(feature, digest_size=bits // 8).digest(), "big")
+        for b in range(bits):
+            weights[b] += 1 if h >> b & 1 else -1
+    return sum(1 << b for b in range(bits) if weights[b] > 0)
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def fingerprint_html(html):
+    """原始 HTML 的指紋：商品文字 simhash + HTML 價格 (在 CPU offload pool 中執行)。"""
+    from data.agent_d2c_scanner import AgentD2CScanner
+
+    return {
+        "simhash": simhash(compact_text(html)),
+        "price": AgentD2CScanner._extract_price_from_html_content(html),
+    }
+
+
+class FingerprintStore:
+    """
+    每個 URL 最後一次完整渲染時的指紋：
+    - etag / last_modified：下次帶 If-None-Match / If-Modified-Since，304 即未變動
+    - simhash / price：由不渲染的 HTTP 回應 (tier-1) 計算，與下次 tier-1 回應比較
+    - full_scanned_at：最後一次完整渲染；verified_at：最後一次確認未變動
+    """
+
+    def __init__(self, path=FINGERPRINT_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                simhash TEXT,
+                price INTEGER,
+                full_scanned_at REAL,
+                verified_at REAL,
+                unchanged_streak INTEGER NOT NULL DEFAULT 0
+            );
+        """)
+        self.session = requests.Session()
+        self.session.headers.update({"User-Agent": _USER_AGENT})
+
+    def get(self, url):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, last_modified, simhash, price, full_scanned_at, verified_at, unchanged_streak "
+                "FROM fingerprints WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, sh, price, full_scanned_at, verified_at, streak = row
+        return {
+            "etag": etag or "",
+            "last_modified": last_modified or "",
+            # SQLite INTEGER 為有號 64 位元，simhash 以 16 進位字串存放
+            "simhash": int(sh, 16) if sh else None,
+            "price": price or 0,
+            "full_scanned_at": full_scanned_at,
+            "verified_at": verified_at,
+            "unchanged_streak": streak,
+        }
+
+    def save(self, url, probe, now=None):
+        """完整渲染成功後以同一輪 tier-1 回應更新指紋 (比較基準只在完整渲染時更新，避免逐步漂移)。"""
+        now = now or time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO fingerprints (url, etag, last_modified, simhash, price, full_scanned_at, verified_at, unchanged_streak) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 0) ON CONFLICT(url) DO UPDATE SET etag = excluded.etag, "
+                "last_modified = excluded.last_modified, simhash = excluded.simhash, price = excluded.price, "
+                "full_scanned_at = excluded.full_scanned_at, verified_at = excluded.verified_at, unchanged_streak = 0",
+                (url, probe.get("etag", ""), probe.get("last_modified", ""), format(probe["simhash"], "x"),
+                 probe.get("price", 0), now, now),
+            )
+            self._db.commit()
+
+    def mark_unchanged(self, url, probe, now=None):
+        """確認未變動：只更新驗證時間 (伺服器給了新的 ETag 時一併記錄)。"""
+        now = now or time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE fingerprints SET verified_at = ?, unchanged_streak = unchanged_streak + 1, "
+                "etag = COALESCE(NULLIF(?, ''), etag), last_modified = COALESCE(NULLIF(?, ''), last_modified) WHERE url = ?",
+                (now, probe.get("etag", ""), probe.get("last_modified", ""), url),
+            )
+            self._db.commit()
+
+    def probe(self, url, stored=None):
+        """
+        不渲染的條件式 GET (同步，於 thread 中執行)。
+        回傳 {"status_code", "etag", "last_modified", "html"}；連線失敗時 status_code 為 0。
+        """
+        headers = {}
+        if stored and stored.get("etag"):
+            headers["If-None-Match"] = stored["etag"]
+        if stored and stored.get("last_modified"):
+            headers["If-Modified-Since"] = stored["last_modified"]
+        try:
+            res = self.session.get(url, headers=headers, timeout=PROBE_TIMEOUT)
+        except requests.RequestException as e:
+            return {"status_code": 0, "etag": "", "last_modified": "", "html": "", "error": str(e)[:200]}
+        return {
+            "status_code": res.status_code,
+            "etag": res.headers.get("ETag", ""),
+            "last_modified": res.headers.get("Last-Modified", ""),
+            "html": res.text if res.status_code == 200 else "",
+        }
+
+    def close(self):
+        self.session.close()
+        self._db.close()
+
+
+def compare(stored, probe, now=None):
+    """
+    tier-1 回應與既有指紋比較，回傳 (是否未變動, 原因)。
+    probe 需已含 fingerprint_html 的 simhash / price (status 200 時)。
+    """
+    now = now or time.time()
+    if not stored or stored.get("simhash") is None:
+        return False, "no fingerprint"
+    if now - (stored.get("full_scanned_at") or 0) > FULL_SCAN_MAX_AGE_DAYS * 86400:
+        return False, "max age"
+    code = probe.get("status_code", 0)
+    if code == 304:
+        return True, "304 not modified"
+    if code != 200:
+        return False, f"probe http {code}" if code else "probe error"
+    if stored.get("etag") and probe.get("etag") == stored["etag"]:
+        return True, "etag match"
+    # 價格不同一律視為變動，不論文字相似度
+    if probe.get("price") and stored.get("price") and probe["price"] != stored["price"]:
+        return False, "price changed"
+    distance = hamming(probe["simhash"], stored["simhash"])
+    if distance <= SIMHASH_THRESHOLD:
+        return True, f"simhash d={distance}"
+    return False, f"simhash d={distance}"
@@ -0,0 +1,362 @@
+import glob
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+from data.product_record import normalize_frame
+from data.url_canon import canonicalize
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pc = ds = pq = None
+
+# ==========================================
+# 價格歷史 (append-only 觀測紀錄)
+# ==========================================
+# 目錄結構：data/price_history/month=2026-10/part-20261019T065301-1234-ab12cd.parquet
+# 每次爬蟲存檔追加一個小檔，同月份小檔超過 COMPACT_AFTER_PARTS 個時合併並依 (url, observed_at) 排序，
+# 同時寫出該月的彙總檔 summary.parquet (每個 url+source 一列)。
+HISTORY_DIR = os.environ.get("VITAGUIDE_PRICE_HISTORY_DIR", "data/price_history")
+COMPACT_AFTER_PARTS = int(os.environ.get("VITAGUIDE_PRICE_COMPACT_PARTS", "24"))
+ROW_GROUP_ROWS = 256 * 1024
+# 合併鎖超過此秒數視為殘留 (合併中的行程被中止)，移除後重新取得
+COMPACT_LOCK_STALE_SECONDS = float(os.environ.get("VITAGUIDE_PRICE_COMPACT_LOCK_STALE", "600"))
+
+_warned_missing = False
+
+
+def canonical_url(url):
+    """網址正規化 (見 data/url_canon.canonicalize)：同一商品的追蹤參數 / www / http 變體落在同一個 url。"""
+    return canonicalize(url)
+
+
+def _schema():
+    return pa.schema([
+        ("url", pa.string()),
+        ("source", pa.string()),
+        ("observed_at", pa.timestamp("s", tz="UTC")),
+        ("price", pa.int64()),
+        ("unit_price", pa.float64()),
+    ])
+
+
+def _month_dir(root, month):
+    return os.path.join(root, f"month={month}")
+
+
+def _observation_frame(rows, source=None, observed_at=None):
+    df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(list(rows or []))
+    if df.empty or "url" not in df.columns or "price" not in df.columns:
+        return pd.DataFrame()
+    observed_at = observed_at or datetime.now(timezone.utc)
+    # 價格 / 單價與各存檔路徑同樣以 normalize_frame 轉型 ("NT$1,280" 等字串也能解析)
+    df = normalize_frame(df)
+    out = pd.DataFrame({
+        "url": df["url"].astype(object).map(canonical_url),
+        "source": source if source else df["source"].astype(object),
+        "observed_at": _to_utc(observed_at),
+        "price": df["price"],
+        "unit_price": df["unit_price"],
+    })
+    # 沒有網址或價格的列不是有效觀測
+    out = out[(out["url"] != "") & (out["price"] > 0)]
+    return out.drop_duplicates(["url", "source"], keep="last")
+
+
+def record_observations(rows, source=None, observed_at=None, root=HISTORY_DIR):
+    """
+    追加一批價格觀測 (DataFrame 或 dict 清單，需有 url / price，可選 source / unit_price)。
+    供各爬蟲存檔時呼叫；未安裝 pyarrow 或寫入失敗只印警告，不影響爬蟲本身。回傳寫入筆數。
+    """
+    global _warned_missing
+    if pq is None:
+        if not _warned_missing:
+            print("⚠️ [PriceHistory] 未安裝 pyarrow，略過價格歷史紀錄 (pip install pyarrow)")
+            _warned_missing = True
+        return 0
+    try:
+        df = _observation_frame(rows, source, observed_at)
+        if df.empty:
+            return 0
+        written = 0
+        for month, part in df.groupby(df["observed_at"].dt.strftime("%Y-%m")):
+            month_dir = _month_dir(root, month)
+            os.makedirs(month_dir, exist_ok=True)
+            name = f"part-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{os.getpid()}-{uuid.uuid4().hex[:6]}.parquet"
+            table = pa.Table.from_pandas(part, schema=_schema(), preserve_index=False)
+            tmp_path = os.path.join(month_dir, "." + name)
+            pq.write_table(table, tmp_path, compression="zstd")
+            os.replace(tmp_path, os.path.join(month_dir, name))
+            written += len(part)
+            if len(_data_files(month_dir)) > COMPACT_AFTER_PARTS:
+                compact_month(month, root)
+        return written
+    except Exception as e:
+        print(f"⚠️ [PriceHistory] 價格歷史寫入失敗: {e}")
+        return 0
+
+
+SUMMARY_FILE = "summary.parquet"
+SUMMARY_KEYS = ["url", "source"]
+SUMMARY_COLUMNS = SUMMARY_KEYS + ["min_price", "max_price", "observations", "last_price", "last_unit_price", "last_seen"]
+
+
+def _summary_schema(covers=""):
+    return pa.schema([
+        ("url", pa.string()),
+        ("source", pa.string()),
+        ("min_price", pa.int64()),
+        ("max_price", pa.int64()),
+        ("observations", pa.int64()),
+        ("last_price", pa.int64()),
+        ("last_unit_price", pa.float64()),
+        ("last_seen", pa.timestamp("s", tz="UTC")),
+    ], metadata={b"covers": covers.encode()})
+
+
+def _last_rows(table, time_column):
+    """每個 (url, source) 取 time_column 最大的列 (同一時間重複觀測時可能多於一列，由呼叫端去重)。"""
+    latest = table.group_by(SUMMARY_KEYS).aggregate([(time_column, "max")]).rename_columns(SUMMARY_KEYS + [time_column])
+    return table.join(latest, keys=SUMMARY_KEYS + [time_column], join_type="inner")
+
+
+def _summarize(table):
+    """原始觀測 → 每個 (url, source) 一列的彙總 (最低 / 最高 / 次數 / 最新價格)。"""
+    if table.num_rows == 0:
+        return _summary_schema().empty_table()
+    stats = table.group_by(SUMMARY_KEYS).aggregate([("price", "min"), ("price", "max"), ("price", "count")])
+    stats = stats.rename_columns(SUMMARY_KEYS + ["min_price", "max_price", "observations"])
+    last = _last_rows(table, "observed_at").select(SUMMARY_KEYS + ["price", "unit_price", "observed_at"])
+    last = last.rename_columns(SUMMARY_KEYS + ["last_price", "last_unit_price", "last_seen"])
+    return stats.join(last, keys=SUMMARY_KEYS, join_type="inner").select(SUMMARY_COLUMNS).cast(_summary_schema())
+
+
+def _combine(summaries):
+    """合併多個月份 / 區段的彙總 (min 取最小、max 取最大、次數相加、最新價格取 last_seen 最大者)。"""
+    summaries = [t for t in summaries if t.num_rows]
+    if not summaries:
+        return pd.DataFrame(columns=SUMMARY_COLUMNS)
+    if len(summaries) == 1:
+        table = summaries[0]
+    else:
+        merged = pa.concat_tables([t.replace_schema_metadata(None) for t in summaries])
+        stats = merged.group_by(SUMMARY_KEYS).aggregate([
+            ("min_price", "min"), ("max_price", "max"), ("observations", "sum"),
+        ]).rename_columns(SUMMARY_KEYS + ["min_price", "max_price", "observations"])
+        last = _last_rows(merged, "last_seen").select(SUMMARY_KEYS + ["last_price", "last_unit_price", "last_seen"])
+        table = stats.join(last, keys=SUMMARY_KEYS, join_type="inner").select(SUMMARY_COLUMNS)
+    df = table.to_pandas().drop_duplicates(SUMMARY_KEYS, keep="last")
+    return df.sort_values(SUMMARY_KEYS).reset_index(drop=True)
+
+
+def compact_month(month, root=HISTORY_DIR):
+    """
+    合併某月份的所有小檔為一個依 (url, source, observed_at) 排序的檔案，並寫出該月的彙總檔 (summary.parquet)。
+    排序後 row group 統計可讓 url 篩選跳過大部分資料；彙總檔讓整月查詢不必讀原始觀測。
+    以鎖檔避免多個爬蟲同時合併；拿不到鎖就略過，下次再合併。
+    鎖檔超過 COMPACT_LOCK_STALE_SECONDS 未更新視為殘留 (合併中的行程被中止)，移除後重新取得。
+    """
+    month_dir = _month_dir(root, month)
+    lock_fd = _acquire_compact_lock(month_dir, month)
+    if lock_fd is None:
+        return False
+    lock_path = os.path.join(month_dir, ".compact.lock")
+    try:
+        files = _data_files(month_dir)
+        if not files:
+            return False
+        table = pa.concat_tables([pq.read_table(f, schema=_schema()) for f in files])
+        table = table.sort_by([("url", "ascending"), ("source", "ascending"), ("observed_at", "ascending")])
+        name = f"compacted-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:6]}.parquet"
+        tmp_path = os.path.join(month_dir, "." + name)
+        pq.write_table(table, tmp_path, compression="zstd", row_group_size=ROW_GROUP_ROWS)
+        os.replace(tmp_path, os.path.join(month_dir, name))
+        for f in files:
+            os.remove(f)
+
+        summary = _summarize(table).replace_schema_metadata({b"covers": name.encode()})
+        tmp_path = os.path.join(month_dir, "." + SUMMARY_FILE)
+        pq.write_table(summary, tmp_path, compression="zstd")
+        os.replace(tmp_path, os.path.join(month_dir, SUMMARY_FILE))
+        return True
+    finally:
+        os.close(lock_fd)
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
+
+
+def _acquire_compact_lock(month_dir, month):
+    """取得合併鎖 (O_EXCL 建立鎖檔並寫入 pid)，回傳檔案描述子；被其他行程持有時回傳 None。"""
+    lock_path = os.path.join(month_dir, ".compact.lock")
+    for _ in range(2):
+        try:
+            lock_fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                age = time.time() - os.path.getmtime(lock_path)
+            except OSError:
+                # 持有者剛好釋放，再試一次
+                continue
+            if age <= COMPACT_LOCK_STALE_SECONDS:
+                print(f"ℹ️ [PriceHistory] {month} 正由其他行程合併 (鎖檔 {age:.0f}s)，略過本次合併")
+                return None
+            print(f"⚠️ [PriceHistory] {month} 的合併鎖已 {age:.0f}s 未更新，視為殘留並移除: {lock_path}")
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+            continue
+        os.write(lock_fd, f"{os.getpid()}\n".encode())
+        return lock_fd
+    print(f"⚠️ [PriceHistory] 無法取得 {month} 的合併鎖，略過本次合併")
+    return None
+
+
+def _data_files(month_dir):
+    return sorted(f for f in glob.glob(os.path.join(month_dir, "*.parquet")) if os.path.basename(f) != SUMMARY_FILE)
+
+
+def _to_utc(value):
+    if value is None:
+        return None
+    ts = pd.Timestamp(value)
+    ts = ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+    # 儲存精度為秒
+    return ts.floor("s")
+
+
+def _month_bounds(month):
+    first = pd.Timestamp(f"{month}-01", tz="UTC")
+    return first, first + pd.offsets.MonthBegin(1) - pd.Timedelta(seconds=1)
+
+
+class PriceHistory:
+    """
+    價格歷史查詢 API (讀取 record_observations 寫入的 Parquet)。
+    - latest：每個 (url, source) 的最新價格
+    - window_stats：時間區間內的最低 / 最高 / 最新價格與觀測次數
+    - changes：時間區間內的價格變動事件 (與同一 url+source 的前一次觀測相比)
+    整月落在查詢區間內、且已合併的月份直接讀彙總檔 (每個商品一列)，其餘月份才讀原始觀測，
+    一年份 5 萬個商品的全目錄統計不必掃過上千萬列。
+    時間參數接受 datetime / 字串 / pd.Timestamp，未帶時區視為 UTC。
+    """
+
+    def __init__(self, root=HISTORY_DIR):
+        if pq is None:
+            raise ImportError("PriceHistory 需要 pyarrow：pip install pyarrow")
+        self.root = root
+
+    def months(self):
+        dirs = glob.glob(os.path.join(self.root, "month=*"))
+        return sorted(os.path.basename(d).split("=", 1)[1] for d in dirs)
+
+    def _months_between(self, start, end):
+        return [
+            m for m in self.months()
+            if (start is None or m >= start.strftime("%Y-%m")) and (end is None or m <= end.strftime("%Y-%m"))
+        ]
+
+    @staticmethod
+    def _filter(start=None, end=None, urls=None, sources=None):
+        conditions = []
+        if start is not None:
+            conditions.append(pc.field("observed_at") >= pa.scalar(start.to_pydatetime(), type=pa.timestamp("s", tz="UTC")))
+        if end is not None:
+            conditions.append(pc.field("observed_at") <= pa.scalar(end.to_pydatetime(), type=pa.timestamp("s", tz="UTC")))
+        if urls is not None:
+            conditions.append(pc.field("url").isin([canonical_url(u) for u in urls]))
+        if sources is not None:
+            conditions.append(pc.field("source").isin(list(sources)))
+        expr = None
+        for condition in conditions:
+            expr = condition if expr is None else expr & condition
+        return expr
+
+    def scan(self, start=None, end=None, urls=None, sources=None, months=None):
+        """讀取區間內的原始觀測 (只開啟涵蓋該區間的月份目錄)，回傳 pyarrow.Table。"""
+        start, end = _to_utc(start), _to_utc(end)
+        selected = months if months is not None else self._months_between(start, end)
+        files = [f for m in selected for f in _data_files(_month_dir(self.root, m))]
+        if not files:
+            return _schema().empty_table()
+        return ds.dataset(files, schema=_schema(), format="parquet").to_table(filter=self._filter(start, end, urls, sources))
+
+    def _month_summary(self, month, start, end, urls, sources):
+        """整月在區間內且彙總檔仍涵蓋該月全部資料時讀彙總檔，否則由原始觀測即時彙總。"""
+        month_dir = _month_dir(self.root, month)
+        first, last = _month_bounds(month)
+        summary_path = os.path.join(month_dir, SUMMARY_FILE)
+        covered = (start is None or start <= first) and (end is None or end >= last)
+        if covered and os.path.exists(summary_path):
+            covers = (pq.read_schema(summary_path).metadata or {}).get(b"covers", b"").decode()
+            if [os.path.basename(f) for f in _data_files(month_dir)] == [covers]:
+                expr = None
+                if urls is not None:
+                    expr = pc.field("url").isin([canonical_url(u) for u in urls])
+                if sources is not None:
+                    condition = pc.field("source").isin(list(sources))
+                    expr = condition if expr is None else expr & condition
+                # Parquet 沒有秒精度，讀回的 last_seen 為 ms，需轉回與即時彙總相同的 schema 才能合併
+                return ds.dataset(summary_path, format="parquet").to_table(filter=expr).cast(_summary_schema())
+        return _summarize(self.scan(start, end, urls, sources, months=[month]))
+
+    def window_stats(self, start=None, end=None, urls=None, sources=None):
+        """區間統計 DataFrame：url, source, min_price, max_price, observations, last_price, last_unit_price, last_seen。"""
+        start, end = _to_utc(start), _to_utc(end)
+        return _combine([self._month_summary(m, start, end, urls, sources) for m in self._months_between(start, end)])
+
+    def latest(self, urls=None, sources=None):
+        """最新價格 DataFrame：url, source, observed_at, price, unit_price。"""
+        stats = self.window_stats(urls=urls, sources=sources)
+        out = stats.rename(columns={"last_seen": "observed_at", "last_price": "price", "last_unit_price": "unit_price"})
+        return out[["url", "source", "observed_at", "price", "unit_price"]]
+
+    def changes(self, start=None, end=None, urls=None, sources=None, min_pct=0.0):
+        """
+        價格變動事件 DataFrame：url, source, observed_at, old_price, new_price, change_pct。
+        min_pct 為最小變動幅度 (%)，例如 5 表示只回報漲跌超過 5% 的事件。
+        區間內第一筆觀測與 start 之前的最後一筆觀測比較，跨過 start 的變動同樣會回報。
+        """
+        start, end = _to_utc(start), _to_utc(end)
+        df = self.scan(start, end, urls=urls, sources=sources).to_pandas()
+        columns = ["url", "source", "observed_at", "old_price", "new_price", "change_pct"]
+        if df.empty:
+            return pd.DataFrame(columns=columns)
+        if start is not None:
+            # 以各 (url, source) 在 start 之前的最新觀測作為起點 (已合併的整月直接讀彙總檔)
+            before = self.window_stats(end=start - pd.Timedelta(seconds=1), urls=urls, sources=sources)
+            if not before.empty:
+                seeds = before.rename(columns={"last_seen": "observed_at", "last_price": "price", "last_unit_price": "unit_price"})
+                seeds = seeds.merge(df[SUMMARY_KEYS].drop_duplicates(), on=SUMMARY_KEYS)[list(df.columns)]
+                df = pd.concat([seeds.astype(df.dtypes.to_dict()), df], ignore_index=True)
+        df = df.sort_values(["url", "source", "observed_at"], kind="stable")
+        same_item = (df["url"].eq(df["url"].shift())) & (df["source"].eq(df["source"].shift()))
+        old_price = df["price"].shift()
+        changed = same_item & df["price"].ne(old_price)
+        events = df[changed].assign(old_price=old_price[changed].astype("int64"))
+        events = events.rename(columns={"price": "new_price"})
+        events["change_pct"] = ((events["new_price"] - events["old_price"]) / events["old_price"] * 100).round(2)
+        if min_pct:
+            events = events[events["change_pct"].abs() >= min_pct]
+        return events[columns].reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    # 用法：python -m data.price_history [天數，預設 30]  → 列出近期價格變動
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    history = PriceHistory()
+    t0 = time.perf_counter()
+    events = history.changes(start=datetime.now(timezone.utc) - timedelta(days=days))
+    print(f"📈 [PriceHistory] 近 {days} 天價格變動 {len(events)} 筆 (查詢 {time.perf_counter() - t0:.2f} 秒)")
+    if not events.empty:
+        print(events.tail(30).to_string(index=False))
@@ -0,0 +1,194 @@
+import math
+import re
+from dataclasses import dataclass
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# README 定義的 Unified Schema (欄位順序即 CSV 欄位順序)
+UNIFIED_SCHEMA = (
+    "source", "brand", "title", "price", "unit_price",
+    "total_count", "url", "image_url", "product_highlights",
+)
+
+# pandas dtype：價格為整數 (NT$)、單價為浮點數、總顆數可缺值 (Int64 → CSV 輸出為空白)
+SCHEMA_DTYPES = {
+    "source": "string",
+    "brand": "string",
+    "title": "string",
+    "price": "int64",
+    "unit_price": "float64",
+    "total_count": "Int64",
+    "url": "string",
+    "image_url": "string",
+    "product_highlights": "string",
+}
+
+_NUMBER_RE = re.compile(r"-?\d[\d,]*(?:\.\d+)?")
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value)) or value is pd.NA
+
+
+def _to_str(value):
+    if _is_missing(value):
+        return ""
+    return value.strip() if isinstance(value, str) else str(value)
+
+
+def _to_float(value):
+    """數字、"NT$1,280"、"1280.00" 皆可；無法解析時為 0。"""
+    if _is_missing(value) or isinstance(value, bool):
+        return 0.0
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _NUMBER_RE.search(str(value))
+    return float(match.group().replace(",", "")) if match else 0.0
+
+
+def _to_int(value):
+    return int(round(_to_float(value)))
+
+
+def _to_count(value):
+    """總顆數：無法解析或 <= 0 時為 None (未知)，與 0 顆區分。"""
+    count = _to_int(value)
+    return count if count > 0 else None
+
+
+@dataclass(slots=True)
+class ProductRecord:
+    """
+    Unified Schema 單筆商品 (slots：每筆不帶 __dict__，大批量時記憶體較省)。
+    建立時即完成型別轉換，之後存檔不必再逐欄補值 / to_numeric。
+    """
+
+    source: str = ""
+    brand: str = ""
+    title: str = ""
+    price: int = 0
+    unit_price: float = 0.0
+    total_count: int = None
+    url: str = ""
+    image_url: str = ""
+    product_highlights: str = ""
+
+    def __post_init__(self):
+        self.source = _to_str(self.source)
+        self.brand = _to_str(self.brand)
+        self.title = _to_str(self.title)
+        self.price = _to_int(self.price)
+        self.unit_price = round(_to_float(self.unit_price), 2)
+        self.total_count = _to_count(self.total_count)
+        self.url = _to_str(self.url)
+        self.image_url = _to_str(self.image_url)
+        self.product_highlights = _to_str(self.product_highlights)
+
+    @classmethod
+    def from_dict(cls, row):
+        """
+        由爬蟲產出的 dict 建立；多餘欄位忽略。
+        舊欄位 tags 併入 product_highlights (僅在亮點為空時)。
+        """
+        row = row or {}
+        record = cls(**{name: row.get(name) for name in UNIFIED_SCHEMA})
+        if not record.product_highlights and row.get("tags"):
+            record.product_highlights = _to_str(row.get("tags"))
+        return record
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in UNIFIED_SCHEMA}
+
+
+def to_records(rows):
+    """dict / ProductRecord 混合清單 → ProductRecord 清單 (略過 None)。"""
+    return [r if isinstance(r, ProductRecord) else ProductRecord.from_dict(r) for r in rows or [] if r is not None]
+
+
+def _columns(records):
+    return {name: [getattr(r, name) for r in records] for name in UNIFIED_SCHEMA}
+
+
+def records_to_frame(rows):
+    """
+    一次把整批商品轉為欄位導向的 DataFrame (欄位順序與 dtype 固定)。
+    取代各處存檔前的 reindex / 補欄位 / to_numeric().fillna(0)。
+    """
+    columns = _columns(to_records(rows))
+    return pd.DataFrame({
+        name: pd.array(values, dtype=SCHEMA_DTYPES[name])
+        for name, values in columns.items()
+    })
+
+
+def records_to_arrow(rows):
+    """同 records_to_frame，但輸出 pyarrow.Table (供 Parquet 寫入)；未安裝 pyarrow 時拋出 ImportError。"""
+    if pa is None:
+        raise ImportError("records_to_arrow 需要 pyarrow：pip install pyarrow")
+    columns = _columns(to_records(rows))
+    schema = pa.schema([
+        ("source", pa.string()), ("brand", pa.string()), ("title", pa.string()),
+        ("price", pa.int64()), ("unit_price", pa.float64()), ("total_count", pa.int64()),
+        ("url", pa.string()), ("image_url", pa.string()), ("product_highlights", pa.string()),
+    ])
+    return pa.table(columns, schema=schema)
+
+
+def normalize_frame(df, keep_extra=False):
+    """
+    既有 CSV 讀回的 DataFrame → Unified Schema (向量化轉型，供與新資料合併)。
+    缺欄補預設值、多餘欄位移除；tags 欄位併入空白的 product_highlights。
+    keep_extra=True 時保留 Schema 以外的欄位 (接在 Schema 欄位之後，供前台保留 category 等欄位)。
+    """
+    df = df.copy()
+    if "tags" in df.columns:
+        highlights = df["product_highlights"] if "product_highlights" in df.columns else pd.Series("", index=df.index)
+        df["product_highlights"] = highlights.where(highlights.notna() & (highlights.astype(str) != ""), df["tags"])
+
+    out = {}
+    for name in UNIFIED_SCHEMA:
+        col = df[name] if name in df.columns else pd.Series([None] * len(df), index=df.index)
+        dtype = SCHEMA_DTYPES[name]
+        if dtype == "string":
+            out[name] = col.fillna("").astype(str).str.strip().astype("string")
+        else:
+            numeric = pd.to_numeric(col.astype(str).str.replace(r"[^\d.\-]", "", regex=True), errors="coerce")
+            if name == "total_count":
+                out[name] = numeric.where(numeric > 0).round().astype("Int64")
+            elif name == "price":
+                out[name] = numeric.fillna(0).round().astype("int64")
+            else:
+                out[name] = numeric.fillna(0.0).astype("float64")
+    if keep_extra:
+        out.update({name: df[name] for name in df.columns if name not in out})
+    return pd.DataFrame(out, index=df.index).reset_index(drop=True)
+
+
+# ==========================================
+# 商品鍵 (許可證比對表、跨通路歸戶報價表共用)
+# ==========================================
+# 品牌欄的「沒有品牌」寫法：前台 load_data 以 未標示 補空值，離線讀檔則是空字串 / NaN
+MISSING_BRANDS = ("", "nan", "未標示")
+
+
+def _key_text(value):
+    """None / NaN / "nan" / 空白一律視為空字串，離線 (keep_default_na=False) 與前台 (NaN) 讀到的值才會相同。"""
+    text = _to_str(value)
+    return "" if text == "nan" else text
+
+
+def key_brand(brand):
+    """品牌正規化為鍵值用的字串；未標示 / 缺值皆為空字串。"""
+    brand = _key_text(brand)
+    return "" if brand in MISSING_BRANDS else brand
+
+
+def match_key(row):
+    """商品主鍵：有網址用網址，否則用 品牌|標題 (品牌以 key_brand 正規化)。"""
+    url = _key_text(row.get("url"))
+    return url or f"{key_brand(row.get('brand'))}|{_key_text(row.get('title'))}"
@@ -0,0 +1,181 @@
+import math
+import os
+import sqlite3
+import sys
+import time
+from collections import Counter
+
+# ==========================================
+# 依過期程度與價格波動排定重新掃描的 URL
+# ==========================================
+STATE_PATH = os.environ.get("D2C_RECRAWL_STATE", "data/recrawl_state.sqlite3")
+# 沒有掃描耗時紀錄時，每個 URL 預估佔用的瀏覽器秒數
+DEFAULT_SCAN_SECONDS = float(os.environ.get("D2C_DEFAULT_SCAN_SECONDS", "12"))
+# 價格變動率的先驗：每 PRIOR_DAYS 天約變動 PRIOR_CHANGES 次 (觀測少時避免變動率為 0 而永遠不重掃)
+PRIOR_CHANGES = 1.0
+PRIOR_DAYS = 30.0
+# 連續失敗 (非產品頁、被擋、逾時) 每多一次，優先度乘上此係數
+FAILURE_DECAY = 0.5
+# 每次掃描耗時的 EWMA 權重
+COST_ALPHA = 0.3
+# 每個品牌至少排入的 URL 數 (避免高權重品牌佔滿預算)
+MIN_URLS_PER_BRAND = int(os.environ.get("D2C_MIN_URLS_PER_BRAND", "5"))
+
+# 有取得商品資料的結果類別 (與 scan_outcome.HAS_DATA 相同)；其餘視為失敗
+_DATA_STATUSES = ("success", "partial", "llm_failed")
+# 條件式請求確認未變動：視為一次成功掃描、價格不變
+_UNCHANGED_STATUS = "unchanged"
+
+
+class RecrawlScheduler:
+    """
+    以每個 URL 的掃描紀錄決定本輪要掃哪些 URL。
+    - 紀錄：首次 / 最後掃描時間、最後價格變動時間、掃描與變動次數、連續失敗次數、平均掃描耗時
+    - 變動率 λ (次/天) = (變動次數 + 先驗) / (觀測天數 + 先驗天數)
+    - 優先度 = 品牌權重 × P(上次掃描後已變動) × 失敗衰減 / 預估耗時，P = 1 - exp(-λ × 距上次掃描天數)
+      即「每秒瀏覽器時間預期抓到的新變動」；從未掃描過的 URL P = 1
+    - plan()：依優先度由高到低填滿本輪的瀏覽器秒數預算 (每品牌保底 MIN_URLS_PER_BRAND 個)
+    """
+
+    def __init__(self, path=STATE_PATH, brand_weights=None):
+        self.path = path
+        self.brand_weights = dict(brand_weights or {})
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS urls (
+                url TEXT PRIMARY KEY,
+                brand TEXT,
+                first_seen REAL,
+                first_scanned REAL,
+                last_scanned REAL,
+                last_changed REAL,
+                last_price INTEGER,
+                scans INTEGER NOT NULL DEFAULT 0,
+                changes INTEGER NOT NULL DEFAULT 0,
+                failure_streak INTEGER NOT NULL DEFAULT 0,
+                last_status TEXT,
+                avg_seconds REAL
+            );
+        """)
+
+    def _load(self, urls):
+        rows = {}
+        columns = ("url", "brand", "first_scanned", "last_scanned", "changes", "failure_streak", "avg_seconds")
+        urls = list(urls)
+        # SQLite 參數上限，分段查詢
+        for i in range(0, len(urls), 500):
+            chunk = urls[i:i + 500]
+            query = f"SELECT {', '.join(columns)} FROM urls WHERE url IN ({', '.join('?' * len(chunk))})"
+            for row in self._db.execute(query, chunk):
+                rows[row[0]] = dict(zip(columns, row))
+        return rows
+
+    def register(self, items, now=None):
+        """記錄本輪 sitemap 找到的 URL (新 URL 建立紀錄，既有 URL 更新品牌)。"""
+        now = now or time.time()
+        self._db.executemany(
+            "INSERT INTO urls (url, brand, first_seen) VALUES (?, ?, ?) ON CONFLICT(url) DO UPDATE SET brand = excluded.brand",
+            [(item["url"], item.get("brand", ""), now) for item in items if item.get("url")],
+        )
+        self._db.commit()
+
+    @staticmethod
+    def expected_cost(state):
+        return (state or {}).get("avg_seconds") or DEFAULT_SCAN_SECONDS
+
+    def priority(self, brand, state, now):
+        weight = self.brand_weights.get(brand, 1.0)
+        if not state or not state.get("last_scanned"):
+            return weight / DEFAULT_SCAN_SECONDS
+        observed_days = max((state["last_scanned"] - state["first_scanned"]) / 86400, 0.0)
+        rate = (state["changes"] + PRIOR_CHANGES) / (observed_days + PRIOR_DAYS)
+        age_days = max((now - state["last_scanned"]) / 86400, 0.0)
+        p_changed = 1.0 - math.exp(-rate * age_days)
+        return weight * p_changed * FAILURE_DECAY ** state["failure_streak"] / self.expected_cost(state)
+
+    def plan(self, items, budget_seconds, min_per_brand=MIN_URLS_PER_BRAND, now=None):
+        """
+        items：[{"url", "brand"}] (本輪可掃描的全部 URL)。
+        回傳 (依優先度排序的選中 items, 各品牌選中數)。同分時保留原本順序 (sitemap 順序)。
+        """
+        now = now or time.time()
+        states = self._load(item["url"] for item in items)
+        scored = sorted(
+            enumerate(items),
+            key=lambda pair: (-self.priority(pair[1].get("brand", ""), states.get(pair[1]["url"]), now), pair[0]),
+        )
+
+        chosen, spent, per_brand = set(), 0.0, Counter()
+        # 1) 每品牌保底
+        for idx, item in scored:
+            brand = item.get("brand", "")
+            if per_brand[brand] < min_per_brand:
+                chosen.add(idx)
+                per_brand[brand] += 1
+                spent += self.expected_cost(states.get(item["url"]))
+        # 2) 依優先度填滿剩餘預算
+        for idx, item in scored:
+            if idx in chosen:
+                continue
+            cost = self.expected_cost(states.get(item["url"]))
+            if spent + cost > budget_seconds:
+                continue
+            chosen.add(idx)
+            per_brand[item.get("brand", "")] += 1
+            spent += cost
+
+        selected = [item for idx, item in scored if idx in chosen]
+        return selected, dict(per_brand)
+
+    def record(self, url, status, price=0, elapsed=0.0, now=None):
+        """掃描結束後更新紀錄：有資料時比對價格判斷是否變動，失敗時累加連續失敗次數。"""
+        now = now or time.time()
+        row = self._db.execute(
+            "SELECT first_scanned, last_price, avg_seconds, failure_streak FROM urls WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            self._db.execute("INSERT INTO urls (url, first_seen) VALUES (?, ?)", (url, now))
+            row = (None, None, None, 0)
+        first_scanned, last_price, avg_seconds, failure_streak = row
+        avg_seconds = elapsed if avg_seconds is None else (1 - COST_ALPHA) * avg_seconds + COST_ALPHA * elapsed
+
+        if status == _UNCHANGED_STATUS:
+            price = last_price
+        if status in _DATA_STATUSES or status == _UNCHANGED_STATUS:
+            price = int(price or 0)
+            changed = bool(price and last_price and price != last_price)
+            self._db.execute(
+                "UPDATE urls SET first_scanned = ?, last_scanned = ?, scans = scans + 1, changes = changes + ?, "
+                "last_changed = CASE WHEN ? THEN ? ELSE last_changed END, last_price = ?, failure_streak = 0, "
+                "last_status = ?, avg_seconds = ? WHERE url = ?",
+                (first_scanned or now, now, int(changed), int(changed), now, price or last_price, status, avg_seconds, url),
+            )
+        else:
+            self._db.execute(
+                "UPDATE urls SET first_scanned = ?, last_scanned = ?, scans = scans + 1, failure_streak = ?, "
+                "last_status = ?, avg_seconds = ? WHERE url = ?",
+                (first_scanned or now, now, failure_streak + 1, status, avg_seconds, url),
+            )
+        self._db.commit()
+
+    def summary(self):
+        row = self._db.execute(
+            "SELECT COUNT(*), SUM(last_scanned IS NOT NULL), SUM(changes), SUM(failure_streak > 0) FROM urls"
+        ).fetchone()
+        return {"urls": row[0], "scanned": row[1] or 0, "changes": row[2] or 0, "failing": row[3] or 0}
+
+    def close(self):
+        self._db.close()
+
+
+if __name__ == "__main__":
+    # 用法：python -m data.recrawl_scheduler  → 顯示掃描紀錄摘要與目前優先度最高的 URL
+    scheduler = RecrawlScheduler()
+    info = scheduler.summary()
+    print(f"🗓️ [Recrawl] 追蹤 {info['urls']} 個 URL，已掃描 {info['scanned']}，累計價格變動 {info['changes']} 次，連續失敗中 {info['failing']}")
+    limit = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    rows = scheduler._db.execute("SELECT url, brand FROM urls").fetchall()
+    selected, _ = scheduler.plan([{"url": u, "brand": b} for u, b in rows], budget_seconds=limit * DEFAULT_SCAN_SECONDS, min_per_brand=0)
+    for item in selected[:limit]:
+        print(f"  - [{item['brand']}] {item['url']}")
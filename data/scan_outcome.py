@@ -0,0 +1,108 @@
+import asyncio
+import random
+from dataclasses import dataclass, field
+
+# ==========================================
+# 單頁掃描結果分類與各類別的重試策略
+# ==========================================
+SUCCESS = "success"            # 標題與價格都拿到
+SKIPPED = "skipped"            # 非產品頁 / 無效網址 / 404：不重試
+TRANSIENT = "transient"        # 逾時、連線錯誤、5xx：短退避重試
+BLOCKED = "blocked"            # 403/429 (重新載入後仍被擋)：長冷卻後重試一次
+PARTIAL = "partial"            # 頁面有載入但缺價格或標題 (selector 未命中)：延後重試一次
+LLM_FAILED = "llm_failed"      # LLM 逾時或回應無法解析：只重跑 LLM，不重新開頁
+UNCHANGED = "unchanged"        # 條件式請求確認與上次完整掃描相同 (verified fresh)：不渲染、不重試
+
+STATUSES = (SUCCESS, SKIPPED, TRANSIENT, BLOCKED, PARTIAL, LLM_FAILED, UNCHANGED)
+
+# max_retries = 0 表示不重試；延遲 = min(base_delay * 2^(次數-1), max_delay) 再加 ±20% 抖動
+RETRY_POLICY = {
+    SUCCESS: {"max_retries": 0, "base_delay": 0, "max_delay": 0},
+    SKIPPED: {"max_retries": 0, "base_delay": 0, "max_delay": 0},
+    TRANSIENT: {"max_retries": 3, "base_delay": 2, "max_delay": 8},
+    BLOCKED: {"max_retries": 1, "base_delay": 60, "max_delay": 60},
+    PARTIAL: {"max_retries": 1, "base_delay": 15, "max_delay": 15},
+    LLM_FAILED: {"max_retries": 2, "base_delay": 5, "max_delay": 20},
+    UNCHANGED: {"max_retries": 0, "base_delay": 0, "max_delay": 0},
+}
+
+# 有資料可存的類別 (PARTIAL / LLM_FAILED 為 fallback 資料，重試都失敗時仍保留)
+HAS_DATA = (SUCCESS, PARTIAL, LLM_FAILED)
+
+
+@dataclass(slots=True)
+class ScanOutcome:
+    """
+    AgentD2CScanner.scan_url 的回傳值。
+    data 為 Unified Schema 的商品 dict (沒有資料時為 None)；
+    html 只在 LLM_FAILED 時保留，供重跑 LLM 時不必重新載入頁面；
+    verified_price 只在 UNCHANGED 時有值 (確認未變動時的價格，供價格歷史記錄當日觀測)。
+    """
+    status: str
+    url: str
+    data: dict = None
+    reason: str = ""
+    http_status: int = 0
+    elapsed: float = 0.0
+    llm_seconds: float = 0.0
+    verified_price: int = 0
+    html: str = field(default="", repr=False)
+
+    @property
+    def ok(self):
+        return self.status == SUCCESS
+
+    def __bool__(self):
+        # 與舊介面 (成功回傳 dict、失敗回傳 None) 相容：有資料即為真
+        return self.data is not None
+
+    def to_dict(self, keep_html=False):
+        """可 JSON 序列化的 dict (跨行程 / 寫入工作佇列用)；預設不含 HTML。"""
+        out = {name: getattr(self, name) for name in self.__slots__ if name != "html"}
+        if keep_html and self.html:
+            out["html"] = self.html
+        return out
+
+    @classmethod
+    def from_dict(cls, row):
+        if not row:
+            return None
+        return cls(**{k: v for k, v in row.items() if k in cls.__slots__})
+
+
+def classify_http_status(code):
+    """HTTP 狀態碼 → 結果類別；2xx/3xx 回傳 None (繼續處理頁面)。"""
+    if code in (401, 403, 429):
+        return BLOCKED
+    if code in (404, 410):
+        return SKIPPED
+    if code >= 500 or code == 408:
+        return TRANSIENT
+    return None
+
+
+def classify_exception(exc):
+    """掃描過程中未預期的例外：逾時與連線錯誤一律視為暫時性失敗。"""
+    if isinstance(exc, asyncio.TimeoutError) or "Timeout" in type(exc).__name__:
+        return TRANSIENT, "timeout"
+    message = str(exc)
+    if "net::" in message or "ECONNRESET" in message or "Connection" in message:
+        return TRANSIENT, message.splitlines()[0][:200]
+    return TRANSIENT, f"{type(exc).__name__}: {message.splitlines()[0][:200] if message else ''}"
+
+
+def retry_delay(status, attempt):
+    """第 attempt 次重試 (從 1 開始) 前的等待秒數；超過該類別上限時回傳 None。"""
+    policy = RETRY_POLICY.get(status) or RETRY_POLICY[SKIPPED]
+    if attempt > policy["max_retries"]:
+        return None
+    delay = min(policy["base_delay"] * 2 ** (attempt - 1), policy["max_delay"])
+    return delay * random.uniform(0.8, 1.2)
+
+
+def better_outcome(current, new):
+    """兩次嘗試中保留較好的結果：有資料優先，同樣有資料時以 SUCCESS > LLM_FAILED > PARTIAL。"""
+    if current is None:
+        return new
+    rank = {SUCCESS: 3, LLM_FAILED: 2, PARTIAL: 1}
+    return new if rank.get(new.status, 0) >= rank.get(current.status, 0) else current
@@ -0,0 +1,163 @@
+from collections import defaultdict
+
+import numpy as np
+
+
+def normalize_text(text):
+    """搜尋用正規化：轉小寫 (casefold)、去頭尾空白；非字串視為空字串。"""
+    if not isinstance(text, str):
+        return ""
+    return text.casefold().strip()
+
+
+def char_ngrams(text, n=2):
+    """
+    字元 n-gram 集合。
+    中文沒有斷詞邊界，直接以字元滑動視窗切分；長度不足 n 時回傳整段字串。
+    """
+    if not text:
+        return set()
+    if len(text) < n:
+        return {text}
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def split_highlights(value):
+    """product_highlights 以分號 ; 分隔，回傳去空白後的亮點清單。"""
+    if not isinstance(value, str):
+        return []
+    return [t.strip() for t in value.split(";") if t.strip()]
+
+
+class ProductSearchIndex:
+    """
+    前台搜尋索引（每個資料版本建立一次）。
+    - title/brand 的字元 unigram + bigram 倒排表 (posting list 為排序過的 row id 陣列)
+    - product_highlights 亮點 → row id 倒排表，查詢時組成 bitmap 並快取
+    - 來源/類別/品牌等低基數欄位的 facet 倒排表
+    篩選全部轉為 row id / bitmap 交集，不再對整張表做 str.contains 線性掃描。
+    row id 即 DataFrame 的位置索引 (iloc)。
+    """
+
+    FACET_COLUMNS = ("source", "category", "brand")
+    MAX_CACHED_BITMAPS = 64
+
+    def __init__(self, df):
+        self.size = len(df)
+        self._titles = [normalize_text(t) for t in df["title"].tolist()] if "title" in df.columns else [""] * self.size
+        self._brands = [normalize_text(b) for b in df["brand"].tolist()] if "brand" in df.columns else [""] * self.size
+
+        self._grams = self._build_gram_postings(self._titles, self._brands)
+        self._highlights = self._build_highlight_postings(
+            df["product_highlights"].tolist() if "product_highlights" in df.columns else []
+        )
+        self._facets = {}
+        for col in self.FACET_COLUMNS:
+            if col in df.columns:
+                groups = df.reset_index(drop=True).groupby(col, sort=False).indices
+                self._facets[col] = {str(k): np.asarray(v, dtype=np.int32) for k, v in groups.items()}
+        self._bitmap_cache = {}
+
+    def _remember(self, key, bitmap):
+        if len(self._bitmap_cache) >= self.MAX_CACHED_BITMAPS:
+            self._bitmap_cache.clear()
+        self._bitmap_cache[key] = bitmap
+        return bitmap
+
+    @staticmethod
+    def _build_gram_postings(titles, brands):
+        postings = defaultdict(list)
+        for row_id, (title, brand) in enumerate(zip(titles, brands)):
+            grams = set(title) | set(brand) | char_ngrams(title, 2) | char_ngrams(brand, 2)
+            for g in grams:
+                postings[g].append(row_id)
+        # row id 依序加入，天然已排序
+        return {g: np.asarray(ids, dtype=np.int32) for g, ids in postings.items()}
+
+    @staticmethod
+    def _build_highlight_postings(values):
+        postings = defaultdict(list)
+        for row_id, value in enumerate(values):
+            for token in set(split_highlights(value)):
+                postings[token].append(row_id)
+        return {t: np.asarray(ids, dtype=np.int32) for t, ids in postings.items()}
+
+    # ------------------------------------------
+    # 查詢
+    # ------------------------------------------
+    def search(self, keyword):
+        """
+        關鍵字搜尋 title 或 brand（不分大小寫、字面比對）。
+        先以 n-gram posting list 交集取得候選，再驗證子字串以排除不連續命中。
+        """
+        q = normalize_text(keyword)
+        if not q:
+            return np.arange(self.size, dtype=np.int32)
+
+        grams = char_ngrams(q, 2) if len(q) >= 2 else {q}
+        lists = []
+        for g in grams:
+            ids = self._grams.get(g)
+            if ids is None:
+                return np.empty(0, dtype=np.int32)
+            lists.append(ids)
+
+        # 由短到長交集，候選集最快收斂
+        lists.sort(key=len)
+        candidates = lists[0]
+        for ids in lists[1:]:
+            candidates = np.intersect1d(candidates, ids, assume_unique=True)
+            if candidates.size == 0:
+                return candidates
+
+        if len(q) <= 2:
+            return candidates
+        return np.asarray(
+            [i for i in candidates.tolist() if q in self._titles[i] or q in self._brands[i]],
+            dtype=np.int32,
+        )
+
+    def highlight_bitmap(self, needle):
+        """亮點 bitmap：任一亮點包含 needle 的列為 True（等同原本 str.contains 語意）。"""
+        key = ("highlight", needle)
+        if key in self._bitmap_cache:
+            return self._bitmap_cache[key]
+        bitmap = np.zeros(self.size, dtype=bool)
+        for token, ids in self._highlights.items():
+            if needle in token:
+                bitmap[ids] = True
+        return self._remember(key, bitmap)
+
+    def facet_bitmap(self, column, values):
+        """欄位值屬於 values 的列為 True。"""
+        key = (column, tuple(sorted(str(v) for v in values)))
+        if key in self._bitmap_cache:
+            return self._bitmap_cache[key]
+        bitmap = np.zeros(self.size, dtype=bool)
+        for v in key[1]:
+            ids = self._facets.get(column, {}).get(v)
+            if ids is not None:
+                bitmap[ids] = True
+        return self._remember(key, bitmap)
+
+    def filter(self, keyword="", highlights=(), facets=None):
+        """
+        組合查詢，回傳符合條件的 row id（已排序）。
+        - keyword: 搜尋 title/brand
+        - highlights: 多個亮點條件 (AND)
+        - facets: {"source": [...], "brand": [...]}，值為 None 表示不篩選
+        """
+        mask = np.ones(self.size, dtype=bool)
+        for column, values in (facets or {}).items():
+            if values is None:
+                continue
+            mask &= self.facet_bitmap(column, values)
+        for needle in highlights or ():
+            mask &= self.highlight_bitmap(needle)
+
+        if keyword and normalize_text(keyword):
+            hits = self.search(keyword)
+            keyword_mask = np.zeros(self.size, dtype=bool)
+            keyword_mask[hits] = True
+            mask &= keyword_mask
+        return np.flatnonzero(mask)
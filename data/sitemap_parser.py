@@ -7,13 +7,17 @@ import re
 import gzip
 from urllib.parse import urljoin, urlparse
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from data.url_canon import SeenSet, canonicalize
 
 class SitemapParser:
     """
     輕量化 Sitemap 解析器 (Phase 2 Core Module)
     不依賴瀏覽器，使用 Requests 與 XML Parser 快速提取產品連結。
+    seen 為整輪共用的 SeenSet (只存網址 hash)：sitemap、產品總覽頁補抓與各網域間重複的網址只回傳一次；
+    未提供時每次 process_domain 各自去重。
     """
-    def __init__(self):
+    def __init__(self, seen=None):
+        self.seen = seen
         self.session = requests.Session()
         self.session.headers.update({
             # 改用一般瀏覽器 UA，降低被防火牆阻擋機率 (解決配方時代等網站連線問題)
@@ -366,7 +370,8 @@ class SitemapParser:
     def process_domain(self, brand, domain):
         """處理單一網域的完整流程：Robots -> Sitemap -> URLs"""
         print(f"🔍 [Sitemap] 開始掃描: {brand} ({domain})")
-        found_urls = set()
+        # 候選網址 (已正規化，可能重複)；結束時才併入 seen，重試同一網域不會被自己先前的部分結果擋掉
+        found_urls = []
         total_scanned = 0
         
         # 1. 收集種子 Sitemaps
@@ -413,7 +418,8 @@ class SitemapParser:
                     url = loc.text.strip()
                     total_scanned += 1
                     if self.is_likely_product(url):
-                        found_urls.add(url)
+                        # 正規化後再收集，追蹤參數 / 結尾斜線 / www 變體只留一個
+                        found_urls.append(canonicalize(url))
 
         # 九五之丹補強：從產品總覽頁補抓產品詳情連結（固定執行），避免 sitemap 欄位不足
         if "95dan.com.tw" in domain:
@@ -424,7 +430,7 @@ class SitemapParser:
                 for href in hrefs:
                     full_url = urljoin(domain, href)
                     if self.is_likely_product(full_url):
-                        found_urls.add(full_url)
+                        found_urls.append(canonicalize(full_url))
 
             # 95dan 補強：有些產品卡片由前端渲染，直接以白名單 slug 合成 URL 補齊
             rule = self.domain_whitelist_rules.get("www.95dan.com.tw", {})
@@ -432,11 +438,14 @@ class SitemapParser:
                 if token.startswith("/"):
                     candidate = urljoin(domain, token)
                     if self.is_likely_product(candidate):
-                        found_urls.add(candidate)
+                        found_urls.append(canonicalize(candidate))
 
         # 大醫生技補強：排除 /certifications 等非主產品頁，避免噪音 URL 進入掃描
         if "greencome.com.tw" in domain:
-            found_urls = {u for u in found_urls if self._is_greencome_product_url(u)}
+            found_urls = [u for u in found_urls if self._is_greencome_product_url(u)]
+
+        # 已在本輪其他 sitemap / 網域出現過的網址不再回傳 (批次內重複只保留第一個)
+        found_urls = (self.seen if self.seen is not None else SeenSet()).add_many(found_urls)
 
         filter_rate = (1 - len(found_urls) / total_scanned) * 100 if total_scanned > 0 else 0
         print(f"✅ [Sitemap] {brand} 完成，掃描 {total_scanned} 連結 -> 提取 {len(found_urls)} 產品 (過濾率 {filter_rate:.1f}%)")
@@ -452,7 +461,7 @@ def main():
         return
 
     results = []
-    parser = SitemapParser()
+    parser = SitemapParser(seen=SeenSet())
     domains = []
 
     # 讀取 CSV
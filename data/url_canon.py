@@ -0,0 +1,199 @@
+import csv
+import hashlib
+import os
+import re
+import threading
+from urllib.parse import parse_qsl, quote, urlencode, urlsplit, urlunsplit
+
+import numpy as np
+
+# ==========================================
+# 網址正規化與已見網址集合 (sitemap / 產品總覽頁補抓 / 掃描器共用)
+# ==========================================
+SEEN_PATH = os.environ.get("D2C_SEEN_PATH", "data/url_seen.npy")
+# 品牌網域清單：各 host 偏好的 www / scheme 以此為準
+DOMAINS_CSV = os.environ.get("D2C_DOMAINS_CSV", "data/d2c_domains_list.csv")
+# 追蹤參數 (前綴比對)：不影響頁面內容
+TRACKING_PARAMS = ("utm_", "fbclid", "gclid", "yclid", "mc_", "_ga", "srsltid", "igshid", "fb_", "_pos", "_sid", "_ss")
+# 各 host 的額外規則：
+#   host / scheme：偏好的 host (www 或不含 www) 與 scheme，其他變體一律改寫成此形式
+#   drop_params：額外移除的參數；keep_params：只保留這些參數 (其餘全部移除)
+#   lowercase_path：路徑大小寫不敏感的站台
+# DOMAINS_CSV 的網域會以 load_domain_rules() 補上 host / scheme
+HOST_RULES = {}
+_default_rules = None
+
+_UNRESERVED = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~")
+_ESCAPE_RE = re.compile(r"%([0-9A-Fa-f]{2})")
+_DEFAULT_PORTS = {"http": "80", "https": "443"}
+
+
+def _bare_host(host):
+    return host[4:] if host.startswith("www.") else host
+
+
+def load_domain_rules(domains, rules=None):
+    """
+    [(brand, domain)] → 以不含 www 的 host 為鍵的規則 (偏好 host / scheme 取自網域清單)，
+    與 HOST_RULES (或傳入的 rules) 合併；HOST_RULES 中明確設定的欄位優先。
+    """
+    merged = {}
+    for _, domain in domains:
+        parts = urlsplit(domain if "://" in domain else f"https://{domain}")
+        host = (parts.hostname or "").lower()
+        if host:
+            merged[_bare_host(host)] = {"host": host, "scheme": parts.scheme.lower() or "https"}
+    for host, rule in (HOST_RULES if rules is None else rules).items():
+        merged.setdefault(_bare_host(host), {}).update(rule)
+    return merged
+
+
+def default_rules():
+    """HOST_RULES + DOMAINS_CSV (每個行程讀取一次)，各行程 / 各模組得到相同的正規化結果。"""
+    global _default_rules
+    if _default_rules is None:
+        domains = []
+        if os.path.exists(DOMAINS_CSV):
+            with open(DOMAINS_CSV, "r", encoding="utf-8-sig") as f:
+                domains = [
+                    (row.get("brand", ""), (row.get("domain") or "").strip())
+                    for row in csv.DictReader(f) if (row.get("domain") or "").strip()
+                ]
+        _default_rules = load_domain_rules(domains)
+    return _default_rules
+
+
+def _normalize_escapes(part, safe):
+    """多餘的跳脫解碼 (%7E → ~)、其餘跳脫轉大寫，未跳脫的非 ASCII / 空白補上 UTF-8 跳脫。"""
+    def _fix(m):
+        ch = chr(int(m.group(1), 16))
+        return ch if ch in _UNRESERVED else "%" + m.group(1).upper()
+
+    return quote(_ESCAPE_RE.sub(_fix, part), safe=safe + "%")
+
+
+def canonicalize(url, rules=None):
+    """
+    網址正規化 (同一商品頁的各種寫法得到同一個字串，且仍可直接開啟)：
+    - scheme 預設 https；host 轉小寫、去掉預設 port 與結尾的 .，依規則統一 www / 不含 www
+    - 路徑：跳脫字元正規化、合併連續 /、去掉結尾 /
+    - query：移除追蹤參數與 host 規則指定的參數，其餘依名稱排序；去掉 fragment
+    rules 為 load_domain_rules() 的結果；未提供時使用 default_rules()。
+    """
+    url = str(url or "").strip()
+    if not url:
+        return ""
+    if url.startswith("//"):
+        url = "https:" + url
+    elif "://" not in url:
+        url = "https://" + url
+    parts = urlsplit(url)
+    host = (parts.hostname or "").rstrip(".")
+    if not host:
+        return url
+    rule = (default_rules() if rules is None else rules).get(_bare_host(host), {})
+    scheme = rule.get("scheme") or "https"
+    if rule.get("host") and _bare_host(rule["host"]) == _bare_host(host):
+        host = rule["host"]
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    netloc = host if port is None or str(port) == _DEFAULT_PORTS.get(scheme) else f"{host}:{port}"
+
+    path = re.sub(r"/{2,}", "/", parts.path or "/")
+    path = _normalize_escapes(path, safe="/:@!$&'()*+,;=")
+    if rule.get("lowercase_path"):
+        path = path.lower()
+    path = path.rstrip("/") or "/"
+
+    drop = TRACKING_PARAMS + tuple(rule.get("drop_params", ()))
+    keep = rule.get("keep_params")
+    query = [
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith(drop) and (keep is None or k in keep)
+    ]
+    return urlunsplit((scheme, netloc, path, urlencode(sorted(query)), ""))
+
+
+def url_key(url):
+    """網址的 64 位元 hash (集合只存 hash，每個網址 8 bytes)；呼叫前應先 canonicalize。"""
+    return int.from_bytes(hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class SeenSet:
+    """
+    已見網址集合：排序後的 uint64 hash 陣列 (np.searchsorted 查詢)，新加入的先放在小型 set，
+    累積 MERGE_EVERY 筆再合併，百萬筆網址約 8 MB。
+    path 不為 None 時可 save() 到 .npy 跨次執行保留；64 位元 hash 在百萬筆規模的碰撞機率可忽略。
+    add / add_many 以鎖保護，可由多個執行緒 (平行解析多個網域的 SitemapParser) 共用。
+    """
+
+    MERGE_EVERY = 65536
+
+    def __init__(self, path=None):
+        self.path = path
+        self._keys = np.empty(0, dtype=np.uint64)
+        if path and os.path.exists(path):
+            self._keys = np.load(path)
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def _merge(self):
+        if self._pending:
+            self._keys = np.union1d(self._keys, np.fromiter(self._pending, dtype=np.uint64, count=len(self._pending)))
+            self._pending.clear()
+
+    def _has_key(self, key):
+        if key in self._pending:
+            return True
+        i = np.searchsorted(self._keys, np.uint64(key))
+        return i < len(self._keys) and int(self._keys[i]) == key
+
+    def __contains__(self, url):
+        return self._has_key(url_key(url))
+
+    def __len__(self):
+        return len(self._keys) + len(self._pending)
+
+    def add(self, url):
+        """加入網址；先前未見過時回傳 True。"""
+        key = url_key(url)
+        with self._lock:
+            if self._has_key(key):
+                return False
+            self._pending.add(key)
+            if len(self._pending) >= self.MERGE_EVERY:
+                self._merge()
+        return True
+
+    def add_many(self, urls):
+        """批次加入，回傳先前未見過的網址 (保持原順序，批次內重複只回傳第一個)。"""
+        urls = list(urls)
+        if not urls:
+            return []
+        keys = np.fromiter((url_key(u) for u in urls), dtype=np.uint64, count=len(urls))
+        with self._lock:
+            self._merge()
+            idx = np.minimum(np.searchsorted(self._keys, keys), max(len(self._keys) - 1, 0))
+            known = self._keys[idx] == keys if len(self._keys) else np.zeros(len(keys), dtype=bool)
+            fresh, batch = [], set()
+            for url, key, hit in zip(urls, keys.tolist(), known.tolist()):
+                if hit or key in batch:
+                    continue
+                batch.add(key)
+                fresh.append(url)
+            self._pending.update(batch)
+            self._merge()
+        return fresh
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            self._merge()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # np.save 會自動補 .npy，暫存檔名需以 .npy 結尾
+        tmp = f"{self.path}.{os.getpid()}.tmp.npy"
+        np.save(tmp, self._keys)
+        os.replace(tmp, self.path)
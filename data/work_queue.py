@@ -0,0 +1,248 @@
+import json
+import os
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+
+# ==========================================
+# 多行程 / 多機共用的租約式工作佇列
+# ==========================================
+QUEUE_PATH = os.environ.get("D2C_QUEUE_PATH", "data/scan_queue.sqlite3")
+# 租約有效秒數：worker 需在此時間內 heartbeat，否則工作自動回到佇列給其他 worker
+VISIBILITY_TIMEOUT = float(os.environ.get("D2C_QUEUE_VISIBILITY", "120"))
+# 同一工作被租走但未 ack/nack (worker 當掉) 超過此次數即標記為 failed，避免毒工作拖垮所有 worker
+MAX_DELIVERIES = int(os.environ.get("D2C_QUEUE_MAX_DELIVERIES", "5"))
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+class WorkQueue(ABC):
+    """
+    工作佇列介面 (後端可替換，見 BACKENDS / open_queue)。
+    - 工作以 (batch, key) 唯一，payload / state / result 皆為可 JSON 序列化的物件
+    - lease：取得可執行的工作並設定租約到期時間；租約過期的工作會被重新租出
+    - heartbeat：延長仍在處理中的工作租約
+    - ack：完成並記錄結果；nack：延遲 delay 秒後回到佇列 (保留 state 供下次嘗試使用)
+    ack / nack / heartbeat 只對目前持有租約的 worker 生效，租約已被收回的舊 worker 回報會被忽略。
+    """
+
+    @abstractmethod
+    def enqueue(self, batch, items, key="url"):
+        pass
+
+    @abstractmethod
+    def lease(self, worker_id, limit=1, visibility=VISIBILITY_TIMEOUT):
+        pass
+
+    @abstractmethod
+    def heartbeat(self, worker_id, task_ids, visibility=VISIBILITY_TIMEOUT):
+        pass
+
+    @abstractmethod
+    def ack(self, task_id, worker_id, result=None, state=None):
+        pass
+
+    @abstractmethod
+    def nack(self, task_id, worker_id, delay=0, state=None, error=""):
+        pass
+
+    @abstractmethod
+    def counts(self, batch=None):
+        pass
+
+    def remaining(self):
+        """尚未結束 (pending + leased) 的工作數，所有 batch 合計。"""
+        counts = self.counts()
+        return counts.get(PENDING, 0) + counts.get(LEASED, 0)
+
+    @abstractmethod
+    def results(self, batch):
+        pass
+
+    def close(self):
+        pass
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """
+    SQLite 後端 (WAL 模式)：同一台機器的多個行程、或共用檔案系統上的多台機器可同時使用。
+    租約在 BEGIN IMMEDIATE 交易中挑選並更新，同一工作不會同時被兩個 worker 取得。
+    """
+
+    def __init__(self, path=QUEUE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # isolation_level=None：交易由 BEGIN / COMMIT 自行控制
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY,
+                batch TEXT NOT NULL,
+                key TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                state TEXT,
+                result TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                available_at REAL NOT NULL,
+                lease_owner TEXT,
+                lease_expires REAL,
+                deliveries INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                updated_at REAL,
+                UNIQUE (batch, key)
+            );
+            CREATE INDEX IF NOT EXISTS tasks_ready ON tasks (status, available_at);
+            CREATE INDEX IF NOT EXISTS tasks_batch ON tasks (batch, status);
+        """)
+
+    def _transaction(self, fn):
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            out = fn()
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+        return out
+
+    def enqueue(self, batch, items, key="url"):
+        """加入工作 (同一 batch 內 key 重複者略過)，回傳實際新增筆數。"""
+        now = time.time()
+        rows = [(batch, str(item[key]), json.dumps(item, ensure_ascii=False), now, now) for item in items]
+
+        def _insert():
+            before = self._db.total_changes
+            self._db.executemany(
+                "INSERT OR IGNORE INTO tasks (batch, key, payload, available_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            return self._db.total_changes - before
+
+        return self._transaction(_insert)
+
+    def lease(self, worker_id, limit=1, visibility=VISIBILITY_TIMEOUT):
+        """
+        租出最多 limit 筆可執行的工作 (pending 且已到可執行時間，或租約已過期)。
+        回傳 [{"id", "batch", "key", "payload", "state", "deliveries"}]。
+        """
+        def _lease():
+            now = time.time()
+            # 反覆當掉 worker 的工作不再租出
+            self._db.execute(
+                "UPDATE tasks SET status = ?, error = 'lease expired', updated_at = ? "
+                "WHERE status = ? AND lease_expires <= ? AND deliveries >= ?",
+                (FAILED, now, LEASED, now, MAX_DELIVERIES),
+            )
+            rows = self._db.execute(
+                "SELECT id, batch, key, payload, state, deliveries FROM tasks "
+                "WHERE (status = ? AND available_at <= ?) OR (status = ? AND lease_expires <= ?) "
+                "ORDER BY available_at, id LIMIT ?",
+                (PENDING, now, LEASED, now, limit),
+            ).fetchall()
+            self._db.executemany(
+                "UPDATE tasks SET status = ?, lease_owner = ?, lease_expires = ?, deliveries = deliveries + 1, updated_at = ? WHERE id = ?",
+                [(LEASED, worker_id, now + visibility, now, row[0]) for row in rows],
+            )
+            return rows
+
+        return [
+            {
+                "id": task_id,
+                "batch": batch,
+                "key": key,
+                "payload": json.loads(payload),
+                "state": json.loads(state) if state else None,
+                "deliveries": deliveries + 1,
+            }
+            for task_id, batch, key, payload, state, deliveries in self._transaction(_lease)
+        ]
+
+    def heartbeat(self, worker_id, task_ids, visibility=VISIBILITY_TIMEOUT):
+        now = time.time()
+        self._transaction(lambda: self._db.executemany(
+            "UPDATE tasks SET lease_expires = ?, updated_at = ? WHERE id = ? AND status = ? AND lease_owner = ?",
+            [(now + visibility, now, task_id, LEASED, worker_id) for task_id in task_ids],
+        ))
+
+    def _finish(self, task_id, worker_id, status, available_at, state, result, error):
+        now = time.time()
+        # 正常 nack 的重試次數由呼叫端 (state) 控制，deliveries 歸零，只用來偵測 worker 當掉
+        cur = self._transaction(lambda: self._db.execute(
+            "UPDATE tasks SET status = ?, available_at = ?, state = ?, result = ?, error = ?, "
+            "lease_owner = NULL, lease_expires = NULL, deliveries = 0, updated_at = ? "
+            "WHERE id = ? AND status = ? AND lease_owner = ?",
+            (
+                status, available_at if available_at is not None else now,
+                json.dumps(state, ensure_ascii=False) if state is not None else None,
+                json.dumps(result, ensure_ascii=False) if result is not None else None,
+                error, now, task_id, LEASED, worker_id,
+            ),
+        ))
+        return cur.rowcount == 1
+
+    def ack(self, task_id, worker_id, result=None, state=None):
+        """完成工作；租約已不屬於此 worker 時回傳 False。"""
+        return self._finish(task_id, worker_id, DONE, None, state, result, None)
+
+    def nack(self, task_id, worker_id, delay=0, state=None, error=""):
+        """放回佇列，delay 秒後才可再被租出；租約已不屬於此 worker 時回傳 False。"""
+        return self._finish(task_id, worker_id, PENDING, time.time() + delay, state, None, error)
+
+    def counts(self, batch=None):
+        if batch is None:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status")
+        else:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM tasks WHERE batch = ? GROUP BY status", (batch,))
+        return dict(rows.fetchall())
+
+    def results(self, batch):
+        """batch 內所有工作：[{"key", "status", "payload", "state", "result", "error"}]。"""
+        rows = self._db.execute(
+            "SELECT key, status, payload, state, result, error FROM tasks WHERE batch = ? ORDER BY id", (batch,)
+        ).fetchall()
+        return [
+            {
+                "key": key,
+                "status": status,
+                "payload": json.loads(payload),
+                "state": json.loads(state) if state else None,
+                "result": json.loads(result) if result else None,
+                "error": error or "",
+            }
+            for key, status, payload, state, result, error in rows
+        ]
+
+    def purge(self, batch):
+        """刪除某個 batch 的所有工作 (結果收集完成後清理)。"""
+        self._transaction(lambda: self._db.execute("DELETE FROM tasks WHERE batch = ?", (batch,)))
+
+    def close(self):
+        self._db.close()
+
+
+# 後端註冊表：open_queue("sqlite:///data/q.sqlite3")；其他後端 (如 Redis) 註冊到此即可
+BACKENDS = {
+    "sqlite": SQLiteWorkQueue,
+}
+
+
+def open_queue(spec=None):
+    """
+    佇列位置 → WorkQueue。
+    "data/q.sqlite3" 或 "sqlite:///data/q.sqlite3" 使用 SQLite；"<後端>://<位置>" 交由 BACKENDS 中對應的類別處理。
+    """
+    spec = spec or QUEUE_PATH
+    if "://" not in spec:
+        return SQLiteWorkQueue(spec)
+    scheme, location = spec.split("://", 1)
+    if scheme not in BACKENDS:
+        raise ValueError(f"未知的佇列後端: {scheme} (可用: {', '.join(sorted(BACKENDS))})")
+    if scheme == "sqlite":
+        # sqlite:///relative/path → relative/path；sqlite:////abs/path → /abs/path
+        location = location[1:] if location.startswith("/") else location
+    return BACKENDS[scheme](location)
@@ -7,6 +7,9 @@ import os
 from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
 from bs4 import BeautifulSoup
 
+from data.price_history import record_observations
+from scrapers.dom_extract import extract_first_sync, print_extract_stats
+
 # ==========================================
 # 產品清單定義
 # ==========================================
@@ -304,6 +307,37 @@ def scrape_pchome(keyword):
 # ==========================================
 # 2. MOMO 爬蟲 (泛化版)
 # ==========================================
+# MOMO 搜尋結果卡片：依序嘗試的卡片 selector 與欄位規格 (一次 page.evaluate 抽出整頁)
+MOMO_CARD_ROOTS = [".listGoodsData", ".goodsUrl", "li.goodsItemLi", ".EachGood", "#CategoryContent li"]
+MOMO_CARD_FIELDS = {
+    "title": {"selector": ".prdName", "post": lambda t: " ".join(t.split())},
+    "price_text": {"selector": ".price, .money"},
+    "link": {"selector": "a", "include_self": True, "attr": "href"},
+    "images": {"selector": "img", "attr": ["data-original", "src"], "all": True},
+    "slogan": {"selector": ".money .slogan", "default": ""},
+}
+
+
+def pick_momo_image(srcs):
+    """卡片內的圖片網址中挑商品圖：優先 goodsimg / i1.momoshop，其次第一張非圖示、非佔位圖。"""
+    image_url = None
+    for src in srcs:
+        # 過濾無效圖片
+        if "ecm" in src or "icon" in src:
+            continue
+        if "goodsimg" in src or "i1.momoshop" in src:
+            return src
+        if not image_url and "dummy" not in src and "data:image" not in src:
+            image_url = src
+    return image_url
+
+
+def momo_link(link):
+    if link and not link.startswith("http"):
+        return "https://www.momoshop.com.tw" + link
+    return link
+
+
 def scrape_momo(keyword, limit=100):
     print(f"🚀 [MOMO] 啟動隱身瀏覽器 (銷量排序) 關鍵字：{keyword}")
     data_list = []
@@ -340,28 +374,21 @@ def scrape_momo(keyword, limit=100):
                 except:
                     print("⏳ MOMO 載入較慢，繼續嘗試...")
 
-                # 抓取資料 - 調整選擇器確保抓到所有商品
-                items = page.locator(".listGoodsData").all()
-                if not items: items = page.locator(".goodsUrl").all()
-                if not items: items = page.locator("li.goodsItemLi").all()
-                if not items: items = page.locator(".EachGood").all()
-                if not items: items = page.locator("#CategoryContent li").all()
+                # 抓取資料 - 依序嘗試多個卡片選擇器，一次 evaluate 取回整頁卡片的標題 / 價格 / 連結 / 圖片
+                items = extract_first_sync(page, MOMO_CARD_ROOTS, MOMO_CARD_FIELDS, label="momo_listing")
 
                 print(f"📦 MOMO 第 {page_num} 頁找到 {len(items)} 個商品...")
 
                 for item in items:
                     if count >= limit: break
                     try:
-                        title = item.locator(".prdName").first.inner_text()
                         # 清洗標題中的逗號和換行符，避免 CSV 錯位
-                        title = title.replace(",", " ").replace("\n", " ")
+                        title = item["title"].replace(",", " ")
                         print(f"   [進度] 正在解析第 {count+1}/{limit} 筆：{title[:10]}...", end="\r")
 
-                        price_text = item.locator(".price, .money").first.inner_text()
-                        price = int(re.sub(r'[^\d]', '', price_text))
+                        price = int(re.sub(r'[^\d]', '', item["price_text"]))
 
-                        link = item.get_attribute("href") or item.locator("a").first.get_attribute("href")
-                        if link and not link.startswith("http"): link = "https://www.momoshop.com.tw" + link
+                        link = momo_link(item["link"])
 
                         # 進入內頁抓取詳細資訊 - 使用新分頁避免影響列表頁
                         # 增加 try-except 捕捉特定的超時錯誤，確保某一筆資料失敗不影響整體抓取
@@ -390,17 +417,7 @@ def scrape_momo(keyword, limit=100):
                                         pass
 
                         # 圖片抓取
-                        image_url = None
-                        imgs = item.locator("img").all()
-                        for img in imgs:
-                            src = img.get_attribute("data-original") or img.get_attribute("src")
-                            # 過濾無效圖片
-                            if src and "ecm" not in src and "icon" not in src:
-                                if "goodsimg" in src or "i1.momoshop" in src:
-                                    image_url = src
-                                    break
-                                if not image_url and "dummy" not in src and "data:image" not in src:
-                                    image_url = src
+                        image_url = pick_momo_image(item["images"])
 
                         if not image_url: 
                             image_url = "https://dummyimage.com/200x200/cccccc/ffffff.png&text=MOMO+No+Img"
@@ -410,13 +427,9 @@ def scrape_momo(keyword, limit=100):
 
                         # 抓取銷量 - 如果抓不到預設為 0
                         sales_volume = 0
-                        try:
-                            slogan_text = item.locator(".money .slogan").first.inner_text()
-                            match = re.search(r'總銷量\D*(\d+(?:,\d+)*)', slogan_text)  # 放寬 Regex
-                            if match:
-                                sales_volume = int(match.group(1).replace(',', ''))
-                        except:
-                            pass
+                        match = re.search(r'總銷量\D*(\d+(?:,\d+)*)', item["slogan"])  # 放寬 Regex
+                        if match:
+                            sales_volume = int(match.group(1).replace(',', ''))
 
                         # 合併 title 和內頁文字用於 extract_highlights
                         combined_text = title + " " + inner_text
@@ -440,11 +453,9 @@ def scrape_momo(keyword, limit=100):
                         print(f"❌ 商品抓取失敗: {e}")
                         # 即使失敗，也嘗試記錄基本資料 (標題、價格)
                         try:
-                            basic_title = item.locator(".prdName").first.inner_text().replace(",", " ").replace("\n", " ")
-                            basic_price_text = item.locator(".price, .money").first.inner_text()
-                            basic_price = int(re.sub(r'[^\d]', '', basic_price_text))
-                            basic_link = item.get_attribute("href") or item.locator("a").first.get_attribute("href")
-                            if basic_link and not basic_link.startswith("http"): basic_link = "https://www.momoshop.com.tw" + basic_link
+                            basic_title = item["title"].replace(",", " ")
+                            basic_price = int(re.sub(r'[^\d]', '', item["price_text"]))
+                            basic_link = momo_link(item["link"])
 
                             total_count, unit_price = calculate_unit_price(basic_title, basic_price)
 
@@ -469,6 +480,7 @@ def scrape_momo(keyword, limit=100):
             print(f"❌ [MOMO] 錯誤: {e}")
         finally:
             browser.close()
+            print_extract_stats()
 
     return data_list
 
@@ -493,6 +505,7 @@ if __name__ == "__main__":
         if not all_df.empty:
             filename = f"data/{keyword}_data.csv"
             all_df.to_csv(filename, index=False, encoding="utf-8-sig")
+            record_observations(all_df)
             print(f"\n✅ {keyword} 資料存檔完成！")
             print(f"   PChome: {len(df_p)} 筆")
             print(f"   MOMO:   {len(df_m)} 筆")
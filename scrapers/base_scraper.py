@@ -1,11 +1,12 @@
 import asyncio
 import random
-import pandas as pd
 import os
 import re
 from abc import ABC, abstractmethod
 from playwright.async_api import async_playwright
 from playwright_stealth import stealth_async
+from data.price_history import record_observations
+from data.product_record import records_to_frame
 
 class BaseScraper(ABC):
     """
@@ -34,24 +35,13 @@ class BaseScraper(ABC):
         # 確保目錄存在
         os.makedirs(os.path.dirname(self.output_file), exist_ok=True)
         
-        df = pd.DataFrame(self.data)
-        
-        # 嚴格遵守 README.md 定義的 Schema
-        required_columns = [
-            "source", "brand", "title", "price", "unit_price", 
-            "url", "image_url", "product_highlights", "total_count", "tags"
-        ]
-        
-        # 補全缺失欄位
-        for col in required_columns:
-            if col not in df.columns:
-                df[col] = "" 
-                
-        # 重新排序欄位
-        df = df.reindex(columns=required_columns)
+        # 嚴格遵守 README.md 定義的 Schema (欄位順序、型別由 ProductRecord 統一處理，舊 tags 併入亮點)
+        df = records_to_frame(self.data)
         
         df.to_csv(self.output_file, index=False, encoding='utf-8-sig')
         print(f"💾 [{self.__class__.__name__}] 資料已儲存至: {self.output_file} (共 {len(df)} 筆)")
+        # CSV 每次覆寫，價格另外追加到價格歷史
+        record_observations(df)
 
     @abstractmethod
     async def run(self):
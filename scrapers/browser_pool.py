@@ -0,0 +1,211 @@
+import asyncio
+import contextlib
+import os
+import resource
+import time
+from collections import defaultdict
+
+from playwright.async_api import async_playwright
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# 每個同時作業的頁面 (page slot) 預估記憶體用量 (MB)，Chromium renderer 約 200~400MB
+PAGE_SLOT_MB = int(os.environ.get("D2C_PAGE_SLOT_MB", "350"))
+# 記憶體預算 (MB)，0 表示自動取可用記憶體的 60%
+MEMORY_BUDGET_MB = int(os.environ.get("D2C_MEMORY_BUDGET_MB", "0"))
+# 每個 CPU 核心允許的同時頁面數
+PAGES_PER_CORE = int(os.environ.get("D2C_PAGES_PER_CORE", "2"))
+RSS_SAMPLE_INTERVAL = 1.0
+
+
+def _available_memory_mb():
+    if psutil is not None:
+        return psutil.virtual_memory().available / 1024 / 1024
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (ValueError, OSError, AttributeError):
+        return 4096
+
+
+def compute_slot_budget(memory_budget_mb=None, page_slot_mb=PAGE_SLOT_MB, cpu_count=None):
+    """依記憶體與 CPU 預算計算同時可開的頁面數 (取兩者較小者，至少 1)。"""
+    memory_budget_mb = memory_budget_mb or MEMORY_BUDGET_MB or _available_memory_mb() * 0.6
+    cpu_count = cpu_count or os.cpu_count() or 1
+    by_memory = int(memory_budget_mb // max(page_slot_mb, 1))
+    by_cpu = cpu_count * PAGES_PER_CORE
+    return max(1, min(by_memory, by_cpu))
+
+
+class FairSlotScheduler:
+    """
+    公平分配配額。
+    全域同時占用數不超過 total_slots，且每個爬蟲最多占用 total_slots / 活躍爬蟲數，
+    避免單一大型品牌獨占瀏覽器；爬蟲結束後其配額自動釋放給其他爬蟲。
+    SharedBrowser 用兩個實例：slot (同時作業中的頁面載入) 與 pages (開著的 Context/Page，含閒置者)。
+    """
+
+    def __init__(self, total_slots):
+        self.total_slots = total_slots
+        self._active = defaultdict(int)
+        self._owners = set()
+        self._cond = asyncio.Condition()
+
+    def fair_share(self):
+        return max(1, self.total_slots // max(1, len(self._owners)))
+
+    async def register(self, owner):
+        async with self._cond:
+            self._owners.add(owner)
+
+    async def unregister(self, owner):
+        async with self._cond:
+            self._owners.discard(owner)
+            self._cond.notify_all()
+
+    def _can_acquire(self, owner):
+        return sum(self._active.values()) < self.total_slots and self._active[owner] < self.fair_share()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, owner):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._can_acquire(owner))
+            self._active[owner] += 1
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._active[owner] -= 1
+                self._cond.notify_all()
+
+
+class SharedBrowser:
+    """
+    多個 D2C 爬蟲共用的單一 Chromium (由 d2c_main 持有)。
+    - 各爬蟲以 new_context() 取得獨立 Context (Cookie/身份隔離)，不再各自啟動瀏覽器
+    - 記憶體上限：開著 Context/Page 期間需持有 page(owner) 配額 (閒置的頁面也算)，開著的頁面數不超過預算
+    - 以 slot(owner) 控制同時作業 (載入中) 的頁面數；兩者預算皆依記憶體/CPU 計算並公平分配
+      取用順序固定為先 page 後 slot，避免互相等待
+    - 背景取樣整體 RSS (Python + Chromium 子行程)，結束時回報峰值與各爬蟲耗時
+    """
+
+    def __init__(self, headless=True, total_slots=None):
+        self.headless = headless
+        total_slots = total_slots or compute_slot_budget()
+        self.scheduler = FairSlotScheduler(total_slots)
+        self.pages = FairSlotScheduler(total_slots)
+        self.browser = None
+        self._playwright = None
+        self._sampler = None
+        self.peak_rss_mb = 0.0
+        self.wall_times = {}
+        self.errors = {}
+
+    async def __aenter__(self):
+        self._playwright = await async_playwright().start()
+        try:
+            self.browser = await self._playwright.chromium.launch(headless=self.headless)
+        except Exception:
+            await self._playwright.stop()
+            raise
+        self._sampler = asyncio.create_task(self._sample_rss())
+        print(f"🧠 [BrowserPool] 共用瀏覽器已啟動，同時頁面配額: {self.scheduler.total_slots} (開啟頁面上限 {self.pages.total_slots})")
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self._sampler:
+            self._sampler.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._sampler
+        self._record_rss()
+        if self.browser:
+            await self.browser.close()
+        if self._playwright:
+            await self._playwright.stop()
+
+    # ------------------------------------------
+    # 資源監控
+    # ------------------------------------------
+    def _current_rss_mb(self):
+        if psutil is None:
+            # 無 psutil 時只能取得 Python 行程自身的峰值 (Linux 單位為 KB)
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        proc = psutil.Process(os.getpid())
+        total = proc.memory_info().rss
+        for child in proc.children(recursive=True):
+            with contextlib.suppress(psutil.Error):
+                total += child.memory_info().rss
+        return total / 1024 / 1024
+
+    def _record_rss(self):
+        with contextlib.suppress(Exception):
+            self.peak_rss_mb = max(self.peak_rss_mb, self._current_rss_mb())
+
+    async def _sample_rss(self):
+        while True:
+            self._record_rss()
+            await asyncio.sleep(RSS_SAMPLE_INTERVAL)
+
+    # ------------------------------------------
+    # 爬蟲介面
+    # ------------------------------------------
+    async def new_context(self, **kwargs):
+        return await self.browser.new_context(**kwargs)
+
+    def slot(self, owner):
+        return self.scheduler.slot(owner)
+
+    def page(self, owner):
+        return self.pages.slot(owner)
+
+    async def run(self, name, crawler_fn):
+        """執行單一爬蟲 crawler_fn(pool)，記錄耗時；單一爬蟲失敗不影響其他爬蟲。"""
+        await self.scheduler.register(name)
+        await self.pages.register(name)
+        start = time.time()
+        try:
+            return await crawler_fn(self)
+        except Exception as e:
+            self.errors[name] = repr(e)
+            print(f"❌ [BrowserPool] {name} 執行失敗: {e}")
+        finally:
+            self.wall_times[name] = time.time() - start
+            await self.scheduler.unregister(name)
+            await self.pages.unregister(name)
+
+    def print_report(self):
+        print("\n📊 [BrowserPool] 資源使用報告")
+        print(f"   - 同時頁面配額: {self.scheduler.total_slots} / 開啟頁面上限: {self.pages.total_slots}")
+        print(f"   - 峰值 RSS: {self.peak_rss_mb:.0f} MB" + ("" if psutil else " (未安裝 psutil，僅含 Python 行程)"))
+        for name, sec in sorted(self.wall_times.items(), key=lambda kv: -kv[1]):
+            status = f"❌ {self.errors[name]}" if name in self.errors else "✅"
+            print(f"   - {name}: {sec:.1f} 秒 {status}")
+
+
+@contextlib.asynccontextmanager
+async def acquire_browser(pool=None, headless=True):
+    """有共用 pool 時借用其瀏覽器 (不負責關閉)；單獨執行爬蟲腳本時自行啟動一個。"""
+    if pool is not None:
+        yield pool.browser
+        return
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=headless)
+        try:
+            yield browser
+        finally:
+            await browser.close()
+
+
+def page_slot(pool, owner):
+    """取得頁面配額 (同時作業數)；無 pool (單獨執行) 時不限制。"""
+    return pool.slot(owner) if pool is not None else contextlib.nullcontext()
+
+
+def page_budget(pool, owner):
+    """
+    取得開啟頁面配額：在開啟 Context/Page 之前取得、關閉之後才釋放 (閒置的頁面同樣占用記憶體)。
+    需同時持有 page_slot 時先取 page_budget；無 pool (單獨執行) 時不限制。
+    """
+    return pool.page(owner) if pool is not None else contextlib.nullcontext()
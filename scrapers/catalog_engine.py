@@ -0,0 +1,464 @@
+import asyncio
+import json
+import os
+import re
+import time
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+from playwright_stealth import stealth_async
+
+from data.price_history import record_observations
+from data.product_record import records_to_frame
+from scrapers.base_scraper import BaseScraper
+from scrapers.browser_pool import acquire_browser, page_budget, page_slot
+from scrapers.rate_limiter import HostRateLimiter
+
+# ==========================================
+# 品牌設定檔預設值 (各品牌只需覆寫差異)
+# ==========================================
+DEFAULT_CATALOG_CONFIG = {
+    # --- 基本資料 ---
+    "source": "",                     # 例如 "Daiken"
+    "brand": "",                      # 例如 "大研生醫"
+    "output_file": "",                # 例如 "data/d2c_daiken_all_products.csv"
+    "base_url": "",
+    # --- 列表頁 ---
+    "list_urls": [],                  # 列表頁 (可多頁)
+    "direct_links": [],               # 直接指定的詳情頁 (不需列表頁時使用)
+    "link_pattern": None,             # 詳情頁連結的 regex，例如 r"product\.php\?code="
+    "same_site_only": True,           # 只保留 base_url 網域下的連結
+    "list_scroll_times": 3,
+    # --- 詳情頁 ---
+    "ready_selectors": ["h1"],        # DOM 就緒後依序等待的關鍵元素
+    "ready_timeout_ms": 10000,        # 關鍵元素等待上限 (實際上限依觀察值自動調整)
+    "cookie_button": None,            # 例如 'text="同意"'
+    "title_selector": "h1",
+    "price_strategies": ["anchor"],   # 依序嘗試: anchor / jsonld / meta / text
+    "price_anchors": [],              # anchor 策略使用的價格標示文字，例如 ["優惠價"]
+    "price_floor": 0,                 # 價格 <= price_floor 視為無效 (加購價、運費)
+    "description_selectors": [],
+    "block_markers": ["403", "Forbidden", "Access Denied"],
+    # --- 規格與亮點 (品牌可提供自己的規則) ---
+    "calculate_unit_price": None,     # fn(title, price, description) -> (total_count, unit_price)
+    "extract_tags": None,             # fn(text) -> str
+    "enrich": None,                   # async fn(html, item) -> item，例如 AI 亮點分析 (不占用頁面配額)
+    # --- 執行核心 ---
+    "headless": True,
+    "workers": 3,
+    "max_rps": 0.5,                   # 對該網域的請求速率上限 (次/秒)
+    "max_retries": 2,
+    "rotate_after_failures": 2,       # 連續失敗幾次更換 Context (身份)
+    "block_cooldown_seconds": 30,
+    "blocked_resources": ["image", "media", "font"],  # 詳情頁不下載的資源類型 (圖片改取 og:image)
+    "checkpoint_every": 1,            # 每抓到幾筆寫入一次中途存檔
+    "debug_screenshot": None,         # 失敗時的截圖路徑 (除錯用)
+    "user_agent": 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36',
+}
+
+NUMBER_RE = re.compile(r'\d[\d,]*')
+
+
+class BlockedError(Exception):
+    """偵測到封鎖頁面 (403 / Access Denied) 或 429。"""
+
+
+class AdaptiveWait:
+    """
+    依實際觀察到的關鍵元素出現時間 (EWMA) 調整等待上限。
+    網站快時不必每頁都等滿 10 秒才放棄，網站變慢時上限自動放寬 (不超過 ceiling)。
+    """
+
+    def __init__(self, ceiling_ms, floor_ms=3000, factor=3.0, alpha=0.3):
+        self.ceiling_ms = ceiling_ms
+        self.floor_ms = min(floor_ms, ceiling_ms)
+        self.factor = factor
+        self.alpha = alpha
+        self.ewma_ms = None
+
+    def timeout_ms(self):
+        if self.ewma_ms is None:
+            return self.ceiling_ms
+        return int(min(self.ceiling_ms, max(self.floor_ms, self.ewma_ms * self.factor)))
+
+    def observe(self, elapsed_ms):
+        self.ewma_ms = elapsed_ms if self.ewma_ms is None else self.alpha * elapsed_ms + (1 - self.alpha) * self.ewma_ms
+
+
+# ==========================================
+# 價格策略
+# ==========================================
+def _first_number(text):
+    match = NUMBER_RE.search(text or "")
+    return int(match.group().replace(',', '')) if match else 0
+
+
+def _price_from_anchor(soup, config):
+    for anchor in config["price_anchors"]:
+        tag = soup.find(string=re.compile(anchor))
+        if tag:
+            value = _first_number(tag.parent.get_text())
+            if value:
+                return value
+    return 0
+
+
+def _jsonld_product(soup):
+    for script in soup.find_all('script', type='application/ld+json'):
+        try:
+            data = json.loads(script.string or "")
+        except (TypeError, ValueError):
+            continue
+        for node in (data if isinstance(data, list) else [data]):
+            if isinstance(node, dict) and node.get('@type') == 'Product':
+                return node
+    return None
+
+
+def _price_from_jsonld(soup, config):
+    product = _jsonld_product(soup)
+    if not product:
+        return 0
+    offers = product.get('offers', {})
+    if isinstance(offers, list):
+        offers = offers[0] if offers else {}
+    try:
+        return int(float(offers.get('price') or 0))
+    except (TypeError, ValueError, AttributeError):
+        return 0
+
+
+def _price_from_meta(soup, config):
+    meta = soup.find("meta", property="product:price:amount") or soup.find("meta", property="og:price:amount")
+    try:
+        return int(float(meta["content"])) if meta and meta.get("content") else 0
+    except (TypeError, ValueError):
+        return 0
+
+
+def _price_from_text(soup, config):
+    """內文正則搜索 (最後手段)：取高於 price_floor 的最低價作為特價。"""
+    values = []
+    for m in re.findall(r'(?:NT\$?|\$)\s*(\d{1,3}(?:,\d{3})*|\d+)', soup.get_text(), re.IGNORECASE):
+        value = int(m.replace(',', ''))
+        if value > config["price_floor"]:
+            values.append(value)
+    return min(values) if values else 0
+
+
+PRICE_STRATEGIES = {
+    "anchor": _price_from_anchor,
+    "jsonld": _price_from_jsonld,
+    "meta": _price_from_meta,
+    "text": _price_from_text,
+}
+
+
+def parse_catalog_detail(html, link, config):
+    """
+    依品牌設定解析詳情頁 HTML，回傳 Unified Schema dict；封鎖頁面則拋出 BlockedError。
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+
+    title_tag = soup.select_one(config["title_selector"])
+    name = title_tag.get_text(strip=True) if title_tag else ""
+    if any(marker in name for marker in config["block_markers"]):
+        raise BlockedError(f"偵測到封鎖頁面 (Title: {name})")
+    if not name:
+        product = _jsonld_product(soup)
+        name = (product or {}).get('name') or "Unknown"
+
+    price = 0
+    for strategy in config["price_strategies"]:
+        price = PRICE_STRATEGIES[strategy](soup, config)
+        if price:
+            break
+    if price <= config["price_floor"]:
+        price = 0
+
+    image_url = ""
+    og_img = soup.find("meta", property="og:image")
+    if og_img and og_img.get("content"):
+        image_url = urljoin(config["base_url"] or link, og_img["content"])
+
+    desc_text = ""
+    for selector in config["description_selectors"]:
+        for el in soup.select(selector):
+            desc_text += el.get_text(" ", strip=True) + " "
+
+    full_text_for_analysis = name + " " + desc_text
+    extract_tags = config["extract_tags"]
+    calculate_unit_price = config["calculate_unit_price"]
+    tags = extract_tags(full_text_for_analysis) if extract_tags else ""
+    total_count, unit_price = calculate_unit_price(name, price, desc_text) if calculate_unit_price else (None, 0)
+
+    return {
+        "source": config["source"],
+        "brand": config["brand"],
+        "title": name,
+        "price": price,
+        "unit_price": unit_price,
+        "total_count": total_count,
+        "url": link,
+        "image_url": image_url,
+        "product_highlights": tags,
+    }
+
+
+class CatalogScraper(BaseScraper):
+    """
+    設定檔驅動的 D2C 商品目錄爬蟲 (列表頁 → 連結 → 詳情頁 → CSV)。
+    所有品牌共用同一個執行核心：
+    - K 個 worker 從共用佇列並行抓詳情，網域速率受 HostRateLimiter 限制
+    - 依失敗訊號 (封鎖 / 連續失敗) 更換 Context，而非固定筆數
+    - 詳情頁攔截圖片/字型等資源，DOM 就緒後只等關鍵元素 (等待上限自動調整)
+    - 每筆結果即時寫入 .partial.jsonl，中斷後重跑會跳過已完成的連結
+    新增品牌只需撰寫設定檔 (見 DEFAULT_CATALOG_CONFIG)。
+    """
+
+    def __init__(self, config, pool=None, workers=None, max_rps=None):
+        self.config = {**DEFAULT_CATALOG_CONFIG, **config}
+        super().__init__(self.config["output_file"])
+        self.name = self.config["source"] or self.__class__.__name__
+        self.pool = pool
+        self.workers = workers or self.config["workers"]
+        self.limiter = HostRateLimiter(max_rps or self.config["max_rps"])
+        self.waiter = AdaptiveWait(self.config["ready_timeout_ms"])
+        self.checkpoint_file = os.path.splitext(self.output_file)[0] + ".partial.jsonl"
+        self.results = {}
+        self.stats = {"ok": 0, "failed": 0, "blocked": 0, "resumed": 0}
+
+    # ------------------------------------------
+    # 中途存檔 (incremental persistence)
+    # ------------------------------------------
+    def _load_checkpoint(self):
+        done = {}
+        if not os.path.exists(self.checkpoint_file):
+            return done
+        with open(self.checkpoint_file, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    item = json.loads(line)
+                    done[item["url"]] = item
+                except (ValueError, KeyError):
+                    continue
+        return done
+
+    def _append_checkpoint(self, items):
+        os.makedirs(os.path.dirname(self.checkpoint_file) or ".", exist_ok=True)
+        with open(self.checkpoint_file, "a", encoding='utf-8') as f:
+            for item in items:
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+    # ------------------------------------------
+    # 瀏覽器工具
+    # ------------------------------------------
+    async def _new_stealth_page(self, browser, block_resources=True):
+        context = await browser.new_context(viewport={'width': 1920, 'height': 1080}, user_agent=self.config["user_agent"])
+        blocked = set(self.config["blocked_resources"] or ())
+        if block_resources and blocked:
+            async def _route(route):
+                if route.request.resource_type in blocked:
+                    await route.abort()
+                else:
+                    await route.continue_()
+            await context.route("**/*", _route)
+        page = await context.new_page()
+        await stealth_async(page) # 啟用隱身
+        return context, page
+
+    async def _accept_cookie(self, page, timeout=2000):
+        selector = self.config["cookie_button"]
+        if not selector:
+            return False
+        try:
+            if await page.locator(selector).count() > 0:
+                await page.locator(selector).first.click(timeout=timeout)
+                return True
+        except Exception:
+            pass
+        return False
+
+    async def _wait_ready(self, page, tag):
+        for selector in self.config["ready_selectors"]:
+            start = time.time()
+            try:
+                await page.locator(selector).first.wait_for(state='visible', timeout=self.waiter.timeout_ms())
+                self.waiter.observe((time.time() - start) * 1000)
+            except Exception:
+                print(f"{tag} 等待 {selector} 超時，嘗試直接解析...")
+
+    # ------------------------------------------
+    # 步驟 1: 列表頁 → 連結
+    # ------------------------------------------
+    def _match_links(self, html, page_url):
+        pattern = re.compile(self.config["link_pattern"]) if self.config["link_pattern"] else None
+        base_url = self.config["base_url"]
+        links = []
+        for a in BeautifulSoup(html, 'html.parser').find_all('a', href=True):
+            full_link = urljoin(page_url, a['href'])
+            if pattern and not pattern.search(full_link):
+                continue
+            if self.config["same_site_only"] and base_url and base_url not in full_link:
+                continue
+            links.append(full_link)
+        return links
+
+    async def collect_links(self, browser):
+        links = list(self.config["direct_links"])
+        for list_url in self.config["list_urls"]:
+            # 先在 slot 外等待限速，避免睡在限速器上時佔住其他爬蟲共用的頁面 slot
+            await self.limiter.wait(list_url)
+            async with page_budget(self.pool, self.name), page_slot(self.pool, self.name):
+                # 列表頁需要完整渲染 (lazy-load)，不攔截資源
+                context, page = await self._new_stealth_page(browser, block_resources=False)
+                try:
+                    print(f"[{self.name}] 正在前往列表頁: {list_url}")
+                    await page.goto(list_url, wait_until='domcontentloaded', timeout=60000)
+                    await self._accept_cookie(page)
+                    for _ in range(self.config["list_scroll_times"]):
+                        await page.evaluate('window.scrollBy(0, window.innerHeight)')
+                        await asyncio.sleep(1)
+                    html, page_url = await page.content(), page.url
+                except Exception as e:
+                    print(f"❌ [{self.name}] 列表頁載入失敗 {list_url}: {e}")
+                    continue
+                finally:
+                    await context.close()
+            links.extend(self._match_links(html, page_url))
+        # 去重並保留順序
+        return list(dict.fromkeys(links))
+
+    # ------------------------------------------
+    # 步驟 2: 詳情頁 worker
+    # ------------------------------------------
+    async def _fetch_detail(self, page, link, tag):
+        # 限速等待放在 slot 外：slot 只在真正載入頁面時佔用
+        await self.limiter.wait(link)
+        async with page_slot(self.pool, self.name):
+            response = await page.goto(link, wait_until='domcontentloaded', timeout=30000)
+            if response is not None and response.status in (403, 429):
+                raise BlockedError(f"HTTP {response.status}")
+            # 再次檢查 Cookie (有時換頁會重跳)
+            await self._accept_cookie(page)
+            await self._wait_ready(page, tag)
+            return await page.content()
+
+    async def _detail_worker(self, worker_id, browser, queue, total):
+        # 每個 worker 同時最多開一組 Context/Page (換身份時先關再開)，整段期間占用一個開啟頁面配額；
+        # 超出配額的 worker 等到其他 worker 結束才開始，開著的頁面數 (含等待限速的閒置頁面) 不超過預算
+        async with page_budget(self.pool, self.name):
+            await self._detail_loop(worker_id, browser, queue, total)
+
+    async def _detail_loop(self, worker_id, browser, queue, total):
+        context, page = None, None
+        consecutive_failures = 0
+        pending_checkpoint = []
+        try:
+            while True:
+                try:
+                    index, link, attempt = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+
+                if context is None:
+                    context, page = await self._new_stealth_page(browser)
+
+                tag = f"[{self.name}][W{worker_id}][{index + 1}/{total}]"
+                print(f"{tag} 正在{'重試' if attempt else '處理'}: {link}" + (f" (第 {attempt} 次重試)" if attempt else ""))
+
+                blocked = False
+                try:
+                    html = await self._fetch_detail(page, link, tag)
+                    item = parse_catalog_detail(html, link, self.config)
+                    if self.config["enrich"]:
+                        item = await self.config["enrich"](html, item)
+                    self.results[index] = item
+                    self.stats["ok"] += 1
+                    consecutive_failures = 0
+                    print(f"{tag} 成功抓取: {item['title']} | 特價: {item['price']} | 規格: {item['total_count']} | 亮點: '{str(item['product_highlights'])[:20]}'")
+
+                    pending_checkpoint.append(item)
+                    if len(pending_checkpoint) >= self.config["checkpoint_every"]:
+                        self._append_checkpoint(pending_checkpoint)
+                        pending_checkpoint = []
+                except BlockedError as e:
+                    blocked = True
+                    self.stats["blocked"] += 1
+                    print(f"{tag} 被封鎖或 403 錯誤: {e}")
+                except Exception as e:
+                    consecutive_failures += 1
+                    print(f"{tag} 抓取失敗 {link}: {e}")
+                    if self.config["debug_screenshot"]:
+                        try:
+                            await page.screenshot(path=self.config["debug_screenshot"])
+                        except Exception:
+                            pass
+
+                if blocked or consecutive_failures >= self.config["rotate_after_failures"]:
+                    # 封鎖時整個網域一起冷卻，並更換身份
+                    if blocked:
+                        print(f"{tag} 啟動冷卻機制：網域暫停 {self.config['block_cooldown_seconds']} 秒並更換瀏覽器環境...")
+                        self.limiter.penalize(link, self.config["block_cooldown_seconds"])
+                    await context.close()
+                    context, page = None, None
+                    consecutive_failures = 0
+
+                if index not in self.results:
+                    if attempt < self.config["max_retries"]:
+                        queue.put_nowait((index, link, attempt + 1))
+                    else:
+                        self.stats["failed"] += 1
+                        print(f"{tag} 放棄此連結 {link}，已達最大重試次數。")
+        finally:
+            if pending_checkpoint:
+                self._append_checkpoint(pending_checkpoint)
+            if context:
+                await context.close()
+
+    async def run(self):
+        start_time = time.time()
+        done = self._load_checkpoint()
+
+        async with acquire_browser(self.pool, headless=self.config["headless"]) as browser:
+            links = await self.collect_links(browser)
+            print(f"[{self.name}] 共發現 {len(links)} 個不重複的產品連結。")
+
+            queue = asyncio.Queue()
+            for i, link in enumerate(links):
+                if link in done:
+                    self.results[i] = done[link]
+                    self.stats["resumed"] += 1
+                else:
+                    queue.put_nowait((i, link, 0))
+            if self.stats["resumed"]:
+                print(f"[{self.name}] 從中途存檔恢復 {self.stats['resumed']} 筆，略過不重抓。")
+
+            n_workers = max(1, min(self.workers, queue.qsize()))
+            if not queue.empty():
+                print(f"[{self.name}] 啟動 {n_workers} 個 worker (網域速率上限 {1 / self.limiter.min_interval if self.limiter.min_interval else '∞'} 次/秒)...")
+                await asyncio.gather(*(
+                    self._detail_worker(w + 1, browser, queue, len(links))
+                    for w in range(n_workers)
+                ))
+
+        # 依原連結順序輸出，結果不受 worker 完成順序影響
+        self.data = [self.results[i] for i in sorted(self.results)]
+        print(
+            f"📊 [{self.name}] 詳情抓取完成：成功 {self.stats['ok']} / 恢復 {self.stats['resumed']} / "
+            f"失敗 {self.stats['failed']} / 封鎖 {self.stats['blocked']} 次，耗時 {time.time() - start_time:.1f} 秒"
+        )
+        return self.data
+
+    def save_to_csv(self):
+        """寫出 Unified Schema CSV，成功後移除中途存檔。"""
+        if not self.data:
+            print(f"⚠️ [{self.name}] 未抓取到資料，跳過存檔。")
+            return
+        os.makedirs(os.path.dirname(self.output_file) or ".", exist_ok=True)
+        df = records_to_frame(self.data)
+        df.to_csv(self.output_file, index=False, encoding='utf-8-sig')
+        if os.path.exists(self.checkpoint_file):
+            os.remove(self.checkpoint_file)
+        print(f"💾 [{self.name}] 資料已儲存至: {self.output_file} (共 {len(df)} 筆)")
+        record_observations(df)
@@ -0,0 +1,197 @@
+import time
+from collections import defaultdict
+
+# ==========================================
+# 一次 page.evaluate 批次抽取 DOM 資料
+# ==========================================
+# 欄位規格 (field spec) 範例：
+#   {
+#       "title": {"selector": "h3, h4, .title"},                       # 預設讀 textContent
+#       "price": {"selector": [".price, .money", {"css": "span", "contains": "NT$"}],
+#                 "search_parent": True, "post": parse_int},            # 卡片內找不到時往上一層找
+#       "url":   {"selector": "a", "include_self": True, "attr": "href"},
+#       "image": {"selector": "img", "attr": ["src", "data-src"]},     # 依序取第一個非空屬性
+#       "text":  {},                                                    # 不給 selector 表示節點本身
+#       "imgs":  {"selector": "img", "attr": ["data-original", "src"], "all": True},  # 所有符合元素的值 (list)
+#   }
+# selector 可為 CSS 字串，或 {"css", "contains"} 清單 (contains 等同 Playwright 的 :has-text)。
+# post 為 Python 端的後處理函式；找不到元素時回傳 default (預設 None)。
+
+_EXTRACT_JS = """
+(groups) => {
+    const matchesAlt = (el, alt) => el.matches(alt.css) && (!alt.contains || (el.textContent || '').includes(alt.contains));
+    const findIn = (node, spec) => {
+        if (!spec.selector) return node;
+        const alts = spec.selector;
+        if (spec.include_self && alts.some(a => matchesAlt(node, a))) return node;
+        const css = alts.map(a => a.css).join(',');
+        const scopes = spec.search_parent && node.parentElement ? [node, node.parentElement] : [node];
+        for (const scope of scopes) {
+            for (const el of scope.querySelectorAll(css)) {
+                if (alts.some(a => matchesAlt(el, a))) return el;
+            }
+        }
+        return null;
+    };
+    const findAll = (node, spec) => {
+        const alts = spec.selector;
+        const css = alts.map(a => a.css).join(',');
+        return [...node.querySelectorAll(css)].filter(el => alts.some(a => matchesAlt(el, a)));
+    };
+    const read = (el, attrs) => {
+        for (const a of attrs) {
+            const v = a === 'text' ? el.textContent : (a === 'html' ? el.innerHTML : el.getAttribute(a));
+            if (v) return v;
+        }
+        return null;
+    };
+    const visible = (el) => {
+        const r = el.getBoundingClientRect();
+        return r.width > 0 && r.height > 0 && getComputedStyle(el).visibility !== 'hidden';
+    };
+    return groups.map(g => {
+        const rows = [];
+        for (const node of document.querySelectorAll(g.root)) {
+            if (g.visible_only && !visible(node)) continue;
+            const row = {};
+            for (const [name, spec] of Object.entries(g.fields)) {
+                if (spec.all) {
+                    row[name] = spec.selector ? findAll(node, spec).map(el => read(el, spec.attrs)) : [];
+                    continue;
+                }
+                const el = findIn(node, spec);
+                row[name] = el ? read(el, spec.attrs) : null;
+            }
+            rows.push(row);
+            if (g.limit && rows.length >= g.limit) break;
+        }
+        return rows;
+    });
+}
+"""
+
+# label -> {"calls", "nodes", "ms"}，供爬蟲結束時回報抽取耗時
+EXTRACT_STATS = defaultdict(lambda: {"calls": 0, "nodes": 0, "ms": 0.0})
+
+
+def _normalize_selector(selector):
+    if not selector:
+        return None
+    if isinstance(selector, (str, dict)):
+        selector = [selector]
+    return [{"css": s} if isinstance(s, str) else {"css": s["css"], "contains": s.get("contains")} for s in selector]
+
+
+def _normalize_fields(fields):
+    js_fields = {}
+    for name, spec in fields.items():
+        attrs = spec.get("attr", "text")
+        js_fields[name] = {
+            "selector": _normalize_selector(spec.get("selector")),
+            "attrs": [attrs] if isinstance(attrs, str) else list(attrs),
+            "include_self": bool(spec.get("include_self")),
+            "search_parent": bool(spec.get("search_parent")),
+            "all": bool(spec.get("all")),
+        }
+    return js_fields
+
+
+def _post_process(rows, fields):
+    for row in rows:
+        for name, spec in fields.items():
+            value = row.get(name)
+            if spec.get("all"):
+                # 多值欄位：去除空值後逐一後處理
+                values = [v.strip() for v in value or [] if isinstance(v, str) and v.strip()]
+                row[name] = [spec["post"](v) for v in values] if spec.get("post") else values
+                continue
+            if isinstance(value, str):
+                value = value.strip()
+            if value in (None, ""):
+                row[name] = spec.get("default")
+            elif spec.get("post"):
+                row[name] = spec["post"](value)
+            else:
+                row[name] = value
+    return rows
+
+
+def _payload(groups):
+    return [
+        {
+            "root": g["root"],
+            "fields": _normalize_fields(g["fields"]),
+            "limit": g.get("limit") or 0,
+            "visible_only": bool(g.get("visible_only")),
+        }
+        for g in groups
+    ]
+
+
+def record_extract(label, nodes, elapsed_ms):
+    """累計抽取耗時；逐元素 locator 的舊路徑 (基準比較用) 也以此記錄。"""
+    stat = EXTRACT_STATS[label]
+    stat["calls"] += 1
+    stat["nodes"] += nodes
+    stat["ms"] += elapsed_ms
+
+
+def _finish(raw, groups, label, elapsed_ms):
+    results = [_post_process(rows, g["fields"]) for rows, g in zip(raw, groups)]
+    if label:
+        record_extract(label, sum(len(r) for r in results), elapsed_ms)
+    return results
+
+
+async def extract_groups(page, groups, label=None):
+    """
+    一次 page.evaluate 抽取多組節點。
+    groups: [{"root": css, "fields": spec, "limit": N, "visible_only": bool}, ...]
+    回傳與 groups 等長的 list[list[dict]]。
+    """
+    start = time.perf_counter()
+    raw = await page.evaluate(_EXTRACT_JS, _payload(groups))
+    return _finish(raw, groups, label, (time.perf_counter() - start) * 1000)
+
+
+async def extract_all(page, root, fields, limit=None, visible_only=False, label=None):
+    """對所有符合 root 的節點套用欄位規格，回傳 list[dict] (單次 IPC)。"""
+    groups = await extract_groups(page, [{"root": root, "fields": fields, "limit": limit, "visible_only": visible_only}], label=label)
+    return groups[0]
+
+
+def extract_groups_sync(page, groups, label=None):
+    """extract_groups 的同步版 (playwright.sync_api 的爬蟲使用)。"""
+    start = time.perf_counter()
+    raw = page.evaluate(_EXTRACT_JS, _payload(groups))
+    return _finish(raw, groups, label, (time.perf_counter() - start) * 1000)
+
+
+def extract_all_sync(page, root, fields, limit=None, visible_only=False, label=None):
+    """extract_all 的同步版。"""
+    groups = extract_groups_sync(page, [{"root": root, "fields": fields, "limit": limit, "visible_only": visible_only}], label=label)
+    return groups[0]
+
+
+def extract_first_sync(page, roots, fields, limit=None, label=None):
+    """依序嘗試多個 root selector (單次 IPC)，回傳第一個有節點的結果；都沒有時回傳 []。"""
+    groups = extract_groups_sync(page, [{"root": root, "fields": fields, "limit": limit} for root in roots], label=label)
+    return next((rows for rows in groups if rows), [])
+
+
+def print_extract_stats():
+    for label, stat in EXTRACT_STATS.items():
+        if stat["calls"]:
+            print(f"⏱️ [DomExtract] {label}: {stat['calls']} 次 evaluate / {stat['nodes']} 個節點 / "
+                  f"共 {stat['ms']:.0f} ms (平均每頁 {stat['ms'] / stat['calls']:.0f} ms)")
+
+
+def parse_int(text):
+    """去除 NT$、逗號、空白等非數字字元。"""
+    return int(''.join(filter(str.isdigit, text)) or 0)
+
+
+def absolute_image_url(src):
+    if src.startswith("//"):
+        return f"https:{src}"
+    return src if src.startswith("http") else ""
@@ -0,0 +1,38 @@
+import asyncio
+import random
+import time
+from urllib.parse import urlparse
+
+
+class HostRateLimiter:
+    """
+    每個網域 (host) 的請求速率上限，供多個 worker 共用。
+    - 同一 host 兩次請求至少間隔 1 / max_rps 秒 (另加少量隨機抖動，避免固定節奏)
+    - penalize(): 偵測到封鎖/429 時讓整個 host 暫停一段時間，所有 worker 一起冷卻
+    """
+
+    def __init__(self, max_rps=0.5, jitter=0.3):
+        self.min_interval = 1.0 / max_rps if max_rps and max_rps > 0 else 0.0
+        self.jitter = jitter
+        self._next_allowed = {}
+        self._locks = {}
+
+    @staticmethod
+    def host_of(url):
+        return urlparse(url).netloc.lower()
+
+    async def wait(self, url):
+        """等到該 host 允許下一次請求為止。"""
+        host = self.host_of(url)
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            now = time.monotonic()
+            delay = self._next_allowed.get(host, now) - now
+            if delay > 0:
+                await asyncio.sleep(delay)
+            interval = self.min_interval * (1 + random.uniform(0, self.jitter))
+            self._next_allowed[host] = time.monotonic() + interval
+
+    def penalize(self, url, seconds):
+        host = self.host_of(url)
+        self._next_allowed[host] = max(self._next_allowed.get(host, 0), time.monotonic() + seconds)
@@ -0,0 +1,234 @@
+import asyncio
+import re
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+# 只解析這些類型的回應 (商品列表 API 皆為 XHR/fetch JSON)
+CAPTURE_RESOURCE_TYPES = ("xhr", "fetch")
+# 商品列表 API 網址特徵 (Shopline: /api/merchants/.../products、/products.json 等)
+PRODUCT_API_RE = re.compile(r"product", re.IGNORECASE)
+PREFERRED_LOCALES = ("zh-hant", "zh-TW", "zh_tw", "zh-tw", "zh", "en")
+# 過濾非保健食品 (盤子、提袋等)
+EXCLUDE_KEYWORDS = ["瓷盤", "禮袋", "提袋", "購物袋"]
+
+
+def _translated(value):
+    """Shopline 的 *_translations 欄位為 {locale: text}，優先取繁體中文。"""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, list):
+        return " ".join(t for t in (_translated(v) for v in value) if t)
+    if isinstance(value, dict):
+        for locale in PREFERRED_LOCALES:
+            if value.get(locale):
+                return _translated(value[locale])
+        for v in value.values():
+            text = _translated(v)
+            if text:
+                return text
+    return ""
+
+
+def _money(value):
+    """價格欄位可能是數字、字串 ("1280.00") 或 Shopline 的 {"dollars": 1280, "label": "NT$1,280"}。"""
+    if isinstance(value, dict):
+        if value.get("dollars") is not None:
+            value = value["dollars"]
+        elif value.get("cents") is not None:
+            value = value["cents"] / 100
+        else:
+            value = value.get("label") or value.get("amount") or 0
+    if isinstance(value, str):
+        digits = re.sub(r"[^\d.]", "", value)
+        value = float(digits) if digits else 0
+    try:
+        return int(float(value or 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _best_price(node):
+    """特價優先，其次原價；皆無則為 0。"""
+    for key in ("price_sale", "sale_price", "price", "compare_at_price"):
+        price = _money(node.get(key))
+        if price > 0:
+            return price
+    return 0
+
+
+def _image_of(product):
+    candidates = []
+    for key in ("cover_media", "featured_image", "image"):
+        if product.get(key):
+            candidates.append(product[key])
+    for key in ("media", "images"):
+        if isinstance(product.get(key), list) and product[key]:
+            candidates.append(product[key][0])
+    for c in candidates:
+        if isinstance(c, str):
+            url = c
+        elif isinstance(c, dict):
+            images = c.get("images") or {}
+            url = (
+                (images.get("original") or {}).get("url")
+                or c.get("src") or c.get("url") or ""
+            )
+        else:
+            url = ""
+        if url:
+            return f"https:{url}" if url.startswith("//") else url
+    return ""
+
+
+def _is_product(node):
+    if not isinstance(node, dict):
+        return False
+    has_title = bool(node.get("title_translations") or isinstance(node.get("title"), str))
+    has_price = any(k in node for k in ("price", "price_sale", "variations", "variants"))
+    return has_title and has_price
+
+
+def iter_product_nodes(payload):
+    """在任意巢狀 JSON 中找出長得像商品的物件 (有標題與價格/規格)。"""
+    stack = [payload]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(reversed(node))
+        elif isinstance(node, dict):
+            if _is_product(node):
+                yield node
+            else:
+                stack.extend(v for v in node.values() if isinstance(v, (dict, list)))
+
+
+def product_to_items(product, base_url, source, brand):
+    """
+    Shopline / Shopify 商品 JSON → Unified Schema dict 清單。
+    多規格且各規格價格不同時 (例如 30粒 / 60粒)，每個規格各輸出一筆，方便前台比較單價。
+    """
+    title = _translated(product.get("title_translations") or product.get("title")).strip()
+    if len(title) < 2 or any(k in title for k in EXCLUDE_KEYWORDS):
+        return []
+
+    slug = product.get("seo_link") or product.get("handle") or product.get("slug") or product.get("id") or product.get("_id")
+    url = product.get("url") or (urljoin(base_url, f"/products/{slug}") if slug else base_url)
+    url = urljoin(base_url, url)
+    image_url = _image_of(product)
+
+    summary = _translated(product.get("summary_translations") or product.get("summary") or "")
+    summary = BeautifulSoup(summary, "html.parser").get_text("\n", strip=True) if "<" in summary else summary
+    highlights = ";".join(line.strip() for line in summary.splitlines() if line.strip())[:200]
+
+    base = {
+        "source": source,
+        "brand": brand,
+        "title": title,
+        "price": _best_price(product),
+        "unit_price": 0,
+        "url": url,
+        "image_url": image_url,
+        "product_highlights": highlights,
+        "total_count": "",
+    }
+
+    variations = product.get("variations") or product.get("variants") or []
+    priced = []
+    for v in variations if isinstance(variations, list) else []:
+        if not isinstance(v, dict):
+            continue
+        name = _translated(v.get("fields_translations") or v.get("title") or v.get("name") or "")
+        priced.append((name.strip(), _best_price(v)))
+
+    distinct_prices = {p for _, p in priced if p > 0}
+    if len(distinct_prices) > 1:
+        items = []
+        for name, price in priced:
+            if price <= 0:
+                continue
+            # 預設規格或規格名稱已在標題中時沿用原標題
+            keep_title = not name or name.lower() in ("default title", "default") or name in title
+            items.append({**base, "title": title if keep_title else f"{title} {name}", "price": price})
+        return items
+
+    if not base["price"] and distinct_prices:
+        base["price"] = distinct_prices.pop()
+    return [base]
+
+
+class ProductResponseCapture:
+    """
+    監聽頁面的 XHR/JSON 回應，直接從商品列表 API 的 payload 取得標題、價格、規格與圖片。
+    - 在 page.goto 之前 attach，列表 API 一回應就解析，不需逐張卡片 locator 往返
+    - 沒有攔截到任何商品時 (例如伺服器端渲染)，由呼叫端改走 DOM 解析
+    """
+
+    def __init__(self, page, base_url, source, brand, url_pattern=PRODUCT_API_RE):
+        self.page = page
+        self.base_url = base_url
+        self.source = source
+        self.brand = brand
+        self.url_pattern = url_pattern
+        self.items = {}
+        self.responses_seen = 0
+        self._tasks = set()
+        self._got_products = asyncio.Event()
+        page.on("response", self._on_response)
+
+    def _on_response(self, response):
+        if response.request.resource_type not in CAPTURE_RESOURCE_TYPES:
+            return
+        if "json" not in (response.headers.get("content-type") or ""):
+            return
+        if not self.url_pattern.search(response.url):
+            return
+        task = asyncio.ensure_future(self._parse(response))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _parse(self, response):
+        try:
+            payload = await response.json()
+        except Exception:
+            return
+        self.responses_seen += 1
+        before = len(self.items)
+        for product in iter_product_nodes(payload):
+            for item in product_to_items(product, self.base_url, self.source, self.brand):
+                self.items.setdefault((item["url"], item["title"]), item)
+        if len(self.items) > before:
+            print(f"📡 [Capture] 攔截商品 API {response.url[:80]}... 累計 {len(self.items)} 筆")
+            self._got_products.set()
+
+    async def wait_for_products(self, timeout=8.0):
+        """等待第一批商品 JSON；逾時回傳 False (呼叫端改走 DOM 解析)。"""
+        try:
+            await asyncio.wait_for(self._got_products.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def drain(self):
+        """等待所有已攔截但尚未解析完的回應。"""
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    async def settle(self, page, max_rounds=10, idle_seconds=1.0):
+        """
+        快速觸發無限捲動 / 下一批列表 API：直接捲到底，直到商品數不再增加。
+        取代逐段 400~800px 的漸進式滾動。
+        """
+        for _ in range(max_rounds):
+            count = len(self.items)
+            await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+            await asyncio.sleep(idle_seconds)
+            await self.drain()
+            if len(self.items) == count:
+                break
+
+    def detach(self):
+        self.page.remove_listener("response", self._on_response)
+
+    def results(self):
+        return list(self.items.values())
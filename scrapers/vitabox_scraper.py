@@ -3,12 +3,26 @@ import random
 from playwright.async_api import async_playwright
 from playwright_stealth import stealth_async
 from .base_scraper import BaseScraper
+from .dom_extract import extract_all, parse_int, print_extract_stats
+from .response_capture import ProductResponseCapture
+
+# 產品卡片欄位規格 (卡片本身可能就是 <a>)
+CARD_FIELDS = {
+    "title": {"selector": "h3, h4, .title, .product-title"},
+    "price_text": {"selector": [".price, .money", {"css": "span", "contains": "NT$"}], "default": "0"},
+    "href": {"selector": "a", "include_self": True, "attr": "href"},
+    "image": {"selector": "img", "attr": ["src", "data-src"], "default": ""},
+    "text": {"default": ""},
+}
 
 class VitaboxScraper(BaseScraper):
-    def __init__(self):
+    def __init__(self, capture=True):
         # 1. 初始化父類別，指定這個品牌專屬的存檔路徑
         super().__init__("data/d2c_vitabox.csv")
+        self.base_url = "https://shop.vitabox.com.tw"
         self.target_url = "https://shop.vitabox.com.tw/collections/all"
+        # 攔截模式：直接讀取商品列表 API 的 JSON，攔截不到時才改用 DOM 解析
+        self.capture = capture
 
     async def random_mouse_move(self, page):
         """[Vitabox 專用] 模擬人類滑鼠隨機移動，繞過行為偵測"""
@@ -56,71 +70,74 @@ class VitaboxScraper(BaseScraper):
             page = await context.new_page()
             await stealth_async(page)
 
+            # 必須在 goto 之前開始監聽，才能攔截到列表 API
+            capture = ProductResponseCapture(page, self.base_url, "Vitabox", "Vitabox") if self.capture else None
+
             print(f"🔗 前往: {self.target_url}")
             await page.goto(self.target_url, wait_until="domcontentloaded")
-            
+
+            if capture and await capture.wait_for_products():
+                await capture.settle(page)
+                await capture.drain()
+                self.data.extend(capture.results())
+                print(f"📡 [Vitabox] 攔截模式取得 {len(self.data)} 筆商品，略過 DOM 解析")
+                await browser.close()
+                self.save_to_csv()
+                return
+            if capture:
+                print("⚠️ [Vitabox] 未攔截到商品 API，改用 DOM 解析...")
+                capture.detach()
+
             # 執行 Vitabox 特有的擬人行為
             await self.random_mouse_move(page)
             await self.random_sleep(2, 4)
             await self.progressive_scroll(page)
             
-            # 解析資料
+            # 解析資料 (一次 page.evaluate 取回所有卡片欄位)
             print("🔍 開始解析產品資料...")
-            product_cards = await page.locator(".product-item, .product-card, .grid__item").all()
-            
+            cards = await extract_all(page, ".product-item, .product-card, .grid__item", CARD_FIELDS, label="VitaboxScraper 卡片")
+
             # Fallback 機制
-            if not product_cards:
-                product_cards = await page.locator("a[href*='/products/']").all()
-
-            print(f"📊 偵測到 {len(product_cards)} 個潛在產品")
-
-            for card in product_cards:
-                try:
-                    # 標題
-                    title_el = card.locator("h3, h4, .title, .product-title").first
-                    if await title_el.count() == 0: continue
-                    title = (await title_el.text_content()).strip()
-
-                    # 價格
-                    price_el = card.locator(".price, .money, span:has-text('NT$')").first
-                    price_text = await price_el.text_content() if await price_el.count() > 0 else "0"
-                    price = int(''.join(filter(str.isdigit, price_text)) or 0)
-
-                    # 連結
-                    tag_name = await card.evaluate("el => el.tagName.toLowerCase()")
-                    if tag_name == 'a':
-                        raw_url = await card.get_attribute("href")
-                    else:
-                        link_el = card.locator("a").first
-                        raw_url = await link_el.get_attribute("href")
-                    full_url = f"https://shop.vitabox.com.tw{raw_url}" if raw_url and raw_url.startswith("/") else raw_url
-
-                    # 圖片
-                    img_el = card.locator("img").first
-                    raw_img_url = await img_el.get_attribute("src") or await img_el.get_attribute("data-src") or ""
-                    image_url = f"https:{raw_img_url}" if raw_img_url.startswith("//") else raw_img_url
-
-                    # 亮點 (簡單提取)
-                    text_content = await card.text_content()
-                    highlights = text_content.replace(title, "").replace(price_text, "").strip()[:50].replace("\n", ";")
-
-                    # 2. 將資料加入父類別的 self.data 列表
-                    # 注意：這裡不需要自己算 unit_price，也不用管 CSV 欄位順序，父類別會處理
-                    self.data.append({
-                        "source": "Vitabox",
-                        "brand": "Vitabox",
-                        "title": title,
-                        "price": price,
-                        "unit_price": 0, # 後續由 App 計算
-                        "url": full_url,
-                        "image_url": image_url,
-                        "product_highlights": highlights,
-                        "total_count": 0,
-                        "tags": ""
-                    })
-
-                except Exception:
-                    continue
+            if not cards:
+                cards = await extract_all(page, "a[href*='/products/']", CARD_FIELDS, label="VitaboxScraper 卡片")
+
+            print(f"📊 偵測到 {len(cards)} 個潛在產品")
+
+            for card in cards:
+                # 標題
+                title = card["title"]
+                if not title: continue
+
+                # 價格
+                price_text = card["price_text"]
+                price = parse_int(price_text)
+
+                # 連結
+                raw_url = card["href"]
+                full_url = f"https://shop.vitabox.com.tw{raw_url}" if raw_url and raw_url.startswith("/") else raw_url
+
+                # 圖片
+                raw_img_url = card["image"]
+                image_url = f"https:{raw_img_url}" if raw_img_url.startswith("//") else raw_img_url
+
+                # 亮點 (簡單提取)
+                highlights = card["text"].replace(title, "").replace(price_text, "").strip()[:50].replace("\n", ";")
+
+                # 2. 將資料加入父類別的 self.data 列表
+                # 注意：這裡不需要自己算 unit_price，也不用管 CSV 欄位順序，父類別會處理
+                self.data.append({
+                    "source": "Vitabox",
+                    "brand": "Vitabox",
+                    "title": title,
+                    "price": price,
+                    "unit_price": 0, # 後續由 App 計算
+                    "url": full_url,
+                    "image_url": image_url,
+                    "product_highlights": highlights,
+                    "total_count": 0,
+                    "tags": ""
+                })
+            print_extract_stats()
 
             await browser.close()
             
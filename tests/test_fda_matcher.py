@@ -0,0 +1,87 @@
+import math
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+import pytest
+
+from data.fda_matcher import LicenseMatcher, attach_licenses
+from data.product_record import match_key
+
+
+@pytest.mark.parametrize("row, expected", [
+    # 有網址用網址 (去前後空白)
+    ({"url": " https://shop.example.com/p/1 ", "brand": "A", "title": "魚油"}, "https://shop.example.com/p/1"),
+    # 前台讀到的 NaN 網址、未標示品牌 與 離線讀到的空字串 得到同一個鍵
+    ({"url": math.nan, "brand": "未標示", "title": "魚油"}, "|魚油"),
+    ({"url": "", "brand": "", "title": "魚油"}, "|魚油"),
+    ({"url": None, "brand": math.nan, "title": "魚油"}, "|魚油"),
+    ({"url": "nan", "brand": "nan", "title": "魚油"}, "|魚油"),
+    ({"title": "魚油"}, "|魚油"),
+    ({"url": math.nan, "brand": " 大研生醫 ", "title": "魚油"}, "大研生醫|魚油"),
+])
+def test_match_key_normalizes_missing_values(row, expected):
+    assert match_key(row) == expected
+
+
+def test_attach_licenses_joins_rows_without_url(tmp_path):
+    table = tmp_path / "fda_matches.csv"
+    pd.DataFrame([
+        {"match_key": "|黃金魚油膠囊", "license_id": "衛部健食字第A00001號", "approved_effect": "調節血脂"},
+        {"match_key": "https://shop.example.com/p/1", "license_id": "衛部健食字第A00002號", "approved_effect": "護眼"},
+    ]).to_csv(table, index=False)
+    # 前台資料：網址缺值為 NaN、品牌以 未標示 補值
+    df = pd.DataFrame({
+        "url": [math.nan, "https://shop.example.com/p/1", math.nan],
+        "brand": ["未標示", "A", "未標示"],
+        "title": ["黃金魚油膠囊", "葉黃素", "益生菌"],
+    })
+    out = attach_licenses(df, str(table))
+    assert out["license_id"].tolist() == ["衛部健食字第A00001號", "衛部健食字第A00002號", ""]
+    assert out["approved_effect"].tolist() == ["調節血脂", "護眼", ""]
+
+
+# 小型許可清單：通用品名 (納麴Q10膠囊、黃金魚油膠囊) 與品牌品名並存，外加幾張膠囊類許可證讓 IDF 接近真實分布
+REGISTRY = pd.DataFrame([
+    ("A001", "納麴Q10膠囊", "某某生技股份有限公司", "調節血脂"),
+    ("A002", "黃金魚油膠囊", "悠活原力股份有限公司", "調節血脂"),
+    ("A003", "大研生醫納豆紅麴Q10膠囊", "大研生醫股份有限公司", "調節血脂"),
+    ("A004", "視易適葉黃素膠囊", "大研生醫股份有限公司", "護眼"),
+    ("A005", "益生菌粉末", "某乳品股份有限公司", "胃腸功能改善"),
+    ("A006", "靈芝膠囊", "某農場有限公司", "免疫調節"),
+    ("A007", "魚油軟膠囊", "甲公司", "調節血脂"),
+    ("A008", "綠茶膠囊", "乙公司", "調節血脂"),
+], columns=["license_id", "product_name", "brand", "approved_effect"])
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return LicenseMatcher(REGISTRY)
+
+
+@pytest.mark.parametrize("title, brand", [
+    # 沒有品牌：近似品名 (少了「豆紅」) 不可配到他廠的 納麴Q10膠囊
+    ("納豆紅麴Q10膠囊", ""),
+    ("納豆紅麴Q10膠囊 60粒", "未標示"),
+    # 有品牌但與申請商不符：通用品名不可配到 悠活原力 的許可證
+    ("黃金魚油膠囊 90粒", "某品牌"),
+    ("【某品牌】黃金魚油膠囊", "某品牌"),
+])
+def test_match_rejects_wrong_pairs(matcher, title, brand):
+    row_id, _ = matcher.match(title, brand)
+    assert row_id is None
+
+
+@pytest.mark.parametrize("title, brand, license_id", [
+    ("大研生醫 納豆紅麴Q10膠囊 60粒", "大研生醫", "A003"),
+    ("視易適葉黃素膠囊 30粒x3盒", "大研生醫", "A004"),
+    ("悠活原力 黃金魚油膠囊", "悠活原力", "A002"),
+    # 沒有品牌但品名完全相同
+    ("納麴Q10膠囊", "", "A001"),
+])
+def test_match_accepts_brand_agreement(matcher, title, brand, license_id):
+    row_id, score = matcher.match(title, brand)
+    assert row_id is not None and matcher.license_ids[row_id] == license_id
+    assert score >= matcher.min_score
@@ -0,0 +1,66 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from data.url_canon import SeenSet, canonicalize, load_domain_rules
+
+RULES = load_domain_rules(
+    [("品牌", "https://www.brand.com.tw/"), ("替身站", "http://127.0.0.1:8765/")],
+    rules={"shop.example.com": {"drop_params": ("variant",)}},
+)
+
+
+@pytest.mark.parametrize("raw, expected", [
+    # 追蹤參數移除，其餘參數依名稱排序
+    ("https://shop.example.com/p/1?utm_source=fb&utm_medium=cpc&b=2&a=1", "https://shop.example.com/p/1?a=1&b=2"),
+    ("https://shop.example.com/p/1?fbclid=abc&gclid=def", "https://shop.example.com/p/1"),
+    ("https://shop.example.com/p/1?variant=3&id=9", "https://shop.example.com/p/1?id=9"),
+    # fragment
+    ("https://shop.example.com/p/1#reviews", "https://shop.example.com/p/1"),
+    # 預設 port、host 大小寫與結尾的 .
+    ("https://shop.example.com:443/p/1", "https://shop.example.com/p/1"),
+    ("https://SHOP.Example.com./p/1", "https://shop.example.com/p/1"),
+    ("https://shop.example.com:8443/p/1", "https://shop.example.com:8443/p/1"),
+    # 連續 / 與結尾 /、省略 scheme
+    ("https://shop.example.com//p//1/", "https://shop.example.com/p/1"),
+    ("//shop.example.com/p/1", "https://shop.example.com/p/1"),
+    ("shop.example.com/p/1", "https://shop.example.com/p/1"),
+    ("https://shop.example.com", "https://shop.example.com/"),
+    # 跳脫字元：多餘的解碼、其餘轉大寫、非 ASCII 補跳脫
+    ("https://shop.example.com/%7euser/p%2f1", "https://shop.example.com/~user/p%2F1"),
+    ("https://shop.example.com/商品/1", "https://shop.example.com/%E5%95%86%E5%93%81/1"),
+    # 網域清單的 www / scheme 規則
+    ("http://brand.com.tw/products/a/?utm_campaign=x", "https://www.brand.com.tw/products/a"),
+    ("https://www.brand.com.tw/products/a", "https://www.brand.com.tw/products/a"),
+    # 只有 http 的站台：scheme 保留 http，非預設 port 保留、預設 port 移除
+    ("https://127.0.0.1:8765/products/item-1/", "http://127.0.0.1:8765/products/item-1"),
+    ("http://127.0.0.1:80/products/item-1", "http://127.0.0.1/products/item-1"),
+    # 無效輸入
+    ("", ""),
+    (None, ""),
+])
+def test_canonicalize(raw, expected):
+    assert canonicalize(raw, rules=RULES) == expected
+
+
+def test_canonicalize_is_idempotent():
+    url = "http://brand.com.tw//products/%7ea/?b=1&utm_source=x&a=2#top"
+    once = canonicalize(url, rules=RULES)
+    assert canonicalize(once, rules=RULES) == once
+
+
+def test_seen_set_add_many_and_persist(tmp_path):
+    path = str(tmp_path / "seen.npy")
+    seen = SeenSet(path)
+    assert seen.add_many(["https://a.com/1", "https://a.com/2", "https://a.com/1"]) == ["https://a.com/1", "https://a.com/2"]
+    assert seen.add("https://a.com/2") is False
+    assert seen.add("https://a.com/3") is True
+    seen.save()
+
+    reloaded = SeenSet(path)
+    assert len(reloaded) == 3
+    assert "https://a.com/3" in reloaded
+    assert reloaded.add_many(["https://a.com/4", "https://a.com/1"]) == ["https://a.com/4"]
@@ -0,0 +1,103 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from data import work_queue
+from data.work_queue import DONE, FAILED, LEASED, PENDING, SQLiteWorkQueue, WorkQueue, open_queue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    q = SQLiteWorkQueue(str(tmp_path / "queue.sqlite3"))
+    q.enqueue("b1", [{"url": "https://a.example/p/1"}, {"url": "https://a.example/p/2"}])
+    yield q
+    q.close()
+
+
+def test_enqueue_dedups_within_batch(queue):
+    assert queue.enqueue("b1", [{"url": "https://a.example/p/1"}, {"url": "https://a.example/p/3"}]) == 1
+    assert queue.enqueue("b2", [{"url": "https://a.example/p/1"}]) == 1
+    assert queue.counts("b1") == {PENDING: 3}
+
+
+def test_lease_is_exclusive_until_expiry(queue):
+    first = queue.lease("w1", limit=2)
+    assert [t["key"] for t in first] == ["https://a.example/p/1", "https://a.example/p/2"]
+    assert queue.lease("w2", limit=2) == []
+    assert queue.counts("b1") == {LEASED: 2}
+
+
+def test_expired_lease_is_redelivered_and_old_owner_ignored(queue):
+    task = queue.lease("w1", visibility=0)[0]
+    redelivered = queue.lease("w2", visibility=60)[0]
+    assert redelivered["id"] == task["id"]
+    assert redelivered["deliveries"] == 2
+    # 租約已被 w2 收回：w1 的 ack / nack 不生效
+    assert queue.ack(task["id"], "w1", result={"ok": 1}) is False
+    assert queue.nack(task["id"], "w1") is False
+    assert queue.ack(task["id"], "w2", result={"ok": 2}) is True
+    row = next(r for r in queue.results("b1") if r["key"] == task["key"])
+    assert (row["status"], row["result"]) == (DONE, {"ok": 2})
+
+
+def test_heartbeat_extends_lease(queue):
+    task = queue.lease("w1", visibility=0)[0]
+    queue.heartbeat("w1", [task["id"]], visibility=60)
+    assert all(t["id"] != task["id"] for t in queue.lease("w2", limit=2))
+
+
+def test_nack_delays_and_keeps_state(queue):
+    task = queue.lease("w1")[0]
+    assert queue.nack(task["id"], "w1", delay=3600, state={"attempts": {"transient": 1}}, error="timeout") is True
+    assert all(t["id"] != task["id"] for t in queue.lease("w2", limit=2))
+    row = next(r for r in queue.results("b1") if r["key"] == task["key"])
+    assert (row["status"], row["state"], row["error"]) == (PENDING, {"attempts": {"transient": 1}}, "timeout")
+
+
+def test_nack_without_delay_is_leased_again_with_state(queue):
+    task = queue.lease("w1")[0]
+    queue.nack(task["id"], "w1", state={"attempts": {"transient": 1}})
+    again = next(t for t in queue.lease("w2", limit=2) if t["id"] == task["id"])
+    assert again["state"] == {"attempts": {"transient": 1}}
+    # nack 會把 deliveries 歸零，只有 worker 當掉才會累積
+    assert again["deliveries"] == 1
+
+
+def test_task_failed_after_max_deliveries(queue, monkeypatch):
+    monkeypatch.setattr(work_queue, "MAX_DELIVERIES", 2)
+    queue.enqueue("b2", [{"url": "https://a.example/poison"}])
+    for _ in range(2):
+        leased = [t for t in queue.lease("w", limit=10, visibility=0) if t["batch"] == "b2"]
+        assert len(leased) == 1
+    assert [t for t in queue.lease("w", limit=10) if t["batch"] == "b2"] == []
+    [row] = queue.results("b2")
+    assert (row["status"], row["error"]) == (FAILED, "lease expired")
+    assert queue.counts("b2") == {FAILED: 1}
+
+
+def test_remaining_counts_pending_and_leased(queue):
+    queue.lease("w1")
+    assert queue.remaining() == 2
+    task = queue.lease("w1")[0]
+    queue.ack(task["id"], "w1")
+    assert queue.remaining() == 1
+
+
+def test_incomplete_backend_fails_at_instantiation():
+    class Partial(WorkQueue):
+        def enqueue(self, batch, items, key="url"):
+            return 0
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_open_queue_specs(tmp_path):
+    q = open_queue(f"sqlite:///{tmp_path}/q.sqlite3")
+    assert isinstance(q, SQLiteWorkQueue) and q.path == f"{tmp_path}/q.sqlite3"
+    q.close()
+    with pytest.raises(ValueError):
+        open_queue("redis://localhost/0")